@@ -0,0 +1,223 @@
+"""
+In-process stand-in for an OCI distribution registry, enough of the API for
+omlmd to push, pull, mount, list and crawl against, without TLS nor auth.
+
+Everything is held in memory, so results depend on omlmd and the local
+machine rather than on a registry deployment.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BLOB_RE = re.compile(r"^/v2/(?P<name>.+)/blobs/(?P<digest>sha256:[a-f0-9]{64})$")
+UPLOAD_RE = re.compile(r"^/v2/(?P<name>.+)/blobs/uploads/(?P<uuid>[^/]*)$")
+MANIFEST_RE = re.compile(r"^/v2/(?P<name>.+)/manifests/(?P<ref>[^/]+)$")
+TAGS_RE = re.compile(r"^/v2/(?P<name>.+)/tags/list$")
+
+
+class Store:
+    """
+    Blobs, manifests and tags of every repository, plus the log of requests.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.blobs: dict[str, bytes] = {}
+        self.repo_blobs: dict[str, set[str]] = {}
+        self.manifests: dict[str, dict[str, bytes]] = {}
+        self.tags: dict[str, dict[str, str]] = {}
+        self.uploads: dict[str, bytearray] = {}
+        self.requests: list[tuple[str, str]] = []
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, don't let them wait for an ACK
+    disable_nagle_algorithm = True
+    store: Store
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body=b"", headers=None):
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD" and body:
+            self.wfile.write(body)
+
+    def _body(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _route(self):
+        s = self.store
+        url = urlparse(self.path)
+        qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+        with s.lock:
+            s.requests.append((self.command, url.path))
+        if url.path == "/v2/":
+            return self._send(200, b"{}")
+        if url.path == "/v2/_catalog":
+            repos = sorted(set(s.tags) | set(s.repo_blobs))
+            return self._paginate(repos, qs, "repositories", "/v2/_catalog", {})
+        if m := TAGS_RE.match(url.path):
+            tags = sorted(s.tags.get(m["name"], {}))
+            return self._paginate(tags, qs, "tags", url.path, {"name": m["name"]})
+        if m := BLOB_RE.match(url.path):
+            return self._blob(m["name"], m["digest"])
+        if m := UPLOAD_RE.match(url.path):
+            return self._upload(m["name"], m["uuid"], qs)
+        if m := MANIFEST_RE.match(url.path):
+            return self._manifest(m["name"], m["ref"])
+        self._send(404)
+
+    def _paginate(self, items, qs, key, path, extra):
+        if "last" in qs:
+            items = [i for i in items if i > qs["last"]]
+        headers = {"Content-Type": "application/json"}
+        if "n" in qs:
+            n = int(qs["n"])
+            if len(items) > n:
+                items = items[:n]
+                headers["Link"] = f'<{path}?n={n}&last={items[-1]}>; rel="next"'
+        body = json.dumps({**extra, key: items}).encode()
+        self._send(200, body, headers)
+
+    def _blob(self, name, digest):
+        s = self.store
+        if self.command == "DELETE":
+            s.repo_blobs.get(name, set()).discard(digest)
+            return self._send(202)
+        if digest not in s.repo_blobs.get(name, set()):
+            return self._send(404, b'{"errors":[{"message":"blob unknown"}]}')
+        data = s.blobs[digest]
+        rng = self.headers.get("Range")
+        headers = {
+            "Docker-Content-Digest": digest,
+            "Accept-Ranges": "bytes",
+            "Content-Type": "application/octet-stream",
+        }
+        if rng and (m := re.match(r"bytes=(\d+)-(\d*)", rng)):
+            start = int(m[1])
+            end = int(m[2]) if m[2] else len(data) - 1
+            end = min(end, len(data) - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return self._send(206, data[start : end + 1], headers)
+        self._send(200, data, headers)
+
+    def _upload(self, name, upload_id, qs):
+        s = self.store
+        if self.command == "POST":
+            body = self._body()
+            if "mount" in qs:
+                digest = qs["mount"]
+                if digest in s.repo_blobs.get(qs.get("from", ""), set()):
+                    s.repo_blobs.setdefault(name, set()).add(digest)
+                    return self._send(
+                        201,
+                        headers={
+                            "Location": f"/v2/{name}/blobs/{digest}",
+                            "Docker-Content-Digest": digest,
+                        },
+                    )
+            if "digest" in qs:
+                return self._finish(name, qs["digest"], bytearray(body))
+            uid = uuid.uuid4().hex
+            s.uploads[uid] = bytearray(body)
+            return self._send(
+                202,
+                headers={"Location": f"/v2/{name}/blobs/uploads/{uid}", "Range": "0-0"},
+            )
+        if upload_id not in s.uploads:
+            return self._send(404)
+        if self.command == "PATCH":
+            s.uploads[upload_id] += self._body()
+            return self._send(
+                202,
+                headers={
+                    "Location": f"/v2/{name}/blobs/uploads/{upload_id}",
+                    "Range": f"0-{len(s.uploads[upload_id]) - 1}",
+                },
+            )
+        if self.command == "PUT":
+            buf = s.uploads.pop(upload_id) + self._body()
+            return self._finish(name, qs.get("digest", ""), buf)
+        if self.command == "DELETE":
+            s.uploads.pop(upload_id, None)
+            return self._send(204)
+        self._send(405)
+
+    def _finish(self, name, digest, buf):
+        s = self.store
+        actual = "sha256:" + hashlib.sha256(buf).hexdigest()
+        if actual != digest:
+            return self._send(400, b'{"errors":[{"message":"digest invalid"}]}')
+        s.blobs[digest] = bytes(buf)
+        s.repo_blobs.setdefault(name, set()).add(digest)
+        self._send(
+            201,
+            headers={
+                "Location": f"/v2/{name}/blobs/{digest}",
+                "Docker-Content-Digest": digest,
+            },
+        )
+
+    def _manifest(self, name, ref):
+        s = self.store
+        if self.command == "PUT":
+            body = self._body()
+            digest = "sha256:" + hashlib.sha256(body).hexdigest()
+            s.manifests.setdefault(name, {})[digest] = body
+            if not ref.startswith("sha256:"):
+                s.tags.setdefault(name, {})[ref] = digest
+            return self._send(
+                201,
+                headers={
+                    "Location": f"/v2/{name}/manifests/{digest}",
+                    "Docker-Content-Digest": digest,
+                },
+            )
+        digest = ref if ref.startswith("sha256:") else s.tags.get(name, {}).get(ref)
+        body = s.manifests.get(name, {}).get(digest or "")
+        if body is None:
+            return self._send(404, b'{"errors":[{"message":"manifest unknown"}]}')
+        etag = f'"{digest}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(
+                304, headers={"ETag": etag, "Docker-Content-Digest": digest}
+            )
+        self._send(
+            200,
+            body,
+            {
+                "Content-Type": "application/vnd.oci.image.manifest.v1+json",
+                "Docker-Content-Digest": digest,
+                "ETag": etag,
+            },
+        )
+
+    do_GET = do_HEAD = do_POST = do_PUT = do_PATCH = do_DELETE = _route
+
+
+def serve(port: int = 0) -> tuple[ThreadingHTTPServer, Store]:
+    """
+    Start a registry on localhost in a background thread, on a free port unless
+    `port` is given; `server.shutdown()` stops it.
+    """
+    store = Store()
+    handler = type("BoundHandler", (Handler,), {"store": store})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    return server, store
@@ -0,0 +1,330 @@
+"""
+Benchmarks of omlmd against an in-process registry stand-in, on synthetic
+models of configurable size and layer count.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --baseline results.json
+
+With a baseline, metrics worse than it by more than the tolerance are reported
+as regressions and the exit status is 1.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable
+
+import click
+from oci_registry import serve
+
+from omlmd.constants import MIME_APPLICATION_CONFIG, MIME_APPLICATION_MLMODEL
+from omlmd.helpers import Helper
+from omlmd.model_metadata import ModelMetadata
+from omlmd.provider import OMLMDRegistry
+from omlmd.tracing import SummaryExporter, tracer
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+@dataclass
+class Metric:
+    value: float
+    unit: str
+    higher_is_better: bool
+    # time and bytes per tracing phase, to tell where a regression comes from
+    phases: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Parameters:
+    layer_size: int
+    layers: int
+    iterations: int
+    targets: int
+    samples: int
+    jobs: int
+    seed: int
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """
+    Nearest-rank percentile of `values`.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def synthetic_model(
+    directory: Path, layer_size: int, layers: int, seed: int
+) -> list[str]:
+    """
+    Files to push as one model: `layers` files of `layer_size` pseudo-random
+    bytes, the same for a given `seed`, followed by the metadata config.
+    """
+    rng = random.Random(seed)
+    files = []
+    for i in range(layers):
+        layer = directory / f"layer-{i}.bin"
+        layer.write_bytes(rng.randbytes(layer_size))
+        files.append(f"{layer}:{MIME_APPLICATION_MLMODEL}")
+    config = directory / "model_metadata.omlmd.json"
+    config.write_text(
+        ModelMetadata(name=f"bench-{seed}", author="omlmd benchmarks").to_json()
+    )
+    return files + [f"{config}:{MIME_APPLICATION_CONFIG}"]
+
+
+def push_model(registry: OMLMDRegistry, target: str, files: list[str]) -> None:
+    registry.push(
+        target=target,
+        files=files,
+        manifest_config=files[-1],
+        disable_path_validation=True,
+        do_chunked=True,
+        quiet=True,
+    )
+
+
+def timed(run: Callable[[], Any]) -> tuple[float, dict[str, Any]]:
+    """
+    Wall-clock seconds of `run`, and the phase breakdown of its spans.
+    """
+    summary = SummaryExporter()
+    tracer.add_exporter(summary)
+    try:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+    finally:
+        tracer.remove_exporter(summary)
+    return elapsed, {name: asdict(phase) for name, phase in summary.phases.items()}
+
+
+def bench_push(
+    registry_url: str, files: list[str], size: int, params: Parameters
+) -> Metric:
+    # a new repository each time, so that no blob is already there
+    runs = [
+        timed(
+            partial(
+                push_model,
+                OMLMDRegistry(insecure=True, upload_jobs=params.jobs),
+                f"{registry_url}/bench/push-{i}:v1",
+                files,
+            )
+        )
+        for i in range(params.iterations)
+    ]
+    elapsed, phases = sorted(runs, key=lambda r: r[0])[len(runs) // 2]
+    return Metric(size / elapsed / MB, "MB/s", True, phases)
+
+
+def bench_pull(registry_url: str, size: int, params: Parameters) -> Metric:
+    target = f"{registry_url}/bench/pull:v1"
+    runs = []
+    for _ in range(params.iterations):
+        with tempfile.TemporaryDirectory() as outdir:
+            registry = OMLMDRegistry(insecure=True)
+            runs.append(
+                timed(
+                    partial(
+                        registry.download_layers, target, outdir, None, jobs=params.jobs
+                    )
+                )
+            )
+    elapsed, phases = sorted(runs, key=lambda r: r[0])[len(runs) // 2]
+    return Metric(size / elapsed / MB, "MB/s", True, phases)
+
+
+def bench_crawl(targets: list[str], params: Parameters) -> Metric:
+    runs = [
+        timed(partial(Helper(OMLMDRegistry(insecure=True)).crawl, targets, params.jobs))
+        for _ in range(params.iterations)
+    ]
+    elapsed, phases = sorted(runs, key=lambda r: r[0])[len(runs) // 2]
+    return Metric(elapsed * 1000, "ms", False, phases)
+
+
+def bench_get_config(target: str, params: Parameters) -> tuple[Metric, Metric]:
+    # a new registry each time, so that neither manifest nor config is cached
+    latencies = []
+    for _ in range(params.samples):
+        helper = Helper(OMLMDRegistry(insecure=True))
+        latencies.append(timed(partial(helper.get_config, target))[0] * 1000)
+    return (
+        Metric(percentile(latencies, 50), "ms", False),
+        Metric(percentile(latencies, 99), "ms", False),
+    )
+
+
+def run_benchmarks(params: Parameters) -> dict[str, Metric]:
+    server, _ = serve()
+    registry_url = f"localhost:{server.server_address[1]}"
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            model_dir = Path(workdir) / "model"
+            model_dir.mkdir()
+            files = synthetic_model(
+                model_dir, params.layer_size, params.layers, params.seed
+            )
+            size = params.layer_size * params.layers
+            results = {"push_throughput": bench_push(registry_url, files, size, params)}
+
+            push_model(
+                OMLMDRegistry(insecure=True), f"{registry_url}/bench/pull:v1", files
+            )
+            results["pull_throughput"] = bench_pull(registry_url, size, params)
+
+            # small models with a config of their own, as a crawl would meet
+            targets = []
+            setup = OMLMDRegistry(insecure=True)
+            for i in range(params.targets):
+                target_dir = Path(workdir) / f"crawl-{i}"
+                target_dir.mkdir()
+                target = f"{registry_url}/bench/crawl:t{i}"
+                push_model(setup, target, synthetic_model(target_dir, 1024, 1, i))
+                targets.append(target)
+            results["crawl_latency"] = bench_crawl(targets, params)
+            (
+                results["get_config_p50"],
+                results["get_config_p99"],
+            ) = bench_get_config(targets[0], params)
+    finally:
+        server.shutdown()
+    return results
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """
+    Describe each metric of `results` worse than in `baseline` by more than
+    `tolerance`, a fraction of the baseline value.
+    """
+    regressions = []
+    for name, metric in results["metrics"].items():
+        if (base := baseline["metrics"].get(name)) is None or not base["value"]:
+            continue
+        change = (metric["value"] - base["value"]) / base["value"]
+        worse = -change if metric["higher_is_better"] else change
+        line = (
+            f"{name}: {base['value']:.2f} -> {metric['value']:.2f} "
+            f"{metric['unit']} ({change:+.1%})"
+        )
+        if worse > tolerance:
+            regressions.append(line)
+        click.echo(("REGRESSION " if worse > tolerance else "") + line, err=True)
+    return regressions
+
+
+@click.command()
+@click.option(
+    "--layer-size",
+    help="Size in bytes of each layer of the synthetic model",
+    type=click.IntRange(min=1),
+    default=8 * MB,
+    show_default=True,
+)
+@click.option(
+    "--layers",
+    help="Number of layers of the synthetic model",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+)
+@click.option(
+    "--iterations",
+    help="Runs of each push, pull and crawl, the median of which is reported",
+    type=click.IntRange(min=1),
+    default=5,
+    show_default=True,
+)
+@click.option(
+    "--targets",
+    help="Number of targets to crawl",
+    type=click.IntRange(min=1),
+    default=50,
+    show_default=True,
+)
+@click.option(
+    "--samples",
+    help="Number of get_config calls the percentiles are computed from",
+    type=click.IntRange(min=1),
+    default=200,
+    show_default=True,
+)
+@click.option(
+    "--jobs",
+    "-j",
+    help="Concurrency of uploads, downloads and crawls",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option(
+    "--output",
+    "-o",
+    help="File to store the results in as JSON, instead of stdout",
+    type=click.Path(path_type=Path, dir_okay=False),
+)
+@click.option(
+    "--baseline",
+    help="Results of an earlier run to compare against",
+    type=click.Path(path_type=Path, exists=True, dir_okay=False),
+)
+@click.option(
+    "--tolerance",
+    help="Fraction by which a metric may be worse than the baseline before it is a regression",
+    type=click.FloatRange(min=0),
+    default=0.15,
+    show_default=True,
+)
+def main(
+    output: Path | None, baseline: Path | None, tolerance: float, **parameters: int
+):
+    logging.basicConfig(level=logging.WARNING)
+    params = Parameters(**parameters)
+    metrics = run_benchmarks(params)
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "parameters": asdict(params),
+        "metrics": {name: asdict(metric) for name, metric in metrics.items()},
+    }
+    for name, metric in metrics.items():
+        click.echo(f"{name}: {metric.value:.2f} {metric.unit}", err=True)
+    if output is not None:
+        output.write_text(json.dumps(results, indent=2))
+    else:
+        click.echo(json.dumps(results, indent=2))
+
+    if baseline is not None:
+        base = json.loads(baseline.read_text())
+        if base.get("parameters") != results["parameters"]:
+            logger.warning(
+                f"{baseline} was run with other parameters, compare with care"
+            )
+        if regressions := compare(results, base, tolerance):
+            click.echo(f"{len(regressions)} regression(s) against {baseline}", err=True)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
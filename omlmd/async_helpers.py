@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import InitVar, dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, TypeVar
+
+from .helpers import Helper, PullResult
+from .listener import AsyncListener, Event, Listener
+from .model_metadata import ModelMetadata
+from .progress import ProgressCallback
+from .provider import REGISTRY_ERRORS, LayerFilter
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_MAX_WORKERS = 32
+
+
+class _AsyncListenerBridge(Listener):
+    """
+    Hands the events the wrapped `Helper` emits in worker threads over to the
+    event loop of the `AsyncHelper`, waiting until its listeners are notified.
+    """
+
+    def __init__(self, helper: AsyncHelper):
+        self.helper = helper
+
+    def update(self, source: Any, event: Event) -> None:
+        loop = self.helper._loop
+        if loop is None or not self.helper._listeners:
+            return
+        notified = asyncio.run_coroutine_threadsafe(
+            self.helper.notify_listeners(event), loop
+        )
+        try:
+            if asyncio.get_running_loop() is loop:
+                return  # called on the loop itself, waiting would deadlock
+        except RuntimeError:
+            pass
+        notified.result()
+
+
+@dataclass
+class AsyncHelper:
+    """
+    asyncio counterpart of `Helper`.
+
+    Registry calls stay blocking, but run on a pool of `max_workers` threads
+    sharing one registry, whose HTTP connection pool is sized to match, so
+    that many lookups can be awaited concurrently from a single event loop.
+    Without a `helper`, one for a registry with such a pool is made.
+    """
+
+    helper: InitVar[Helper | None] = None
+    max_workers: int = DEFAULT_MAX_WORKERS
+    _listeners: list[AsyncListener] = field(default_factory=list)
+
+    def __post_init__(self, helper: Helper | None) -> None:
+        self._helper = (
+            helper
+            if helper is not None
+            else Helper.from_default_registry(True, pool_size=self.max_workers)
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="omlmd"
+        )
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._helper.add_listener(_AsyncListenerBridge(self))
+
+    @classmethod
+    def from_default_registry(
+        cls, insecure: bool, max_workers: int = DEFAULT_MAX_WORKERS, **kwargs
+    ):
+        """
+        AsyncHelper for a registry with default settings and a connection pool
+        of `max_workers`; `kwargs` are passed on to `OMLMDRegistry`.
+        """
+        return cls(
+            Helper.from_default_registry(insecure, pool_size=max_workers, **kwargs),
+            max_workers,
+        )
+
+    async def _run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        self._loop = asyncio.get_running_loop()
+        return await self._loop.run_in_executor(
+            self._executor, partial(fn, *args, **kwargs)
+        )
+
+    async def push(
+        self,
+        target: str,
+        path: Path | str,
+        name: str | None = None,
+        description: str | None = None,
+        author: str | None = None,
+        model_format_name: str | None = None,
+        model_format_version: str | None = None,
+        mount_from: Sequence[str] | None = None,
+        **kwargs,
+    ):
+        return await self._run(
+            self._helper.push,
+            target,
+            path,
+            name=name,
+            description=description,
+            author=author,
+            model_format_name=model_format_name,
+            model_format_version=model_format_version,
+            mount_from=mount_from,
+            **kwargs,
+        )
+
+    async def pull(
+        self,
+        target: str,
+        outdir: Path | str,
+        media_types: Sequence[str] | None = None,
+        jobs: int = 1,
+        atomic: bool = False,
+        progress: ProgressCallback | None = None,
+        layer_filter: LayerFilter | None = None,
+    ) -> list[str]:
+        """
+        Pull as `Helper.pull`; `progress` is called from a worker thread.
+        """
+        return await self._run(
+            self._helper.pull,
+            target,
+            outdir,
+            media_types,
+            jobs,
+            atomic,
+            progress,
+            layer_filter,
+        )
+
+    async def pull_many(
+        self,
+        targets: Sequence[str],
+        outdir: Path | str,
+        media_types: Sequence[str] | None = None,
+        jobs: int = 1,
+        progress: ProgressCallback | None = None,
+        layer_filter: LayerFilter | None = None,
+    ) -> list[PullResult]:
+        """
+        Pull as `Helper.pull_many`, whose `jobs` workers are threads of its own.
+        """
+        return await self._run(
+            self._helper.pull_many,
+            targets,
+            outdir,
+            media_types,
+            jobs,
+            progress,
+            layer_filter,
+        )
+
+    async def get_config(self, target: str) -> str:
+        return await self._run(self._helper.get_config, target)
+
+    async def get_metadata(self, target: str) -> ModelMetadata:
+        return await self._run(self._helper.get_metadata, target)
+
+    async def get_metadata_many(
+        self, targets: Sequence[str]
+    ) -> dict[str, ModelMetadata | BaseException]:
+        """
+        `get_metadata` of each of `targets` concurrently; a target which fails
+        maps to its exception, as with `Helper.get_metadata_many`.
+        """
+
+        async def get_one(target: str) -> ModelMetadata | BaseException:
+            try:
+                return await self.get_metadata(target)
+            # TypeError: a config which isn't model metadata
+            except (*REGISTRY_ERRORS, TypeError) as e:
+                logger.warning(f"Unable to get metadata of {target}: {e}")
+                return e
+
+        results = await asyncio.gather(*(get_one(target) for target in targets))
+        return dict(zip(targets, results))
+
+    async def crawl(self, targets: Sequence[str]) -> str:
+        """
+        Crawl the configuration of all `targets` concurrently, with the same
+        result as `Helper.crawl`.
+        """
+        configs = await asyncio.gather(
+            *(self._run(self._helper._crawl_one, target) for target in targets)
+        )
+        return "[" + ", ".join(configs) + "]"
+
+    def add_listener(self, listener: AsyncListener | Listener) -> None:
+        """
+        Register a listener: an `AsyncListener` is awaited on the event loop,
+        a plain `Listener` is called from the worker thread, as with `Helper`.
+        """
+        if isinstance(listener, AsyncListener):
+            self._listeners.append(listener)
+        else:
+            self._helper.add_listener(listener)
+
+    def remove_listener(self, listener: AsyncListener | Listener) -> None:
+        if isinstance(listener, AsyncListener):
+            self._listeners.remove(listener)
+        else:
+            self._helper.remove_listener(listener)
+
+    async def notify_listeners(self, event: Event) -> None:
+        await asyncio.gather(
+            *(listener.update(self, event) for listener in self._listeners)
+        )
+
+    async def aclose(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
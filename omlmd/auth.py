@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import oras.auth
+import oras.auth.utils as auth_utils
+
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# lifetime of a token which doesn't tell, per the distribution token spec
+DEFAULT_TOKEN_LIFETIME = 60.0
+REPOSITORY_URL_RE = re.compile(r"^/v2/(?P<name>.+?)/(blobs|manifests|tags|referrers)/")
+
+
+def scope_of(url: str) -> str:
+    """
+    The registry and repository a request URL is about, or only the registry
+    for endpoints such as `/v2/` or `/v2/_catalog`.
+    """
+    parsed = urlparse(url)
+    if m := REPOSITORY_URL_RE.match(parsed.path):
+        return f"{parsed.netloc}/{m['name']}"
+    return parsed.netloc
+
+
+def token_expiry(token: str) -> float | None:
+    """
+    The `exp` claim of a JWT bearer token as a `time.time()` timestamp, or
+    None when the token is opaque.
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+        return float(claims["exp"])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return None
+
+
+@dataclass
+class _Token:
+    token: str
+    expires_at: float
+    challenge: auth_utils.authHeader | None = None
+
+
+class ScopedTokenAuth(oras.auth.TokenAuth):
+    """
+    oras' token auth, but remembering one bearer token per repository instead
+    of a single one, so that requests alternating between repositories don't
+    keep trading tokens. A token about to expire is refreshed ahead of time
+    from the challenge it was obtained with, rather than after a 401.
+
+    The repository of the request in flight is set per thread by `scoped`.
+    """
+
+    # a token is refreshed this many seconds before it expires
+    refresh_margin = 10.0
+
+    def __init__(self):
+        self._tokens: dict[str, _Token] = {}
+        self._locks: defaultdict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.tokens_fetched = 0
+        super().__init__()
+
+    @contextmanager
+    def scoped(self, url: str):
+        previous = getattr(self._local, "scope", None)
+        self._local.scope = scope_of(url)
+        try:
+            yield
+        finally:
+            self._local.scope = previous
+
+    @property
+    def _scope(self) -> str:
+        return getattr(self._local, "scope", None) or ""
+
+    @property  # type: ignore[override]
+    def token(self) -> str | None:
+        scope = self._scope
+        with self._lock:
+            entry = self._tokens.get(scope)
+        if entry is None:
+            return None
+        if time.time() < entry.expires_at - self.refresh_margin:
+            return entry.token
+        with self._lock:
+            refreshing = self._locks[scope]
+        with refreshing:
+            with self._lock:
+                entry = self._tokens.get(scope)
+            # another thread may have refreshed it while we waited
+            if (
+                entry is not None
+                and time.time() < entry.expires_at - self.refresh_margin
+            ):
+                return entry.token
+            if entry is None or entry.challenge is None:
+                return None
+            logger.debug(f"Refreshing bearer token for {scope} before it expires")
+            if token := self._fetch_token(entry.challenge):
+                self._store(scope, token, entry.challenge)
+                return token
+            with self._lock:
+                self._tokens.pop(scope, None)
+            return None
+
+    @token.setter
+    def token(self, token: str | None) -> None:
+        if token is None:
+            with self._lock:
+                self._tokens.pop(self._scope, None)
+        else:
+            self._store(self._scope, token, None)
+
+    def _store(
+        self, scope: str, token: str, challenge: auth_utils.authHeader | None
+    ) -> None:
+        expires_at = token_expiry(token) or time.time() + DEFAULT_TOKEN_LIFETIME
+        with self._lock:
+            if challenge is None and (entry := self._tokens.get(scope)) is not None:
+                challenge = entry.challenge
+            self._tokens[scope] = _Token(token, expires_at, challenge)
+
+    def _fetch_token(self, h: auth_utils.authHeader) -> str | None:
+        # same order as oras: anonymously unless credentials are known
+        if not hasattr(self, "_basic_auth") and (
+            token := self.request_anonymous_token(h)
+        ):
+            return token
+        return self.request_token(h)
+
+    def request_token(self, h: auth_utils.authHeader):
+        with tracer.span("auth", scope=self._scope):
+            token = super().request_token(h)
+        if token:
+            self._count_fetched()
+        return token
+
+    def request_anonymous_token(self, h: auth_utils.authHeader):
+        with tracer.span("auth", scope=self._scope, anonymous=True):
+            token = super().request_anonymous_token(h)
+        if token:
+            self._count_fetched()
+        return token
+
+    def _count_fetched(self) -> None:
+        with self._lock:
+            self.tokens_fetched += 1
+
+    def authenticate_request(self, original, headers: dict, refresh=False):
+        """
+        Obtain a token for the challenge of `original`, remembering the challenge
+        so that the token can be refreshed without waiting for another 401.
+        """
+        headers, changed = super().authenticate_request(original, headers, refresh)
+        if changed and (raw := original.headers.get("Www-Authenticate")):
+            with self._lock:
+                if (entry := self._tokens.get(self._scope)) is not None:
+                    entry.challenge = auth_utils.parse_auth_header(raw)
+        return headers, changed
+
+    def _logout(self):
+        with self._lock:
+            self._tokens.clear()
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import io
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .provider import OMLMDRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+DEFAULT_CACHE_BLOCKS = 64
+
+
+class BlobReader(io.RawIOBase):
+    """
+    Read-only, seekable file over a blob of the registry, fetched on demand
+    with Range requests of whole `block_size` blocks, so that reading the
+    header of a large model takes one small request instead of a download.
+
+    Up to `cache_blocks` blocks are kept in memory, dropping the least recently
+    used. With a `backing_file`, blocks are stored there instead, each at its
+    offset in a sparse file of the blob's size, so that once the ranges needed
+    are read it can be memory-mapped; it is not kept across readers.
+
+    Bytes read this way are not verified against the digest.
+    """
+
+    def __init__(
+        self,
+        registry: OMLMDRegistry,
+        target: str,
+        digest: str,
+        size: int,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        cache_blocks: int = DEFAULT_CACHE_BLOCKS,
+        backing_file: Path | str | None = None,
+        name: str | None = None,
+    ):
+        super().__init__()
+        self.registry = registry
+        self.container = registry.get_container(target)
+        self.digest = digest
+        self.size = size
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.name = name or digest
+        self._position = 0
+        self._blocks: OrderedDict[int, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self._backing = None
+        # blocks already written to the backing file
+        self._stored: set[int] = set()
+        if backing_file is not None:
+            # open for the life of the reader, closed by `close`
+            self._backing = open(backing_file, "w+b")  # noqa: SIM115
+            self._backing.truncate(size)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        self._check_open()
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._check_open()
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        self._check_open()
+        view = memoryview(buffer).cast("B")
+        start = self._position
+        end = min(start + len(view), self.size)
+        if start >= end:
+            return 0
+        first, last = start // self.block_size, (end - 1) // self.block_size
+        blocks = self._read_blocks(first, last)
+        copied = 0
+        for index in range(first, last + 1):
+            block = blocks[index]
+            offset = start + copied - index * self.block_size
+            chunk = block[offset : offset + end - start - copied]
+            view[copied : copied + len(chunk)] = chunk
+            copied += len(chunk)
+        self._position = end
+        return copied
+
+    def readall(self) -> bytes:
+        # in one go, rather than the small reads of the default implementation
+        buffer = bytearray(max(0, self.size - self.tell()))
+        return bytes(buffer[: self.readinto(buffer)])
+
+    def _check_open(self) -> None:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+    def close(self) -> None:
+        if self._backing is not None:
+            self._backing.close()
+        super().close()
+
+    def _read_blocks(self, first: int, last: int) -> dict[int, bytes]:
+        """
+        Blocks `first` to `last`, the missing ones fetched with one Range
+        request per run of consecutive blocks.
+        """
+        with self._lock:
+            blocks = {}
+            missing = []
+            for index in range(first, last + 1):
+                if (block := self._cached(index)) is not None:
+                    blocks[index] = block
+                else:
+                    missing.append(index)
+            for run in _runs(missing):
+                start = run[0] * self.block_size
+                end = min((run[-1] + 1) * self.block_size, self.size)
+                data = self.registry.read_range(
+                    self.container, self.digest, start, end - 1
+                )
+                for index in run:
+                    offset = index * self.block_size - start
+                    blocks[index] = data[offset : offset + self.block_size]
+                    self._store(index, blocks[index])
+            return blocks
+
+    def _cached(self, index: int) -> bytes | None:
+        if self._backing is not None:
+            if index not in self._stored:
+                return None
+            self._backing.seek(index * self.block_size)
+            return self._backing.read(self.block_size)
+        if (block := self._blocks.get(index)) is not None:
+            self._blocks.move_to_end(index)
+        return block
+
+    def _store(self, index: int, block: bytes) -> None:
+        if self._backing is not None:
+            self._backing.seek(index * self.block_size)
+            self._backing.write(block)
+            # visible to a memory map of the file from now on
+            self._backing.flush()
+            self._stored.add(index)
+            return
+        self._blocks[index] = block
+        self._blocks.move_to_end(index)
+        while len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+
+
+def _runs(indices: list[int]) -> list[list[int]]:
+    runs: list[list[int]] = []
+    for index in indices:
+        if runs and runs[-1][-1] == index - 1:
+            runs[-1].append(index)
+        else:
+            runs.append([index])
+    return runs
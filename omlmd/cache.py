@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .digest import file_digest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024  # 10GiB
+FICLONE = 0x40049409  # linux/fs.h, copy-on-write clone of a whole file
+RENAME_EXCHANGE = 2  # linux/fs.h, atomically exchange two paths
+AT_FDCWD = -100
+
+
+def default_cache_dir() -> Path:
+    if env := os.environ.get("OMLMD_CACHE_DIR"):
+        return Path(env)
+    xdg = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(xdg) / "omlmd"
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    import fcntl  # not available on Windows, where we fall back to hardlinks
+
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+
+def place(src: Path, dst: Path, hardlink: bool = True) -> None:
+    """
+    Make `dst` have the content of `src` without copying data where the
+    filesystem allows it: reflink first, hardlink next unless `hardlink` is
+    False, plain copy as last resort. The destination is replaced atomically.
+    """
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        try:
+            _reflink(src, tmp)
+        except (OSError, ImportError):
+            tmp.unlink(missing_ok=True)
+            try:
+                if not hardlink:
+                    raise OSError("hardlink not wanted")
+                os.link(src, tmp)
+            except OSError:
+                shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _exchange(a: Path, b: Path) -> bool:
+    import ctypes  # renameat2 is Linux only, elsewhere we fall back to two renames
+
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return False
+    return (
+        renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE)
+        == 0
+    )
+
+
+def swap_directory(src: Path, dst: Path) -> None:
+    """
+    Put directory `src` in place of `dst`, so that `dst` always shows either
+    its old or its new content in full. The old content ends up at `src`.
+
+    Where the platform can't exchange two paths atomically, `dst` is briefly
+    missing between two renames.
+    """
+    if not dst.exists():
+        os.rename(src, dst)
+        return
+    if _exchange(src, dst):
+        return
+    old = src.with_name(src.name + ".old")
+    os.rename(dst, old)
+    os.rename(src, dst)
+    os.rename(old, src)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    bytes_saved: int = 0
+    evictions: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.hits} hit(s), {self.misses} miss(es), "
+            f"{self.bytes_saved} bytes served from cache, {self.evictions} eviction(s)"
+        )
+
+
+class BlobCache:
+    """
+    On-disk blob store keyed by digest, shared across pulls and tags.
+
+    Blobs are stored as `<root>/blobs/<algorithm>/<hex>`; a blob's mtime records
+    when it was last used, and the least recently used blobs are evicted once
+    the store grows beyond `max_size` bytes.
+
+    Blobs enter the cache as reflinks or copies, never sharing the inode of the
+    file they come from. Cached blobs are reflinked or hardlinked into the
+    output directory; a blob hardlinked there is verified before its next use,
+    as the pulled file may have been modified in place.
+    """
+
+    def __init__(
+        self, root: Path | str | None = None, max_size: int | None = DEFAULT_MAX_SIZE
+    ):
+        self.root = Path(root) if root is not None else default_cache_dir()
+        self.max_size = max_size
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def path_for(self, digest: str) -> Path:
+        algorithm, _, hex = digest.partition(":")
+        return self.root / "blobs" / algorithm / hex
+
+    def link_into(
+        self, digest: str, outfile: Path | str, size: int | None = None
+    ) -> bool:
+        """
+        Place the cached blob for `digest` at `outfile`, returning False on a miss.
+        """
+        blob = self.path_for(digest)
+        try:
+            st = blob.stat()
+        except FileNotFoundError:
+            st = None
+        if st is not None and not self._intact(blob, st, digest, size):
+            logger.warning(f"Dropping cached blob {digest} with unexpected content")
+            blob.unlink(missing_ok=True)
+            st = None
+        if st is None:
+            with self._lock:
+                self.stats.misses += 1
+            return False
+        place(blob, Path(outfile))
+        os.utime(blob)
+        with self._lock:
+            self.stats.hits += 1
+            self.stats.bytes_saved += st.st_size
+        return True
+
+    @staticmethod
+    def _intact(blob: Path, st: os.stat_result, digest: str, size: int | None) -> bool:
+        if size is not None and st.st_size != size:
+            return False
+        # hardlinked into an output directory, whose file may have been edited
+        if st.st_nlink > 1:
+            return file_digest(blob, digest.partition(":")[0]) == digest
+        return True
+
+    def add(self, digest: str, path: Path | str) -> None:
+        """
+        Store an already verified blob, then evict to stay within `max_size`.
+        """
+        blob = self.path_for(digest)
+        if blob.exists():
+            return
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        place(Path(path), blob, hardlink=False)
+        self.evict()
+
+    def size(self) -> int:
+        return sum(p.stat().st_size for p in self._blobs())
+
+    def evict(self) -> None:
+        if self.max_size is None:
+            return
+        with self._lock:
+            blobs = [(p, p.stat()) for p in self._blobs()]
+            total = sum(st.st_size for _, st in blobs)
+            for p, st in sorted(blobs, key=lambda b: b[1].st_mtime):
+                if total <= self.max_size:
+                    break
+                logger.debug(f"Evicting {p} from blob cache")
+                p.unlink(missing_ok=True)
+                total -= st.st_size
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root / "blobs", ignore_errors=True)
+
+    def _blobs(self):
+        blobs_dir = self.root / "blobs"
+        if not blobs_dir.exists():
+            return
+        for algorithm_dir in blobs_dir.iterdir():
+            for p in algorithm_dir.iterdir():
+                if p.is_file() and not p.name.startswith("."):
+                    yield p
+
+
+@dataclass
+class CachedManifest:
+    manifest: dict[str, Any]
+    digest: str | None
+    etag: str | None
+    accept: str
+    fetched_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class ManifestCacheStats:
+    hits: int = 0
+    misses: int = 0
+    revalidations: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.hits} hit(s), {self.misses} miss(es), {self.revalidations} revalidation(s)"
+
+
+class ManifestCache:
+    """
+    In-memory cache of manifests keyed by reference, and of config blobs keyed
+    by digest.
+
+    Manifests referenced by digest are immutable and served as long as they are
+    cached; manifests referenced by tag are trusted for `ttl` seconds, after which
+    the registry is asked whether the tag still points to the same digest.
+    Digests a tag resolved to without fetching its manifest are trusted as long.
+    Each map keeps at most `max_entries` entries, dropping the least recently used.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = ManifestCacheStats()
+        self._manifests: OrderedDict[str, CachedManifest] = OrderedDict()
+        self._configs: OrderedDict[str, str] = OrderedDict()
+        # reference -> (digest, resolved at), for tags resolved with a HEAD
+        self._digests: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, reference: str) -> CachedManifest | None:
+        with self._lock:
+            entry = self._manifests.get(reference)
+            if entry is not None:
+                self._manifests.move_to_end(reference)
+            return entry
+
+    def is_fresh(self, reference: str, entry: CachedManifest) -> bool:
+        if "@" in reference:
+            return True
+        return time.monotonic() - entry.fetched_at < self.ttl
+
+    def put(self, reference: str, entry: CachedManifest) -> None:
+        with self._lock:
+            self._manifests[reference] = entry
+            self._manifests.move_to_end(reference)
+            if len(self._manifests) > self.max_entries:
+                self._manifests.popitem(last=False)
+
+    def count(self, stat: str) -> None:
+        with self._lock:
+            setattr(self.stats, stat, getattr(self.stats, stat) + 1)
+
+    def invalidate(self, reference: str) -> None:
+        with self._lock:
+            self._manifests.pop(reference, None)
+            self._digests.pop(reference, None)
+
+    def resolved_digest(self, reference: str) -> str | None:
+        """
+        The digest a reference resolved to, as long as that resolution is fresh.
+        """
+        entry = self.get(reference)
+        if entry is not None and self.is_fresh(reference, entry) and entry.digest:
+            return entry.digest
+        with self._lock:
+            resolved = self._digests.get(reference)
+        if resolved is not None and time.monotonic() - resolved[1] < self.ttl:
+            return resolved[0]
+        return None
+
+    def put_digest(self, reference: str, digest: str) -> None:
+        """
+        Record the digest a reference resolved to, without its manifest.
+        """
+        with self._lock:
+            self._digests[reference] = (digest, time.monotonic())
+            self._digests.move_to_end(reference)
+            if len(self._digests) > self.max_entries:
+                self._digests.popitem(last=False)
+
+    def get_config(self, digest: str) -> str | None:
+        with self._lock:
+            config = self._configs.get(digest)
+            if config is not None:
+                self._configs.move_to_end(digest)
+            return config
+
+    def put_config(self, digest: str, config: str) -> None:
+        with self._lock:
+            self._configs[digest] = config
+            self._configs.move_to_end(digest)
+            if len(self._configs) > self.max_entries:
+                self._configs.popitem(last=False)
@@ -2,14 +2,30 @@
 
 from __future__ import annotations
 
+import glob
+import json
 import logging
+import os
+import sys
+import threading
+from dataclasses import asdict, fields
 from pathlib import Path
+from typing import TextIO
 
 import click
 import cloup
+from click.core import ParameterSource
+from oras.defaults import default_chunksize as DEFAULT_CHUNK_SIZE
 
+from .cache import DEFAULT_MAX_SIZE, BlobCache
+from .compression import COMPRESSIONS
+from .digest import DigestCache
 from .helpers import Helper
-from .model_metadata import deserialize_mdfile
+from .index import MetadataIndex, default_index_path
+from .model_metadata import ModelMetadata, deserialize_mdfile
+from .progress import Progress
+from .provider import DEFAULT_POOL_SIZE, LayerFilter, OMLMDRegistry
+from .tracing import SummaryExporter, tracer
 
 logger = logging.getLogger(__name__)
 
@@ -22,15 +38,155 @@ plain_http = click.option(
     show_default=True,
 )
 
+cache_dir = click.option(
+    "--cache-dir",
+    help="Local cache for downloaded blobs and digests of pushed files, shared across invocations",
+    envvar="OMLMD_CACHE_DIR",
+    type=click.Path(path_type=Path, file_okay=False, resolve_path=True),
+    default=None,
+)
+
+cache_max_size = click.option(
+    "--cache-max-size",
+    help="Size limit of the blob cache in bytes, least recently used blobs are evicted beyond it",
+    envvar="OMLMD_CACHE_MAX_SIZE",
+    type=click.IntRange(min=0),
+    default=DEFAULT_MAX_SIZE,
+    show_default=True,
+)
+
+
+progress = click.option(
+    "--progress/--no-progress",
+    "show_progress",
+    help="Show bytes transferred, rate and ETA on stderr  [default: when it is a terminal]",
+    default=None,
+)
+
+stall_timeout = click.option(
+    "--stall-timeout",
+    help="Seconds without receiving data after which a request is abandoned, and a download resumed",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+)
+
+
+def _megabytes(n: float) -> str:
+    return f"{n / 1e6:.1f} MB"
+
+
+class _ProgressLine:
+    """
+    Status line on stderr, rewritten on every progress update.
+    """
+
+    def __init__(self):
+        self._width = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, progress: Progress) -> None:
+        line = f"{progress.operation}: {progress.layers_done}/{progress.layers} layers, {_megabytes(progress.done)}"
+        if progress.total is not None:
+            line += f" of {_megabytes(progress.total)}"
+        line += f", {_megabytes(progress.rate)}/s"
+        if (eta := progress.eta) is not None:
+            line += f", {eta:.0f}s left"
+        with self._lock:
+            click.echo("\r" + line.ljust(self._width), nl=False, err=True)
+            self._width = len(line)
+            if progress.layers_done == progress.layers:
+                click.echo(err=True)
+                self._width = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._width:
+                click.echo(err=True)
+                self._width = 0
+
+
+def _progress(show_progress: bool | None) -> _ProgressLine | None:
+    if show_progress is None:
+        show_progress = sys.stderr.isatty()
+    if not show_progress:
+        return None
+    line = _ProgressLine()
+    click.get_current_context().call_on_close(line.close)
+    return line
+
+
+def _helper(
+    plain_http: bool,
+    cache_dir: Path | None = None,
+    cache_max_size: int | None = None,
+    **registry_options,
+) -> Helper:
+    if cache_dir is not None:
+        blob_cache = BlobCache(cache_dir, cache_max_size)
+        registry_options["blob_cache"] = blob_cache
+        registry_options["digest_cache"] = DigestCache(cache_dir / "digests.json")
+
+        def log_stats():
+            if blob_cache.stats.hits or blob_cache.stats.misses:
+                logger.info(f"Blob cache: {blob_cache.stats}")
+
+        click.get_current_context().call_on_close(log_stats)
+    helper = Helper.from_default_registry(plain_http, **registry_options)
+    ctx = click.get_current_context()
+
+    def log_pool_stats():
+        # one registry, and so one connection pool and set of tokens, per invocation
+        pool_stats = helper._registry.pool_stats()
+        logger.debug(f"Connection pool: {pool_stats}")
+        if ctx.find_object(SummaryExporter) is not None:
+            click.echo(f"Connection pool: {pool_stats}", err=True)
+
+    ctx.call_on_close(log_pool_stats)
+    return helper
+
 
 @cloup.group()
-def cli():
+@click.option(
+    "--timings",
+    help="Print how long each phase of the command took, and its throughput, to stderr",
+    is_flag=True,
+    default=False,
+)
+@click.pass_context
+def cli(ctx: click.Context, timings: bool):
     logging.basicConfig(level=logging.INFO)
+    if timings:
+        summary = ctx.obj = SummaryExporter()
+        tracer.add_exporter(summary)
+
+        def print_summary():
+            tracer.remove_exporter(summary)
+            click.echo(summary.summary(), err=True)
+
+        ctx.call_on_close(print_summary)
+
+
+def _annotation(ctx, param, values: tuple[str, ...]) -> dict[str, str]:
+    annotations = {}
+    for value in values:
+        key, sep, annotation = value.partition("=")
+        if not sep:
+            raise click.BadParameter(f"'{value}' is not in key=value form")
+        annotations[key] = annotation
+    return annotations
 
 
 @cli.command()
 @plain_http
-@click.argument("target", required=True)
+@cache_dir
+@cache_max_size
+@click.argument("targets", nargs=-1)
+@click.option(
+    "--targets-file",
+    "-f",
+    help="File listing targets to pull, one per line",
+    type=click.File("r"),
+)
 @click.option(
     "-o",
     "--output",
@@ -39,9 +195,124 @@ def cli():
     type=click.Path(path_type=Path, resolve_path=True),
 )
 @click.option("--media-types", "-m", multiple=True, default=[])
-def pull(plain_http: bool, target: str, output: Path, media_types: tuple[str]):
-    """Pulls an OCI Artifact containing ML model and metadata, filtering if necessary."""
-    Helper.from_default_registry(plain_http).pull(target, output, media_types)
+@click.option(
+    "--include",
+    "-i",
+    help="Pull only layers whose title matches one of these glob patterns",
+    multiple=True,
+)
+@click.option(
+    "--exclude",
+    "-x",
+    help="Skip layers whose title matches one of these glob patterns",
+    multiple=True,
+)
+@click.option(
+    "--annotation",
+    "annotations",
+    help="Pull only layers with this annotation, as key=value",
+    multiple=True,
+    callback=_annotation,
+)
+@click.option(
+    "--min-size",
+    help="Skip layers smaller than this many bytes",
+    type=click.IntRange(min=0),
+)
+@click.option(
+    "--max-size",
+    help="Skip layers larger than this many bytes",
+    type=click.IntRange(min=0),
+)
+@click.option(
+    "--jobs",
+    "-j",
+    help="Number of layers to download concurrently, across all targets",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "--atomic",
+    help="Stage layers next to the output directory and swap it in once complete, reusing unchanged files; the output directory must be new, empty or from an earlier atomic pull",
+    is_flag=True,
+    default=False,
+)
+@click.option(
+    "--max-bandwidth",
+    help="Cap on the combined download rate, in bytes per second",
+    type=click.IntRange(min=1),
+    default=None,
+)
+@progress
+@stall_timeout
+def pull(
+    plain_http: bool,
+    cache_dir: Path | None,
+    cache_max_size: int,
+    targets: tuple[str, ...],
+    targets_file: TextIO | None,
+    output: Path,
+    media_types: tuple[str],
+    include: tuple[str, ...],
+    exclude: tuple[str, ...],
+    annotations: dict[str, str],
+    min_size: int | None,
+    max_size: int | None,
+    jobs: int,
+    atomic: bool,
+    max_bandwidth: int | None,
+    show_progress: bool | None,
+    stall_timeout: float | None,
+):
+    """Pulls an OCI Artifact containing ML model and metadata, filtering if necessary.
+
+    With several targets, each is pulled into <output>/<registry>/<repository>/<tag>
+    and a JSON summary of the outcome for each target is printed.
+
+    Layers are selected from the manifest, so the bytes of the others are never requested.
+    """
+    if targets_file is not None:
+        targets += tuple(
+            line.strip()
+            for line in targets_file
+            if line.strip() and not line.lstrip().startswith("#")
+        )
+    if not targets:
+        raise click.UsageError("Missing target to pull.")
+    single = len(targets) == 1 and targets_file is None
+    if atomic and not single:
+        raise click.UsageError("--atomic is only supported when pulling one target.")
+    if (
+        atomic
+        and click.get_current_context().get_parameter_source("output")
+        is ParameterSource.DEFAULT
+    ):
+        # the output directory is replaced as a whole, never default to the cwd
+        raise click.UsageError("--atomic requires an explicit --output directory.")
+    helper = _helper(
+        plain_http,
+        cache_dir,
+        cache_max_size,
+        pool_size=max(DEFAULT_POOL_SIZE, jobs * OMLMDRegistry.range_parts),
+        max_bandwidth=max_bandwidth,
+        stall_timeout=stall_timeout,
+    )
+    layer_filter = LayerFilter(include, exclude, annotations, min_size, max_size)
+    progress = _progress(show_progress)
+    if single:
+        helper.pull(
+            targets[0], output, media_types, jobs, atomic, progress, layer_filter
+        )
+        return
+    results = helper.pull_many(
+        targets, output, media_types, jobs, progress, layer_filter
+    )
+    if progress is not None:
+        progress.close()
+    click.echo(json.dumps([asdict(r) for r in results], indent=2))
+    if any(r.error for r in results):
+        click.get_current_context().exit(1)
 
 
 @cli.group()
@@ -51,28 +322,85 @@ def get():
 
 @get.command()
 @plain_http
+@cache_dir
+@cache_max_size
 @click.argument("target", required=True)
-def config(plain_http: bool, target: str):
+def config(plain_http: bool, cache_dir: Path | None, cache_max_size: int, target: str):
     """Outputs configuration of the given OCI Artifact for ML model and metadata."""
-    click.echo(Helper.from_default_registry(plain_http).get_config(target))
+    click.echo(_helper(plain_http, cache_dir, cache_max_size).get_config(target))
+
+
+@get.command()
+@plain_http
+@click.argument("targets", required=True, nargs=-1)
+@click.option(
+    "--jobs",
+    "-j",
+    help="Number of targets to look up concurrently",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+def metadata(plain_http: bool, targets: tuple[str], jobs: int):
+    """Outputs model metadata of the given OCI Artifacts, from their manifest when possible."""
+    helper = _helper(plain_http, pool_size=max(DEFAULT_POOL_SIZE, jobs))
+    results = helper.get_metadata_many(targets, jobs)
+    click.echo(
+        json.dumps(
+            [
+                {"reference": target, "error": str(md)}
+                if isinstance(md, BaseException)
+                else {"reference": target, "metadata": md.to_dict()}
+                for target, md in results.items()
+            ],
+            indent=2,
+        )
+    )
 
 
 @cli.command()
 @plain_http
+@cache_dir
+@cache_max_size
 @click.argument("targets", required=True, nargs=-1)
-def crawl(plain_http: bool, targets: tuple[str]):
+@click.option(
+    "--jobs",
+    "-j",
+    help="Number of targets to crawl concurrently",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "--ndjson",
+    help="Stream one JSON result per line as soon as each target is crawled",
+    is_flag=True,
+    default=False,
+)
+def crawl(
+    plain_http: bool,
+    cache_dir: Path | None,
+    cache_max_size: int,
+    targets: tuple[str],
+    jobs: int,
+    ndjson: bool,
+):
     """Crawls configuration for the given list of OCI Artifact for ML model and metadata."""
-    click.echo(Helper.from_default_registry(plain_http).crawl(targets))
+    helper = _helper(
+        plain_http, cache_dir, cache_max_size, pool_size=max(DEFAULT_POOL_SIZE, jobs)
+    )
+    if ndjson:
+        for result in helper.crawl_stream(targets, jobs):
+            click.echo(json.dumps(result))
+    else:
+        click.echo(helper.crawl(targets, jobs))
 
 
 @cli.command()
 @plain_http
+@cache_dir
 @click.argument("target", required=True)
-@click.argument(
-    "path",
-    required=True,
-    type=click.Path(path_type=Path, exists=True, resolve_path=True),
-)
+@click.argument("path", required=True)
 @cloup.option_group(
     "Metadata options",
     cloup.option(
@@ -84,16 +412,196 @@ def crawl(plain_http: bool, targets: tuple[str]):
     cloup.option("--empty-metadata", help="Push with empty metadata", is_flag=True),
     constraint=cloup.constraints.require_one,
 )
+@click.option(
+    "--jobs",
+    "-j",
+    help="Number of files to hash and upload concurrently",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "--chunk-size",
+    help="Size in bytes of each chunk when uploading layers",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CHUNK_SIZE,
+    show_default=True,
+)
+@click.option(
+    "--compress",
+    "compression",
+    help="Compress model files for upload, unless their content is already dense",
+    type=click.Choice(COMPRESSIONS),
+)
+@click.option(
+    "--mount-from",
+    help="Repository on the same registry to mount existing layers from, instead of uploading them",
+    multiple=True,
+    default=[],
+)
+@progress
+@stall_timeout
 def push(
     plain_http: bool,
+    cache_dir: Path | None,
     target: str,
-    path: Path,
+    path: str,
     metadata: Path | None,
     empty_metadata: bool,
+    jobs: int,
+    chunk_size: int,
+    compression: str | None,
+    mount_from: tuple[str],
+    show_progress: bool | None,
+    stall_timeout: float | None,
 ):
-    """Pushes an OCI Artifact containing ML model and metadata, supplying metadata from file as necessary"""
+    """Pushes an OCI Artifact containing ML model and metadata, supplying metadata from file as necessary
+
+    PATH is a model file, a directory or a quoted glob pattern; each file is
+    pushed as a layer of its own. Hidden files of a directory are left out."""
 
+    # an existing path is taken literally, even with wildcard characters in it
+    if not os.path.exists(path) and not glob.glob(path, recursive=True):
+        raise click.BadParameter(f"{path!r} matches no file.", param_hint="PATH")
     if empty_metadata:
         logger.warning(f"Pushing to {target} with empty metadata.")
     md = deserialize_mdfile(metadata) if metadata else {}
-    click.echo(Helper.from_default_registry(plain_http).push(target, path, **md))
+    helper = _helper(
+        plain_http,
+        cache_dir,
+        upload_jobs=jobs,
+        upload_chunk_size=chunk_size,
+        pool_size=max(DEFAULT_POOL_SIZE, jobs),
+        stall_timeout=stall_timeout,
+    )
+    progress = _progress(show_progress)
+    # every other key is a custom property, whatever option of push it names
+    known = {f.name for f in fields(ModelMetadata)}
+    result = helper.push(
+        target,
+        path,
+        mount_from=mount_from,
+        progress=progress,
+        compression=compression,
+        custom_properties={k: v for k, v in md.items() if k not in known},
+        **{k: v for k, v in md.items() if k in known},
+    )
+    if progress is not None:
+        progress.close()
+    click.echo(result)
+
+
+index_path = click.option(
+    "--index",
+    "index_path",
+    help="Local metadata index",
+    envvar="OMLMD_INDEX",
+    type=click.Path(path_type=Path, dir_okay=False, resolve_path=True),
+    default=default_index_path,
+    show_default="cache directory/index.sqlite",
+)
+
+
+@cli.command()
+@plain_http
+@index_path
+@click.argument("targets", required=True, nargs=-1)
+@click.option(
+    "--jobs",
+    "-j",
+    help="Number of targets to index concurrently",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+def index(plain_http: bool, index_path: Path, targets: tuple[str], jobs: int):
+    """Adds metadata of the given OCI Artifacts to the local index, fetching only what changed."""
+    helper = _helper(plain_http, pool_size=max(DEFAULT_POOL_SIZE, jobs))
+    with MetadataIndex(index_path) as metadata_index:
+        stats = metadata_index.refresh(helper, targets, jobs)
+    click.echo(f"Index {index_path}: {stats}")
+    if stats.errors:
+        click.get_current_context().exit(1)
+
+
+@cli.command()
+@plain_http
+@index_path
+@click.argument("registry", required=True)
+@click.option(
+    "--repository",
+    "-r",
+    "repositories",
+    help="Repository to sync, instead of every repository in the registry catalog",
+    multiple=True,
+)
+@click.option(
+    "--jobs",
+    "-j",
+    help="Number of repositories and references to process concurrently",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+def sync(
+    plain_http: bool,
+    index_path: Path,
+    registry: str,
+    repositories: tuple[str],
+    jobs: int,
+):
+    """Syncs the local index with the tags of a registry, fetching only what changed since the last sync."""
+    helper = _helper(plain_http, pool_size=max(DEFAULT_POOL_SIZE, jobs))
+    with MetadataIndex(index_path) as metadata_index:
+        stats = metadata_index.sync(helper, registry, repositories or None, jobs)
+    click.echo(f"Index {index_path}: {stats}")
+    for target, error in stats.errors.items():
+        click.echo(f"Failed {target}: {error}", err=True)
+    if stats.errors:
+        click.get_current_context().exit(1)
+
+
+def _property(ctx, param, values: tuple[str, ...]) -> dict:
+    properties = {}
+    for value in values:
+        key, sep, raw = value.partition("=")
+        if not sep:
+            raise click.BadParameter(f"'{value}' is not in key=value form")
+        try:
+            properties[key] = json.loads(raw)
+        except json.JSONDecodeError:
+            properties[key] = raw
+        if isinstance(properties[key], (dict, list)):
+            raise click.BadParameter(f"'{value}' is not a string, number or boolean")
+    return properties
+
+
+@cli.command()
+@index_path
+@click.option("--name")
+@click.option("--author")
+@click.option("--model-format-name")
+@click.option("--model-format-version")
+@click.option(
+    "--property",
+    "-p",
+    "properties",
+    help="Custom property to match, as key=value",
+    multiple=True,
+    callback=_property,
+)
+def search(index_path: Path, properties: dict, **fields: str | None):
+    """Searches the local index for models with matching metadata, without contacting registries."""
+    with MetadataIndex(index_path) as metadata_index:
+        entries = metadata_index.search(
+            properties, **{k: v for k, v in fields.items() if v is not None}
+        )
+    click.echo(
+        json.dumps(
+            [
+                {"reference": e.reference, "digest": e.digest, **e.metadata.to_dict()}
+                for e in entries
+            ],
+            indent=2,
+        )
+    )
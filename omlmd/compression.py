@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+from .constants import ANNOTATION_UNCOMPRESSED_DIGEST, ANNOTATION_UNCOMPRESSED_SIZE
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIONS = ("gzip", "zstd")
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+# data compressing to more than this fraction of its size is considered dense
+MAX_RATIO = 0.9
+SAMPLES = 4
+SAMPLE_SIZE = 256 * 1024
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "zstd compression requires the zstandard package, see omlmd[zstd]"
+        ) from e
+    return zstandard
+
+
+def _check(compression: str) -> None:
+    if compression not in COMPRESSIONS:
+        raise ValueError(
+            f"Unsupported compression {compression!r}, expected one of {', '.join(COMPRESSIONS)}"
+        )
+
+
+def compressor(compression: str):
+    """
+    Streaming compressor with `compress(data)` and `flush()`. Its output only
+    depends on the input, so that unchanged files keep their digest.
+    """
+    _check(compression)
+    if compression == "zstd":
+        # multithreaded, whose output doesn't depend on the number of threads
+        return (
+            _zstandard()
+            .ZstdCompressor(level=ZSTD_LEVEL, threads=-1, write_checksum=False)
+            .compressobj()
+        )
+    # a gzip member without file name nor timestamp
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+def decompressor(compression: str):
+    """
+    Streaming decompressor with `decompress(data)` and `flush()`.
+    """
+    _check(compression)
+    if compression == "zstd":
+        return _zstandard().ZstdDecompressor().decompressobj()
+    return zlib.decompressobj(31)
+
+
+def compression_of(media_type: str) -> str | None:
+    """
+    The compression named by the `+gzip` or `+zstd` suffix of `media_type`.
+    """
+    _, plus, suffix = media_type.rpartition("+")
+    return suffix if plus and suffix in COMPRESSIONS else None
+
+
+def base_media_type(media_type: str) -> str:
+    """
+    `media_type` without its compression suffix.
+    """
+    if compression_of(media_type) is None:
+        return media_type
+    return media_type.rpartition("+")[0]
+
+
+@dataclass
+class CompressedLayer:
+    """
+    How the content of a layer compressed on push is restored on pull.
+    """
+
+    compression: str
+    # digest and size of the content once decompressed
+    content_digest: str
+    content_size: int | None = None
+
+    @classmethod
+    def of(cls, layer: dict) -> CompressedLayer | None:
+        """
+        The compression of a layer descriptor, if it was compressed by omlmd;
+        other compressed layers, such as tarballs of directories, are left as is.
+        """
+        compression = compression_of(layer.get("mediaType", ""))
+        annotations = layer.get("annotations") or {}
+        if compression is None or ANNOTATION_UNCOMPRESSED_DIGEST not in annotations:
+            return None
+        size = annotations.get(ANNOTATION_UNCOMPRESSED_SIZE)
+        return cls(
+            compression,
+            annotations[ANNOTATION_UNCOMPRESSED_DIGEST],
+            int(size) if size is not None else None,
+        )
+
+    def annotations(self) -> dict[str, str]:
+        annotations = {ANNOTATION_UNCOMPRESSED_DIGEST: self.content_digest}
+        if self.content_size is not None:
+            annotations[ANNOTATION_UNCOMPRESSED_SIZE] = str(self.content_size)
+        return annotations
+
+
+def is_dense(path: Path | str) -> bool:
+    """
+    Whether the file at `path` hardly compresses, judging from a fast
+    compression of a few samples spread over it.
+    """
+    size = os.path.getsize(path)
+    samples = []
+    with open(path, "rb") as f:
+        for i in range(SAMPLES):
+            f.seek(size * i // SAMPLES)
+            samples.append(f.read(SAMPLE_SIZE))
+    data = b"".join(samples)
+    if not data:
+        return True
+    return len(zlib.compress(data, 1)) > MAX_RATIO * len(data)
+
+
+def compress_file(
+    src: Path | str, dst: Path | str, compression: str
+) -> tuple[str, CompressedLayer]:
+    """
+    Compress `src` into `dst`, returning the digest of `dst` and that of `src`,
+    both computed on the way.
+    """
+    digest, content_digest = hashlib.sha256(), hashlib.sha256()
+    content_size = 0
+    c = compressor(compression)
+    with tracer.span("compress", compression=compression) as span:
+        with open(src, "rb") as fin, open(dst, "wb") as fout:
+            while chunk := fin.read(CHUNK_SIZE):
+                content_digest.update(chunk)
+                content_size += len(chunk)
+                out = c.compress(chunk)
+                digest.update(out)
+                fout.write(out)
+            out = c.flush()
+            digest.update(out)
+            fout.write(out)
+        span.bytes = content_size
+        span.attributes["ratio"] = round(os.path.getsize(dst) / max(content_size, 1), 3)
+    return f"sha256:{digest.hexdigest()}", CompressedLayer(
+        compression, f"sha256:{content_digest.hexdigest()}", content_size
+    )
@@ -2,3 +2,6 @@ FILENAME_METADATA_JSON = "model_metadata.omlmd.json"
 FILENAME_METADATA_YAML = "model_metadata.omlmd.yaml"
 MIME_APPLICATION_CONFIG = "application/x-config"
 MIME_APPLICATION_MLMODEL = "application/x-mlmodel"
+# digest and size of the content of a layer compressed on push
+ANNOTATION_UNCOMPRESSED_DIGEST = "io.omlmd.uncompressed.digest"
+ANNOTATION_UNCOMPRESSED_SIZE = "io.omlmd.uncompressed.size"
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 8 * 1024 * 1024
+
+
+def file_digest(path: Path | str, algorithm: str = "sha256") -> str:
+    """
+    Digest of a file in the `<algorithm>:<hex>` form, read into one reused buffer.
+    """
+    hasher = hashlib.new(algorithm)
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while n := f.readinto(buffer):
+            hasher.update(view[:n])
+    return f"{algorithm}:{hasher.hexdigest()}"
+
+
+class DigestCache:
+    """
+    Sidecar JSON file remembering the digest of local files, keyed by path and
+    valid as long as the file keeps the same size and modification time.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self._entries: dict[str, dict] | None = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, dict]:
+        if self._entries is None:
+            try:
+                self._entries = json.loads(self.path.read_text())
+            except (FileNotFoundError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    @staticmethod
+    def _valid(entry: dict, st: os.stat_result) -> bool:
+        return entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns
+
+    def get(self, path: Path | str, st: os.stat_result) -> str | None:
+        with self._lock:
+            entry = self._load().get(os.path.abspath(path))
+        return entry["digest"] if entry and self._valid(entry, st) else None
+
+    def get_compressed(
+        self, path: Path | str, st: os.stat_result, compression: str
+    ) -> tuple[str, str, int] | None:
+        """
+        Digest of an unchanged file with the digest and size of its `compression`
+        copy, as recorded by `put_compressed`.
+        """
+        with self._lock:
+            entry = self._load().get(os.path.abspath(path))
+        if not entry or not self._valid(entry, st):
+            return None
+        if (packed := entry.get("compressed", {}).get(compression)) is None:
+            return None
+        return entry["digest"], packed["digest"], packed["size"]
+
+    def put_compressed(
+        self,
+        path: Path | str,
+        st: os.stat_result,
+        digest: str,
+        compression: str,
+        compressed_digest: str,
+        compressed_size: int,
+    ) -> None:
+        with self._lock:
+            entries = self._load()
+            key = os.path.abspath(path)
+            entry = entries.get(key)
+            if not entry or not self._valid(entry, st) or entry["digest"] != digest:
+                entry = entries[key] = {
+                    "size": st.st_size,
+                    "mtime": st.st_mtime_ns,
+                    "digest": digest,
+                }
+            entry.setdefault("compressed", {})[compression] = {
+                "digest": compressed_digest,
+                "size": compressed_size,
+            }
+            self._dirty = True
+
+    def put(self, path: Path | str, st: os.stat_result, digest: str) -> None:
+        with self._lock:
+            self._load()[os.path.abspath(path)] = {
+                "size": st.st_size,
+                "mtime": st.st_mtime_ns,
+                "digest": digest,
+            }
+            self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty or self._entries is None:
+                return
+            entries = {p: e for p, e in self._entries.items() if os.path.exists(p)}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(entries))
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+def compute_digests(
+    paths: Sequence[Path | str], jobs: int = 1, cache: DigestCache | None = None
+) -> dict[str, str]:
+    """
+    Digest of each of the `paths`, hashing up to `jobs` files in parallel and
+    skipping files whose digest is still valid in `cache`.
+    """
+
+    def digest_of(path: Path | str) -> str:
+        with tracer.span("digest", path=str(path)) as span:
+            st = os.stat(path)
+            if cache is not None and (digest := cache.get(path, st)) is not None:
+                logger.debug(f"Reusing digest of unchanged {path}")
+                span.attributes["outcome"] = "cached"
+                return digest
+            digest = file_digest(path)
+            span.bytes = st.st_size
+            if cache is not None:
+                cache.put(path, st, digest)
+            return digest
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        digests = dict(zip(map(str, paths), executor.map(digest_of, paths)))
+    if cache is not None:
+        cache.save()
+    return digests
@@ -1,24 +1,60 @@
 from __future__ import annotations
 
+import glob
+import io
+import json
 import logging
 import os
+import threading
 import urllib.request
-from collections.abc import Sequence
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field, fields
 from pathlib import Path
+from typing import Any
 
+import oras.container
+from oras.defaults import annotation_title as ANNOTATION_TITLE
+
+from .blob_reader import DEFAULT_BLOCK_SIZE, DEFAULT_CACHE_BLOCKS, BlobReader
+from .compression import CompressedLayer
 from .constants import (
     FILENAME_METADATA_JSON,
     FILENAME_METADATA_YAML,
     MIME_APPLICATION_CONFIG,
     MIME_APPLICATION_MLMODEL,
 )
-from .listener import Event, Listener, PushEvent
+from .listener import (
+    ConfigEvent,
+    CrawlEvent,
+    Event,
+    EventBus,
+    Listener,
+    PullEvent,
+    PushEvent,
+    notify,
+)
 from .model_metadata import ModelMetadata
-from .provider import OMLMDRegistry
+from .progress import ProgressCallback
+from .provider import REGISTRY_ERRORS, InMemoryBlob, LayerFilter, OMLMDRegistry
+from .tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+_shared_registries: dict[bool, OMLMDRegistry] = {}
+_shared_registries_lock = threading.Lock()
+
+
+def shared_registry(insecure: bool) -> OMLMDRegistry:
+    """
+    Registry with default settings shared process-wide, so that helpers reuse
+    its pooled connections, bearer tokens and cached manifests.
+    """
+    with _shared_registries_lock:
+        if insecure not in _shared_registries:
+            _shared_registries[insecure] = OMLMDRegistry(insecure=insecure)
+        return _shared_registries[insecure]
+
 
 def download_file(uri: str):
     file_name = os.path.basename(uri)
@@ -26,16 +62,105 @@ def download_file(uri: str):
     return file_name
 
 
+def model_files(path: Path | str) -> tuple[Path, list[Path]]:
+    """
+    The files of the model at `path`, a file, a directory or a glob pattern,
+    with the directory their layer titles are relative to.
+
+    A directory stands for every file under it, except hidden ones such as
+    `.git/`, which glob patterns don't match either; metadata sidecar files at
+    the root of the model are left out, as they are pushed as metadata layers.
+    """
+    path = Path(path)
+    if path.is_file():
+        return path.parent, [path]
+    if path.is_dir():
+        root = path
+        files = [
+            p
+            for p in path.rglob("*")
+            if p.is_file()
+            and not any(part.startswith(".") for part in p.relative_to(root).parts)
+        ]
+    else:
+        parts = path.parts
+        # the deepest existing directory is literal, even with wildcards in its name
+        base = max(i for i in range(len(parts)) if Path(*parts[:i]).is_dir())
+        pattern = (
+            os.path.join(glob.escape(str(Path(*parts[:base]))), *parts[base:])
+            if base
+            else str(path)
+        )
+        # titles are relative to the deepest directory without wildcards
+        literal = next(
+            (i for i in range(base, len(parts)) if glob.has_magic(parts[i])),
+            len(parts) - 1,
+        )
+        root = Path(*parts[:literal])
+        files = [
+            Path(p) for p in glob.glob(pattern, recursive=True) if os.path.isfile(p)
+        ]
+    files = sorted(
+        (
+            p
+            for p in files
+            if p.parent != root
+            or p.name not in (FILENAME_METADATA_JSON, FILENAME_METADATA_YAML)
+        ),
+        key=lambda p: p.relative_to(root).as_posix(),
+    )
+    if not files:
+        raise FileNotFoundError(f"No model file found at {path}")
+    return root, files
+
+
+def target_dir(outdir: Path | str, target: str) -> Path:
+    """
+    Directory of `outdir` dedicated to one reference, as `<registry>/<repository>/<tag>`.
+    """
+    container = oras.container.Container(target)
+    version = container.digest or container.tag
+    return (
+        Path(outdir)
+        / container.registry.replace(":", "_")
+        / container.api_prefix
+        / version.replace(":", "_")
+    )
+
+
+@dataclass
+class PullResult:
+    reference: str
+    path: str
+    files: list[str] = field(default_factory=list)
+    error: str | None = None
+
+
 @dataclass
 class Helper:
     _registry: OMLMDRegistry = field(
         default_factory=lambda: OMLMDRegistry(insecure=True)
     )
     _listeners: list[Listener] = field(default_factory=list)
+    # delivers events to listeners in the background, else they are notified inline
+    event_bus: EventBus | None = None
 
     @classmethod
-    def from_default_registry(cls, insecure: bool):
-        return cls(OMLMDRegistry(insecure=insecure))
+    def from_default_registry(cls, insecure: bool, shared: bool = False, **kwargs):
+        """
+        Helper for a registry of its own with default settings; `kwargs` such as
+        `blob_cache` or `upload_jobs` are passed on to `OMLMDRegistry`.
+
+        With `shared`, the registry is instead the process-wide `shared_registry`,
+        whose settings cannot be changed.
+        """
+        if shared:
+            if kwargs:
+                raise ValueError(
+                    f"Cannot configure the shared registry: {', '.join(kwargs)}"
+                )
+            return cls(shared_registry(insecure))
+        return cls(OMLMDRegistry(insecure=insecure, **kwargs))
 
     def push(
         self,
@@ -46,13 +171,37 @@ class Helper:
         author: str | None = None,
         model_format_name: str | None = None,
         model_format_version: str | None = None,
+        mount_from: Sequence[str] | None = None,
+        progress: ProgressCallback | None = None,
+        compression: str | None = None,
+        custom_properties: dict[str, Any] | None = None,
         **kwargs,
     ):
+        """
+        Push the model at `path` with its metadata; any unknown keyword argument
+        becomes a custom property. `custom_properties` may hold any key, even
+        one naming an option of `push` such as `compression`.
+
+        `path` is a file, a directory or a glob pattern, see `model_files`. Each
+        file is a layer of its own, titled with its path relative to the model,
+        so that a pull rebuilds the tree and unchanged files are shared between
+        versions rather than uploaded again. Layers already stored in one of the
+        `mount_from` repositories of the same registry are mounted, not uploaded.
+
+        The metadata layers are serialized and uploaded from memory, so nothing
+        is written next to the model, which may live on read-only storage.
+
+        `progress` is called with the bytes uploaded so far, see `TransferProgress`.
+
+        With a `compression`, gzip or zstd, model files which aren't already
+        dense are compressed for upload, and decompressed again by a pull.
+        """
         dataclass_fields = {
             f.name for f in fields(ModelMetadata)
         }  # avoid anything specified in kwargs which would collide
         custom_properties = {
-            k: v for k, v in kwargs.items() if k not in dataclass_fields
+            **(custom_properties or {}),
+            **{k: v for k, v in kwargs.items() if k not in dataclass_fields},
         }
         model_metadata = ModelMetadata(
             name=name,
@@ -62,63 +211,272 @@ class Helper:
             model_format_name=model_format_name,
             model_format_version=model_format_version,
         )
-        owns_meta_files = True
-        if isinstance(path, str):
-            path = Path(path)
+        root, files = model_files(path)
 
-        json_meta = path.parent / FILENAME_METADATA_JSON
-        yaml_meta = path.parent / FILENAME_METADATA_YAML
+        json_meta = root / FILENAME_METADATA_JSON
+        yaml_meta = root / FILENAME_METADATA_YAML
         if model_metadata.is_empty() and json_meta.exists() and yaml_meta.exists():
-            owns_meta_files = False
             logger.warning("No metadata supplied, but reusing md files found in path.")
             logger.debug(f"{json_meta}, {yaml_meta}")
-            with open(json_meta, "r") as f:
-                model_metadata = ModelMetadata.from_json(f.read())
-        elif (p := json_meta).exists() or (p := yaml_meta).exists():
-            raise RuntimeError(
-                f"File '{p}' already exists. Aborting TODO: demonstrator."
-            )
+            json_bytes, yaml_bytes = json_meta.read_bytes(), yaml_meta.read_bytes()
+            model_metadata = ModelMetadata.from_json(json_bytes.decode())
         else:
-            json_meta.write_text(model_metadata.to_json())
-            yaml_meta.write_text(model_metadata.to_yaml())
+            # serialized in memory, nothing is written next to the model
+            with tracer.span("metadata.serialize") as span:
+                json_bytes = model_metadata.to_json().encode()
+                yaml_bytes = model_metadata.to_yaml().encode()
+                span.bytes = len(json_bytes) + len(yaml_bytes)
 
-        manifest_cfg = f"{json_meta}:{MIME_APPLICATION_CONFIG}"
-        files = [
-            f"{path}:{MIME_APPLICATION_MLMODEL}",
-            manifest_cfg,
-            f"{yaml_meta}:{MIME_APPLICATION_CONFIG}",
-        ]
-        try:
-            # print(target, files, model_metadata.to_annotations_dict())
+        config = InMemoryBlob(
+            FILENAME_METADATA_JSON, json_bytes, MIME_APPLICATION_CONFIG
+        )
+        with tracer.span("push", target=target):
             result = self._registry.push(
                 target=target,
-                files=files,
+                files=[f"{file}:{MIME_APPLICATION_MLMODEL}" for file in files],
+                contents=[
+                    config,
+                    InMemoryBlob(
+                        FILENAME_METADATA_YAML, yaml_bytes, MIME_APPLICATION_CONFIG
+                    ),
+                ],
                 manifest_annotations=model_metadata.to_annotations_dict(),
-                manifest_config=manifest_cfg,
+                manifest_config_content=config,
                 do_chunked=True,
+                mount_from=mount_from,
+                progress=progress,
+                root=str(root),
+                compression=compression,
             )
-            self.notify_listeners(
-                PushEvent.from_response(result, target, model_metadata)
-            )
-            return result
-        finally:
-            if owns_meta_files:
-                json_meta.unlink()
-                yaml_meta.unlink()
+        self.notify_listeners(PushEvent.from_response(result, target, model_metadata))
+        return result
 
     def pull(
-        self, target: str, outdir: Path | str, media_types: Sequence[str] | None = None
-    ):
-        self._registry.download_layers(target, outdir, media_types)
+        self,
+        target: str,
+        outdir: Path | str,
+        media_types: Sequence[str] | None = None,
+        jobs: int = 1,
+        atomic: bool = False,
+        progress: ProgressCallback | None = None,
+        layer_filter: LayerFilter | None = None,
+    ) -> list[str]:
+        """
+        Pull the layers of `target` into `outdir`, up to `jobs` at a time; with
+        a `layer_filter`, only the layers it matches are downloaded.
+
+        With `atomic`, `outdir` is replaced in one swap once every layer is
+        pulled, and files it already holds are reused rather than downloaded;
+        it has to be new, empty or made by an earlier atomic pull.
+
+        `progress` is called with the bytes downloaded so far, see `TransferProgress`.
+        """
+        with tracer.span("pull", target=target):
+            files = self._registry.download_layers(
+                target, outdir, media_types, jobs, atomic, progress, layer_filter
+            )
+        self.notify_listeners(PullEvent(target, str(outdir), files))
+        return files
+
+    def pull_many(
+        self,
+        targets: Sequence[str],
+        outdir: Path | str,
+        media_types: Sequence[str] | None = None,
+        jobs: int = 1,
+        progress: ProgressCallback | None = None,
+        layer_filter: LayerFilter | None = None,
+    ) -> list[PullResult]:
+        """
+        Pull each of `targets` into its own `target_dir` of `outdir`, with up to
+        `jobs` layers downloading at a time across all targets; layers shared by
+        several targets are downloaded only once.
+
+        A target which cannot be pulled doesn't abort the others, its result
+        holds the error instead.
+        """
+        dirs = {target: target_dir(outdir, target) for target in dict.fromkeys(targets)}
+        with tracer.span("pull", targets=len(dirs)):
+            pulled = self._registry.download_many(
+                [(target, str(path)) for target, path in dirs.items()],
+                media_types,
+                jobs,
+                progress,
+                layer_filter,
+            )
+        results = []
+        for target, path in dirs.items():
+            outcome = pulled[target]
+            if isinstance(outcome, BaseException):
+                logger.warning(f"Unable to pull {target}: {outcome}")
+                results.append(PullResult(target, str(path), error=str(outcome)))
+            else:
+                results.append(PullResult(target, str(path), files=outcome))
+                self.notify_listeners(PullEvent(target, str(path), outcome))
+        return results
+
+    def open(
+        self,
+        target: str,
+        title: str,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        cache_blocks: int = DEFAULT_CACHE_BLOCKS,
+        backing_file: Path | str | None = None,
+    ) -> io.RawIOBase:
+        """
+        Open the layer of `target` titled `title` as a read-only, seekable file
+        whose bytes are fetched on demand with Range requests, see `BlobReader`;
+        a layer in the blob cache is read from there instead.
+
+        A compressed layer can only be opened from the blob cache.
+        """
+        manifest = self._registry.get_manifest(target)
+        layer = next(
+            (
+                layer
+                for layer in manifest.get("layers", [])
+                if (layer.get("annotations") or {}).get(ANNOTATION_TITLE) == title
+            ),
+            None,
+        )
+        if layer is None:
+            raise FileNotFoundError(f"No layer titled {title} in {target}")
+        digest, size = layer["digest"], layer["size"]
+        if (compressed := CompressedLayer.of(layer)) is not None:
+            digest, size = compressed.content_digest, compressed.content_size
+        blob_cache = self._registry.blob_cache
+        if blob_cache is not None:
+            cached = blob_cache.path_for(digest)
+            if cached.is_file() and cached.stat().st_size == size:
+                return open(cached, "rb", buffering=0)
+        if compressed is not None:
+            raise ValueError(
+                f"Layer {title} of {target} is compressed with {compressed.compression} and can't be read by range, pull it instead"
+            )
+        return BlobReader(
+            self._registry,
+            target,
+            layer["digest"],
+            layer["size"],
+            block_size,
+            cache_blocks,
+            backing_file,
+            name=title,
+        )
 
     def get_config(self, target: str) -> str:
-        return f'{{"reference":"{target}", "config": {self._registry.get_config(target)} }}'  # this assumes OCI Manifest.Config later is JSON (per std spec)
+        with tracer.span("config", target=target):
+            config = self._registry.get_config(target)
+        self.notify_listeners(ConfigEvent(target, config))
+        return f'{{"reference":"{target}", "config": {config} }}'  # this assumes OCI Manifest.Config later is JSON (per std spec)
 
-    def crawl(self, targets: Sequence[str]) -> str:
-        configs = map(self.get_config, targets)
-        joined = "[" + ", ".join(configs) + "]"
+    def list_references(
+        self,
+        registry: str,
+        repositories: Sequence[str] | None = None,
+        jobs: int = 1,
+    ) -> dict[str, list[str] | BaseException]:
+        """
+        References of each repository of `registry`, all those in its catalog
+        unless `repositories` are given, listing up to `jobs` repositories at a time.
+        A repository whose tags cannot be listed maps to its exception.
+        """
+        if repositories is None:
+            repositories = self._registry.get_repositories(registry)
+
+        def references(repository: str) -> list[str] | BaseException:
+            target = f"{registry}/{repository}"
+            try:
+                return [f"{target}:{tag}" for tag in self._registry.get_tags(target)]
+            except REGISTRY_ERRORS as e:
+                logger.warning(f"Unable to list the tags of {target}: {e}")
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            return dict(zip(repositories, executor.map(references, repositories)))
+
+    def resolve_digest(self, target: str) -> str:
+        return self._registry.resolve_digest(target)
+
+    def get_metadata(self, target: str) -> ModelMetadata:
+        """
+        Metadata of `target`, read from its manifest annotations, so that only the
+        manifest is fetched; the config blob is read only for artifacts whose
+        annotations don't carry the metadata.
+        """
+        manifest = self._registry.get_manifest(target)
+        if (
+            model_metadata := ModelMetadata.from_annotations_dict(
+                manifest.get("annotations") or {}
+            )
+        ) is not None:
+            return model_metadata
+        logger.debug(f"No metadata annotations on {target}, reading its config")
+        return ModelMetadata.from_json(self._registry.get_config(target))
+
+    def get_metadata_many(
+        self, targets: Sequence[str], jobs: int = 1
+    ) -> dict[str, ModelMetadata | BaseException]:
+        """
+        `get_metadata` of each of `targets`, up to `jobs` at a time; a target
+        which fails maps to its exception.
+        """
+
+        def get_one(target: str) -> ModelMetadata | BaseException:
+            try:
+                return self.get_metadata(target)
+            # TypeError: a config which isn't model metadata
+            except (*REGISTRY_ERRORS, TypeError) as e:
+                logger.warning(f"Unable to get metadata of {target}: {e}")
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            return dict(zip(targets, executor.map(get_one, targets)))
+
+    def crawl(self, targets: Sequence[str], jobs: int = 1) -> str:
+        """
+        Crawl the configuration of the given targets, up to `jobs` at a time.
+
+        A target which cannot be crawled does not abort the crawl, but appears
+        in the result as `{"reference": ..., "error": ...}`.
+        """
+        span = tracer.span("crawl", targets=len(targets))
+        with span, ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            configs = executor.map(self._crawl_one, targets)
+            joined = "[" + ", ".join(configs) + "]"
+        self.notify_listeners(CrawlEvent(list(targets)))
         return joined
 
+    def _crawl_one(self, target: str) -> str:
+        try:
+            return self.get_config(target)
+        except REGISTRY_ERRORS as e:
+            logger.warning(f"Unable to crawl {target}: {e}")
+            return json.dumps({"reference": target, "error": str(e)})
+
+    def crawl_stream(
+        self, targets: Sequence[str], jobs: int = 1
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Like `crawl`, but yield each result as soon as it is available, in
+        completion order rather than in the order of `targets`.
+        """
+
+        def crawl_one(target: str) -> dict[str, Any]:
+            try:
+                config = self._registry.get_config(target)
+                self.notify_listeners(ConfigEvent(target, config))
+                return {"reference": target, "config": json.loads(config)}
+            except REGISTRY_ERRORS as e:
+                logger.warning(f"Unable to crawl {target}: {e}")
+                return {"reference": target, "error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = [executor.submit(crawl_one, t) for t in targets]
+            for future in as_completed(futures):
+                yield future.result()
+        self.notify_listeners(CrawlEvent(list(targets)))
+
     def add_listener(self, listener: Listener) -> None:
         self._listeners.append(listener)
 
@@ -126,5 +484,13 @@ class Helper:
         self._listeners.remove(listener)
 
     def notify_listeners(self, event: Event) -> None:
+        """
+        Notify every listener of `event`: in the background through the event
+        bus when the helper has one, else right away. Either way, a failing
+        listener is logged and doesn't affect the operation nor other listeners.
+        """
         for listener in self._listeners:
-            listener.update(self, event)
+            if self.event_bus is not None:
+                self.event_bus.publish(listener, self, event)
+            else:
+                notify(listener, self, event)
@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import oras.container
+
+from .cache import default_cache_dir
+from .helpers import Helper
+from .model_metadata import ModelMetadata
+from .provider import REGISTRY_ERRORS
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    digest TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT,
+    author TEXT,
+    uri TEXT,
+    model_format_name TEXT,
+    model_format_version TEXT,
+    custom_properties TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS refs (
+    reference TEXT PRIMARY KEY,
+    digest TEXT NOT NULL REFERENCES artifacts(digest),
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_digest ON refs(digest);
+CREATE TABLE IF NOT EXISTS syncs (
+    registry TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_name ON artifacts(name);
+CREATE INDEX IF NOT EXISTS artifacts_author ON artifacts(author);
+CREATE INDEX IF NOT EXISTS artifacts_format ON artifacts(model_format_name, model_format_version);
+"""
+
+# ModelMetadata fields with a column of their own
+COLUMNS = (
+    "name",
+    "description",
+    "author",
+    "uri",
+    "model_format_name",
+    "model_format_version",
+)
+
+
+def default_index_path() -> Path:
+    return default_cache_dir() / "index.sqlite"
+
+
+@dataclass
+class IndexEntry:
+    reference: str
+    digest: str
+    metadata: ModelMetadata
+
+
+@dataclass
+class RefreshStats:
+    added: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    errors: dict[str, str] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.added} added or changed, {self.unchanged} unchanged, "
+            f"{self.removed} removed, {len(self.errors)} error(s)"
+        )
+
+
+def _pinned(target: str, digest: str) -> str:
+    container = oras.container.Container(target)
+    return f"{container.registry}/{container.api_prefix}@{digest}"
+
+
+class MetadataIndex:
+    """
+    Local SQLite index of model metadata, keyed by manifest digest, answering
+    searches without going to the registry.
+
+    `refresh` keeps it up to date: a reference whose digest didn't change since
+    it was indexed costs a single HEAD request.
+    """
+
+    def __init__(self, path: Path | str | None = None):
+        self.path = Path(path) if path is not None else default_index_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def digest_of(self, reference: str) -> str | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest FROM refs WHERE reference = ?", (reference,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add(self, reference: str, digest: str, metadata: ModelMetadata) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO artifacts (digest, {', '.join(COLUMNS)}, custom_properties) "
+                f"VALUES (?, {', '.join('?' * len(COLUMNS))}, ?)",
+                (
+                    digest,
+                    *(getattr(metadata, c) for c in COLUMNS),
+                    json.dumps(metadata.customProperties or {}),
+                ),
+            )
+            self._link(reference, digest)
+
+    def _link(self, reference: str, digest: str) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO refs (reference, digest, indexed_at) VALUES (?, ?, ?)",
+            (reference, digest, time.time()),
+        )
+        # artifacts no reference points to anymore
+        self._db.execute(
+            "DELETE FROM artifacts WHERE digest NOT IN (SELECT digest FROM refs)"
+        )
+
+    def references(self, prefix: str = "") -> list[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT reference FROM refs WHERE substr(reference, 1, ?) = ? ORDER BY reference",
+                (len(prefix), prefix),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def last_synced(self, registry: str) -> float | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT synced_at FROM syncs WHERE registry = ?", (registry,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def remove(self, reference: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM refs WHERE reference = ?", (reference,))
+            self._db.execute(
+                "DELETE FROM artifacts WHERE digest NOT IN (SELECT digest FROM refs)"
+            )
+
+    def refresh(
+        self, helper: Helper, targets: Sequence[str], jobs: int = 1
+    ) -> RefreshStats:
+        """
+        Index the metadata of `targets`, up to `jobs` at a time, only fetching
+        it for references which are new or now resolve to another digest.
+        """
+        stats = RefreshStats()
+
+        def resolve(target: str) -> tuple[str, str, ModelMetadata | None]:
+            digest = helper.resolve_digest(target)
+            if self.digest_of(target) == digest:
+                return target, digest, None
+            if (known := self._get(digest)) is not None:
+                return target, digest, known
+            return target, digest, helper.get_metadata(_pinned(target, digest))
+
+        def resolve_safely(target: str):
+            try:
+                return resolve(target)
+            # TypeError: a config which isn't model metadata
+            except (*REGISTRY_ERRORS, TypeError) as e:
+                logger.warning(f"Unable to index {target}: {e}")
+                stats.errors[target] = str(e)
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            for result in executor.map(resolve_safely, targets):
+                if result is None:
+                    continue
+                target, digest, metadata = result
+                if metadata is None:
+                    stats.unchanged += 1
+                    continue
+                self.add(target, digest, metadata)
+                stats.added += 1
+        return stats
+
+    def sync(
+        self,
+        helper: Helper,
+        registry: str,
+        repositories: Sequence[str] | None = None,
+        jobs: int = 1,
+    ) -> RefreshStats:
+        """
+        Bring the index in line with the tags of `registry`: repositories are
+        listed from its catalog unless given, then `refresh` fetches metadata only
+        for tags that are new or were moved since the last sync, and tags that
+        are gone are dropped.
+
+        A repository whose tags cannot be listed is left as indexed and
+        reported in the `errors` of the result, the others are still synced.
+        """
+        listed, failed = {}, {}
+        for repository, references in helper.list_references(
+            registry, repositories, jobs
+        ).items():
+            if isinstance(references, BaseException):
+                failed[f"{registry}/{repository}"] = str(references)
+            else:
+                listed[repository] = references
+        targets = [target for references in listed.values() for target in references]
+        stats = self.refresh(helper, targets, jobs)
+        stats.errors.update(failed)
+        current = set(targets)
+        for repository in listed:
+            for reference in self.references(f"{registry}/{repository}:"):
+                if reference not in current:
+                    self.remove(reference)
+                    stats.removed += 1
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO syncs (registry, synced_at) VALUES (?, ?)",
+                (registry, time.time()),
+            )
+        return stats
+
+    def _get(self, digest: str) -> ModelMetadata | None:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(COLUMNS)}, custom_properties FROM artifacts WHERE digest = ?",
+                (digest,),
+            ).fetchone()
+        return self._metadata(row) if row else None
+
+    @staticmethod
+    def _metadata(row: Sequence[Any]) -> ModelMetadata:
+        return ModelMetadata(
+            **dict(zip(COLUMNS, row[: len(COLUMNS)])),
+            customProperties=json.loads(row[len(COLUMNS)]),
+        )
+
+    def search(
+        self,
+        properties: dict[str, Any] | None = None,
+        **fields: str,
+    ) -> list[IndexEntry]:
+        """
+        Indexed references whose metadata has exactly the given `fields`, such as
+        `author` or `model_format_name`, and custom `properties`, whose values
+        have to be strings, numbers, booleans or None.
+        """
+        clauses, params = [], []
+        for name, value in fields.items():
+            if name not in COLUMNS:
+                raise ValueError(f"Unknown metadata field {name}")
+            clauses.append(f"a.{name} = ?")
+            params.append(value)
+        for key, value in (properties or {}).items():
+            if value is not None and not isinstance(value, (str, int, float, bool)):
+                raise ValueError(
+                    f"Unsupported value for property {key}: {value!r}, expected a scalar"
+                )
+            # matching keys rather than building a JSON path, whatever they contain
+            clauses.append(
+                "EXISTS (SELECT 1 FROM json_each(a.custom_properties) p "
+                "WHERE p.key = ? AND p.value IS ?)"
+            )
+            params.extend([key, value])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT r.reference, r.digest, {', '.join('a.' + c for c in COLUMNS)}, a.custom_properties "
+                f"FROM refs r JOIN artifacts a ON a.digest = r.digest {where} ORDER BY r.reference",
+                params,
+            ).fetchall()
+        return [IndexEntry(row[0], row[1], self._metadata(row[2:])) for row in rows]
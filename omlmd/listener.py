@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import logging
+import queue
+import threading
+import time
 import typing as t
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
@@ -8,6 +12,8 @@ import requests
 
 from .model_metadata import ModelMetadata
 
+logger = logging.getLogger(__name__)
+
 
 class Listener(ABC):
     """
@@ -22,6 +28,38 @@ class Listener(ABC):
         pass
 
 
+class BatchListener(Listener):
+    """
+    Listener which, when delivered through an `EventBus`, receives events in
+    batches of up to `max_batch_size`, waiting at most `max_batch_delay`
+    seconds to fill a batch.
+    """
+
+    max_batch_size: int = 100
+    max_batch_delay: float = 0.5
+
+    def update(self, source: t.Any, event: Event) -> None:
+        self.update_batch(source, [event])
+
+    @abstractmethod
+    def update_batch(self, source: t.Any, events: list[Event]) -> None:
+        """
+        Receive a batch of update events, in the order they were emitted.
+        """
+
+
+class AsyncListener(ABC):
+    """
+    Listener notified on the event loop of an `AsyncHelper`.
+    """
+
+    @abstractmethod
+    async def update(self, source: t.Any, event: Event) -> None:
+        """
+        Receive update event.
+        """
+
+
 class Event(ABC):
     pass
 
@@ -37,3 +75,191 @@ class PushEvent(Event):
         cls, response: requests.Response, target: str, metadata: ModelMetadata
     ) -> "PushEvent":
         return cls(response.headers["Docker-Content-Digest"], target, metadata)
+
+
+@dataclass
+class PullEvent(Event):
+    target: str
+    path: str
+    files: list[str]
+
+
+@dataclass
+class ConfigEvent(Event):
+    target: str
+    config: str
+
+
+@dataclass
+class CrawlEvent(Event):
+    targets: list[str]
+
+
+def notify(listener: Listener, source: t.Any, event: Event) -> bool:
+    """
+    Deliver `event` to `listener`, logging rather than raising its failure.
+    """
+    try:
+        listener.update(source, event)
+        return True
+    except Exception:
+        logger.exception(f"Listener {listener!r} failed on {event!r}")
+        return False
+
+
+@dataclass
+class EventBusStats:
+    delivered: int = 0
+    dropped: int = 0
+    failed: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.delivered} delivered, {self.dropped} dropped, {self.failed} failed"
+        )
+
+
+_STOP = object()
+
+
+class EventBus:
+    """
+    Delivers events from background threads, one per listener, so that a slow
+    or failing listener holds up neither the operation emitting the event nor
+    the other listeners.
+
+    Each listener has a queue of up to `max_queue` events. When it is full,
+    `publish` waits up to `block_timeout` seconds for room, then drops the event.
+    Events still undelivered `delivery_timeout` seconds after being published
+    are dropped as stale.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 1024,
+        block_timeout: float = 0.0,
+        delivery_timeout: float | None = None,
+    ):
+        self.max_queue = max_queue
+        self.block_timeout = block_timeout
+        self.delivery_timeout = delivery_timeout
+        self.stats = EventBusStats()
+        self._queues: dict[int, queue.Queue] = {}
+        self._workers: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def publish(self, listener: Listener, source: t.Any, event: Event) -> bool:
+        """
+        Queue `event` for `listener`, returning False if it had to be dropped.
+        """
+        q = self._queue_of(listener)
+        try:
+            if self.block_timeout > 0:
+                q.put((time.monotonic(), source, event), timeout=self.block_timeout)
+            else:
+                q.put_nowait((time.monotonic(), source, event))
+            return True
+        except queue.Full:
+            logger.warning(f"Dropping {event!r}, queue of {listener!r} is full")
+            self._count("dropped")
+            return False
+
+    def _queue_of(self, listener: Listener) -> queue.Queue:
+        with self._lock:
+            if (q := self._queues.get(id(listener))) is None:
+                q = self._queues[id(listener)] = queue.Queue(self.max_queue)
+                worker = threading.Thread(
+                    target=self._deliver,
+                    args=(listener, q),
+                    name=f"omlmd-events-{type(listener).__name__}",
+                    daemon=True,
+                )
+                worker.start()
+                self._workers.append(worker)
+            return q
+
+    def _deliver(self, listener: Listener, q: queue.Queue) -> None:
+        stopping = False
+        while not stopping:
+            items = [q.get()]
+            if isinstance(listener, BatchListener) and items[0] is not _STOP:
+                deadline = time.monotonic() + listener.max_batch_delay
+                while len(items) < listener.max_batch_size and items[-1] is not _STOP:
+                    try:
+                        items.append(
+                            q.get(timeout=max(0.0, deadline - time.monotonic()))
+                        )
+                    except queue.Empty:
+                        break
+            if items[-1] is _STOP:
+                stopping = True
+                items.pop()
+            try:
+                self._deliver_items(listener, items)
+            finally:
+                for _ in range(len(items) + stopping):
+                    q.task_done()
+
+    def _deliver_items(self, listener: Listener, items: list) -> None:
+        now = time.monotonic()
+        fresh = []
+        for published_at, source, event in items:
+            if (
+                self.delivery_timeout is not None
+                and now - published_at > self.delivery_timeout
+            ):
+                self._count("dropped")
+            else:
+                fresh.append((source, event))
+        # consecutive events from the same source make up one batch
+        while fresh:
+            source = fresh[0][0]
+            n = next(
+                (i for i, (s, _) in enumerate(fresh) if s is not source), len(fresh)
+            )
+            events = [event for _, event in fresh[:n]]
+            fresh = fresh[n:]
+            try:
+                if isinstance(listener, BatchListener):
+                    listener.update_batch(source, events)
+                else:
+                    listener.update(source, events[0])
+                self._count("delivered", len(events))
+            except Exception:
+                logger.exception(f"Listener {listener!r} failed on {events!r}")
+                self._count("failed", len(events))
+
+    def _count(self, stat: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self.stats, stat, getattr(self.stats, stat) + n)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Wait until every queued event is delivered, returning False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            queues = list(self._queues.values())
+        for q in queues:
+            with q.all_tasks_done:
+                while q.unfinished_tasks:
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    q.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout: float | None = None) -> None:
+        """
+        Deliver the events already queued, then stop the delivery threads.
+        """
+        with self._lock:
+            queues = list(self._queues.values())
+            self._queues.clear()
+            workers, self._workers = self._workers, []
+        for q in queues:
+            q.put(_STOP)
+        for worker in workers:
+            worker.join(timeout)
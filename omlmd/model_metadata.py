@@ -37,6 +37,23 @@ class ModelMetadata:
                     v
                 )  # post-fix "+json" for OCI annotation which is a str representing a json
         return result
+
+    @staticmethod
+    def from_annotations_dict(annotations: dict[str, str]) -> ModelMetadata | None:
+        """
+        Inverse of `to_annotations_dict`, decoding the `+json` keys; None when
+        none of the annotations is a metadata field.
+        """
+        known_keys = {f.name for f in fields(ModelMetadata)}
+        data: dict[str, Any] = {}
+        for k, v in annotations.items():
+            if k in known_keys:
+                data[k] = v
+            elif k.endswith("+json") and (key := k.removesuffix("+json")) in known_keys:
+                data[key] = json.loads(v)
+        if not data:
+            return None
+        return ModelMetadata(**data)
     
     def is_empty(self) -> bool:
         return all(getattr(self, f.name) is None for f in fields(ModelMetadata) if f.name != "customProperties") and not self.customProperties
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Callable
+
+# seconds of history the transfer rate is computed over
+RATE_WINDOW = 5.0
+
+
+@dataclass
+class LayerProgress:
+    digest: str
+    title: str | None = None
+    total: int | None = None
+    done: int = 0
+    # transferred, rather than found in a cache or already stored by the registry
+    transferred: int = 0
+    finished: bool = False
+
+
+@dataclass
+class Progress:
+    """
+    State of a pull or push, as passed to progress callbacks.
+    """
+
+    operation: str
+    # the layer which moved, or None for a snapshot
+    layer: LayerProgress | None
+    done: int
+    total: int | None
+    layers_done: int
+    layers: int
+    elapsed: float
+    # bytes per second over the last few seconds
+    rate: float
+    # seconds since bytes last moved
+    idle: float
+
+    @property
+    def eta(self) -> float | None:
+        """
+        Seconds until the transfer completes at the current rate, if known.
+        """
+        if self.total is None or not self.rate:
+            return None
+        return max(0, self.total - self.done) / self.rate
+
+
+ProgressCallback = Callable[[Progress], None]
+
+
+class TransferProgress:
+    """
+    Bytes moved by one pull or push across all its layers, reported to
+    `callback` at most every `interval` seconds, and whenever a layer finishes.
+
+    A callback which raises aborts the transfer. Since a stalled transfer makes
+    no callbacks, an orchestrator can also poll `snapshot()` from its own thread.
+    """
+
+    def __init__(
+        self, callback: ProgressCallback, operation: str, interval: float = 0.25
+    ):
+        self.callback = callback
+        self.operation = operation
+        self.interval = interval
+        self.layers: dict[str, LayerProgress] = {}
+        self._started = self._moved = time.monotonic()
+        self._reported = 0.0
+        self._transferred = 0
+        self._samples: deque[tuple[float, int]] = deque([(self._started, 0)])
+        self._lock = threading.Lock()
+
+    def add(self, digest: str, total: int | None, title: str | None = None) -> None:
+        with self._lock:
+            self.layers.setdefault(digest, LayerProgress(digest, title, total))
+
+    def advance(self, digest: str, n: int, transferred: bool = True) -> None:
+        with self._lock:
+            layer = self.layers.setdefault(digest, LayerProgress(digest))
+            layer.done += n
+            if transferred:
+                layer.transferred += n
+                self._transferred += n
+                self._moved = time.monotonic()
+            due = self._moved - self._reported >= self.interval
+            if due:
+                self._reported = self._moved
+                progress = self._progress(layer)
+        if due:
+            self.callback(progress)
+
+    def restart(self, digest: str) -> None:
+        """
+        Forget the bytes of a layer whose download starts over.
+        """
+        with self._lock:
+            if (layer := self.layers.get(digest)) is not None:
+                layer.done = 0
+
+    def finish(self, digest: str, size: int | None = None) -> None:
+        """
+        Mark a layer as done, its remaining bytes skipped rather than transferred.
+        """
+        with self._lock:
+            layer = self.layers.setdefault(digest, LayerProgress(digest, total=size))
+            if layer.total is None:
+                layer.total = size if size is not None else layer.done
+            layer.done = layer.total
+            layer.finished = True
+            progress = self._progress(layer)
+        self.callback(progress)
+
+    def snapshot(self) -> Progress:
+        with self._lock:
+            return self._progress(None)
+
+    def _progress(self, layer: LayerProgress | None) -> Progress:
+        now = time.monotonic()
+        self._samples.append((now, self._transferred))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= RATE_WINDOW:
+            self._samples.popleft()
+        since, transferred = self._samples[0]
+        totals = [layer.total for layer in self.layers.values()]
+        return Progress(
+            self.operation,
+            replace(layer) if layer is not None else None,
+            sum(layer.done for layer in self.layers.values()),
+            None if None in totals else sum(t for t in totals if t is not None),
+            sum(layer.finished for layer in self.layers.values()),
+            len(self.layers),
+            now - self._started,
+            (self._transferred - transferred) / (now - since) if now > since else 0.0,
+            now - self._moved,
+        )
@@ -1,73 +1,1579 @@
 from __future__ import annotations
 
+import copy
+import hashlib
+import io
 import logging
 import os
+import shutil
 import tempfile
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Sequence
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass, field
+from fnmatch import fnmatchcase
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
 
+import jsonschema
+import oras.auth
+import oras.container
+import oras.oci
+import oras.utils
+import requests
 from oras import provider
 from oras.decorator import ensure_container
 from oras.defaults import annotation_title as ANNOTATION_TITLE
+from oras.defaults import (
+    blank_hash,
+    default_blob_dir_media_type,
+    default_blob_media_type,
+    default_chunksize,
+    default_manifest_accepted_media_types,
+    unknown_config_media_type,
+)
 from oras.utils import sanitize_path
 
+from .auth import ScopedTokenAuth
+from .cache import BlobCache, CachedManifest, ManifestCache, place, swap_directory
+from .compression import (
+    CompressedLayer,
+    base_media_type,
+    compress_file,
+    decompressor,
+    is_dense,
+)
+from .digest import DigestCache, compute_digests
+from .progress import ProgressCallback, TransferProgress
+from .tracing import tracer
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
 logger = logging.getLogger(__name__)
 
+PARTIAL_SUFFIX = ".partial"
+# marks a directory made by an atomic pull, which a later one may replace
+PULL_MARKER = ".omlmd-pull"
+DEFAULT_POOL_SIZE = 10
+# answers worth retrying, as the registry may well succeed a moment later
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# methods safe to replay: an upload may have been applied before its answer failed
+RETRY_METHODS = frozenset({"GET", "HEAD"})
+# errors a registry operation is expected to fail with: those of requests are
+# OSErrors, answers it rejects ValueErrors, and missing content RuntimeErrors
+REGISTRY_ERRORS = (OSError, ValueError, RuntimeError, KeyError)
+# oras' request with auth, without its fixed retry policy which we replace
+_oras_do_request = provider.Registry.do_request.__wrapped__  # type: ignore[attr-defined]
+
+
+class LayerTransferError(RuntimeError):
+    """
+    Raised when one or more layers could not be transferred; `failures` maps
+    each failed layer title (or digest, for untitled blobs) to the exception it raised.
+    """
+
+    action = "transfer"
+
+    def __init__(self, package, failures: dict[str, BaseException]):
+        self.failures = failures
+        details = "; ".join(f"{title}: {e}" for title, e in failures.items())
+        super().__init__(
+            f"Failed to {self.action} {len(failures)} layer(s) of {package}: {details}"
+        )
+
+
+class LayerDownloadError(LayerTransferError):
+    action = "download"
+
+
+class LayerUploadError(LayerTransferError):
+    action = "upload"
+
+
+@dataclass
+class InMemoryBlob:
+    """
+    Layer or config pushed straight from memory, under the title `title`.
+    """
+
+    title: str
+    data: bytes
+    media_type: str = default_blob_media_type
+
+    def descriptor(self) -> dict[str, Any]:
+        return {
+            "mediaType": self.media_type,
+            "size": len(self.data),
+            "digest": f"sha256:{hashlib.sha256(self.data).hexdigest()}",
+        }
+
+
+@dataclass
+class LayerFilter:
+    """
+    Selects the layers of a pull from the manifest alone, before any blob is
+    requested: by glob patterns on their title, where `*` also matches `/`,
+    by annotation values and by size in bytes.
+    """
+
+    # the title matches one of them, if any are given
+    include: Sequence[str] = ()
+    # the title matches none of them
+    exclude: Sequence[str] = ()
+    annotations: dict[str, str] = field(default_factory=dict)
+    min_size: int | None = None
+    max_size: int | None = None
+
+    def matches(self, layer: dict) -> bool:
+        annotations = layer.get("annotations") or {}
+        title = annotations.get(ANNOTATION_TITLE, "")
+        size = layer.get("size", 0)
+        return (
+            (not self.include or any(fnmatchcase(title, p) for p in self.include))
+            and not any(fnmatchcase(title, p) for p in self.exclude)
+            and all(annotations.get(k) == v for k, v in self.annotations.items())
+            and (self.min_size is None or size >= self.min_size)
+            and (self.max_size is None or size <= self.max_size)
+        )
+
+
+def _run_concurrently(
+    tasks: dict[str, Callable[[], Any]], jobs: int
+) -> tuple[dict[str, Any], dict[str, BaseException]]:
+    """
+    Run the named tasks on up to `jobs` workers, returning results and failures
+    by name. Once a task fails, the tasks not yet started are cancelled.
+    """
+    results: dict[str, Any] = {}
+    failures: dict[str, BaseException] = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {executor.submit(task): name for name, task in tasks.items()}
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        if any(f.exception() is not None for f in done):
+            for f in not_done:
+                f.cancel()
+        # let in-flight transfers settle before inspecting the outcome
+        wait(not_done)
+        for f, name in futures.items():
+            if f.cancelled():
+                continue
+            if (e := f.exception()) is not None:
+                failures[name] = e
+            else:
+                results[name] = f.result()
+    return results, failures
+
+
+@dataclass
+class PoolStats:
+    requests: int = 0
+    connections: int = 0
+    retries: int = 0
+    tokens_fetched: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.requests} request(s) over {self.connections} connection(s), "
+            f"{self.retries} retry(ies), {self.tokens_fetched} token(s) fetched"
+        )
+
+
+def _retry_after(response: requests.Response) -> float | None:
+    try:
+        return min(float(response.headers["Retry-After"]), 60.0)
+    except (KeyError, ValueError):
+        return None
+
+
+class _TimeoutAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTPAdapter giving up on connections which stay silent for `timeout`
+    seconds, unless the request sets a timeout of its own.
+    """
+
+    def __init__(self, timeout: float | None = None, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(
+            request, timeout=self.timeout if timeout is None else timeout, **kwargs
+        )
+
+
+class BandwidthLimiter:
+    """
+    Token bucket capping the combined throughput of every download sharing it
+    to `rate` bytes per second, allowing bursts of up to one second's worth.
+    """
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self._allowance = float(rate)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(
+                self.rate, self._allowance + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._allowance -= n
+            wait = -self._allowance / self.rate if self._allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def _partial_path(outfile: str, digest: str) -> str:
+    """
+    Where the blob `digest` is downloaded to before becoming `outfile`, so that
+    only a download of the same blob resumes it.
+    """
+    return f"{outfile}.{digest.partition(':')[2][:16]}{PARTIAL_SUFFIX}"
+
+
+class _RangeNotSupported(Exception):
+    pass
+
+
+class _VerifyingWriter:
+    """
+    Appends to a `.partial` file while hashing every byte written to it, so the
+    digest can be checked once the last byte lands without re-reading the file.
+    The file is open while the writer is used as a context manager.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        digest: str,
+        size: int | None = None,
+        limiter: BandwidthLimiter | None = None,
+        progress: TransferProgress | None = None,
+    ):
+        self.path = path
+        self.limiter = limiter
+        self.progress = progress
+        self.digest = digest
+        self.algorithm = digest.partition(":")[0]
+        self.hasher = hashlib.new(self.algorithm)
+        self.offset = 0
+        # bytes received by this writer, a resumed prefix excluded
+        self.received = 0
+        if os.path.exists(path):
+            if size is not None and os.path.getsize(path) > size:
+                os.remove(path)
+            else:
+                # resuming: the prefix already on disk has to be hashed once
+                with open(path, "rb") as f:
+                    while chunk := f.read(1024 * 1024):
+                        self.hasher.update(chunk)
+                        self.offset += len(chunk)
+                if progress is not None:
+                    progress.advance(digest, self.offset, transferred=False)
+
+    def __enter__(self) -> Self:
+        self._file = open(self.path, "ab")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._file.close()
+
+    def write(self, data: bytes):
+        if self.limiter is not None:
+            self.limiter.consume(len(data))
+        self._store(data)
+        self.hasher.update(data)
+        self.offset += len(data)
+        self.received += len(data)
+        if self.progress is not None:
+            self.progress.advance(self.digest, len(data))
+
+    def _store(self, data: bytes):
+        self._file.write(data)
+
+    def reset(self):
+        self._file.truncate(0)
+        self.hasher = hashlib.new(self.algorithm)
+        self.offset = 0
+        if self.progress is not None:
+            self.progress.restart(self.digest)
+
+    @property
+    def actual_digest(self) -> str:
+        return f"{self.algorithm}:{self.hasher.hexdigest()}"
+
+
+class _DecompressingWriter(_VerifyingWriter):
+    """
+    Writes a compressed blob to its `.partial` file decompressed, hashing both
+    the compressed bytes received and the decompressed bytes written.
+
+    The state of the decompressor is not on disk, so a `.partial` left behind
+    is started over, while a download interrupted during the life of the
+    writer is still resumed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        digest: str,
+        compressed: CompressedLayer,
+        size: int | None = None,
+        limiter: BandwidthLimiter | None = None,
+        progress: TransferProgress | None = None,
+    ):
+        if os.path.exists(path):
+            os.remove(path)
+        self.compressed = compressed
+        self._start_content()
+        super().__init__(path, digest, size, limiter, progress)
+
+    def _start_content(self):
+        self.decompressor = decompressor(self.compressed.compression)
+        self.content_hasher = hashlib.new(
+            self.compressed.content_digest.partition(":")[0]
+        )
+
+    def _store(self, data: bytes):
+        content = self.decompressor.decompress(data)
+        self._file.write(content)
+        self.content_hasher.update(content)
+
+    def reset(self):
+        super().reset()
+        self._start_content()
+
+    @property
+    def actual_content_digest(self) -> str:
+        return f"{self.content_hasher.name}:{self.content_hasher.hexdigest()}"
+
+
+def _compress_files(
+    paths: Sequence[str],
+    compression: str,
+    jobs: int,
+    directory: str,
+    digest_cache: DigestCache | None = None,
+    exists: Callable[[str], bool] | None = None,
+) -> dict[str, tuple[str | None, str, int, CompressedLayer]]:
+    """
+    Compress the files at `paths` into `directory`, up to `jobs` at a time,
+    mapping each to its compressed copy, the digest and size of that copy and
+    how to restore it. Files which are already dense are left out.
+
+    With a `digest_cache`, an unchanged file whose compressed copy `exists`
+    says is stored already is not compressed again, and maps to no copy.
+    """
+
+    def compress(
+        i: int, path: str
+    ) -> tuple[str | None, str, int, CompressedLayer] | None:
+        st = os.stat(path)
+        if digest_cache is not None and exists is not None:
+            known = digest_cache.get_compressed(path, st, compression)
+            if known is not None and exists(known[1]):
+                logger.debug(f"Reusing the {compression} copy of unchanged {path}")
+                content_digest, digest, size = known
+                return (
+                    None,
+                    digest,
+                    size,
+                    CompressedLayer(compression, content_digest, st.st_size),
+                )
+        if is_dense(path):
+            logger.debug(f"Not compressing {path}, its content is already dense")
+            return None
+        dst = os.path.join(directory, str(i))
+        digest, compressed = compress_file(path, dst, compression)
+        size = os.path.getsize(dst)
+        if digest_cache is not None:
+            digest_cache.put_compressed(
+                path, st, compressed.content_digest, compression, digest, size
+            )
+        return dst, digest, size, compressed
+
+    results, failures = _run_concurrently(
+        {path: partial(compress, i, path) for i, path in enumerate(paths)}, jobs
+    )
+    if digest_cache is not None:
+        digest_cache.save()
+    if failures:
+        raise next(iter(failures.values()))
+    return {path: result for path, result in results.items() if result is not None}
+
 
 class OMLMDRegistry(provider.Registry):
+    auth: oras.auth.base.AuthBackend
+
+    # blobs at least this large are fetched as parallel byte ranges
+    range_download_threshold = 64 * 1024 * 1024
+    range_chunk_size = 16 * 1024 * 1024
+    range_parts = 4
+    # how many times an interrupted download is resumed before giving up
+    download_retries = 3
+    # blobs up to this size, such as configs, are read into memory without touching disk
+    in_memory_blob_threshold = 4 * 1024 * 1024
+
+    def __init__(
+        self,
+        *args,
+        blob_cache: BlobCache | None = None,
+        manifest_cache: ManifestCache | None = None,
+        upload_jobs: int = 1,
+        upload_chunk_size: int = default_chunksize,
+        digest_cache: DigestCache | None = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_bandwidth: int | None = None,
+        stall_timeout: float | None = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        # one keep-alive connection per concurrent worker and registry; with a
+        # `stall_timeout`, a download receiving nothing for that long is resumed
+        adapter = _TimeoutAdapter(
+            stall_timeout, pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.retries = retries
+        # shared by every download of this registry, however many run at once
+        self.limiter = BandwidthLimiter(max_bandwidth) if max_bandwidth else None
+        self.backoff_factor = backoff_factor
+        self._retried = 0
+        self._stats_lock = threading.Lock()
+        if type(self.auth) is oras.auth.TokenAuth:
+            auth = ScopedTokenAuth()
+            auth.session = self.auth.session
+            auth.prefix = self.auth.prefix
+            auth._tls_verify = self.auth._tls_verify
+            self.auth = auth
+        self.blob_cache = blob_cache
+        self.manifest_cache = (
+            manifest_cache if manifest_cache is not None else ManifestCache()
+        )
+        self.upload_jobs = upload_jobs
+        self.upload_chunk_size = upload_chunk_size
+        self.digest_cache = digest_cache
+
+    def do_request(
+        self,
+        url: str,
+        method: str = "GET",
+        data=None,
+        headers: dict | None = None,
+        json: dict | None = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        """
+        Do a request through oras with the bearer token of the repository it is
+        about, retried up to `retries` times with exponential backoff starting
+        at `backoff_factor` seconds on connection errors and on 429 or 5xx answers.
+        Only GET and HEAD requests are retried, others are sent once.
+        """
+        scoped = (
+            self.auth.scoped(url)
+            if isinstance(self.auth, ScopedTokenAuth)
+            else nullcontext()
+        )
+        retries = self.retries if method.upper() in RETRY_METHODS else 0
+        attempt = 0
+        with scoped:
+            while True:
+                delay = self.backoff_factor * 2**attempt
+                try:
+                    response = _oras_do_request(
+                        self, url, method, data, dict(headers or {}), json, stream
+                    )
+                except requests.exceptions.ConnectionError as e:
+                    if (
+                        isinstance(e, requests.exceptions.SSLError)
+                        or attempt >= retries
+                    ):
+                        raise
+                    error = str(e)
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                        return response
+                    error = f"{response.status_code} {response.reason}"
+                    delay = _retry_after(response) or delay
+                    response.close()
+                attempt += 1
+                with self._stats_lock:
+                    self._retried += 1
+                logger.info(f"Retrying {method} {url} in {delay:.1f}s - error: {error}")
+                time.sleep(delay)
+
+    def pool_stats(self) -> PoolStats:
+        """
+        Requests and connections made so far through the shared session.
+        """
+        stats = PoolStats(retries=self._retried)
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            # a copy of the keys, as urllib3's pool container can't be iterated
+            keys = pools.keys()
+            for key in keys:
+                if (pool := pools.get(key)) is not None:
+                    stats.requests += pool.num_requests
+                    stats.connections += pool.num_connections
+        if isinstance(self.auth, ScopedTokenAuth):
+            stats.tokens_fetched = self.auth.tokens_fetched
+        return stats
+
+    def push(
+        self,
+        target: str,
+        config_path: str | None = None,
+        disable_path_validation: bool = False,
+        files: list | None = None,
+        manifest_config: str | None = None,
+        annotation_file: str | None = None,
+        manifest_annotations: dict | None = None,
+        subject: oras.oci.Subject | None = None,
+        do_chunked: bool = False,
+        chunk_size: int | None = None,
+        quiet: bool = False,
+        jobs: int | None = None,
+        mount_from: Sequence[str] | None = None,
+        progress: ProgressCallback | None = None,
+        contents: Sequence[InMemoryBlob] | None = None,
+        manifest_config_content: InMemoryBlob | None = None,
+        root: str | None = None,
+        compression: str | None = None,
+    ) -> requests.Response:
+        """
+        Push a set of files to a target
+
+        Same contract as oras' push, but blobs the registry already stores are
+        skipped after a HEAD check and the remaining ones, config included, are
+        uploaded by up to `jobs` workers (default `upload_jobs`), in chunks of
+        `chunk_size` bytes (default `upload_chunk_size`) when `do_chunked` is set.
+        Missing blobs are first mounted from the `mount_from` repositories of the
+        same registry, when given, before falling back to an upload.
+
+        Files are hashed in parallel with large buffers; with a `digest_cache`,
+        unchanged files reuse the digest computed by an earlier push.
+
+        `progress` is called with the bytes done of each blob and of the whole
+        push, see `TransferProgress`.
+
+        `contents` are layers uploaded straight from memory after the `files`,
+        and `manifest_config_content` a config to use instead of `manifest_config`.
+
+        With `root`, file layers are titled with their path relative to it
+        rather than their base name, so that a pull rebuilds the directory tree.
+
+        With a `compression`, gzip or zstd, each file layer which isn't already
+        dense is compressed into a temporary copy before being uploaded, and
+        its media type takes a `+gzip` or `+zstd` suffix; annotations record the
+        digest and size of its content, for a pull to decompress and verify it.
+        """
+        container = self.get_container(target)
+        self.auth.load_configs(
+            container, configs=[config_path] if config_path else None
+        )
+
+        manifest = oras.oci.NewManifest()
+        annotset = oras.oci.Annotations(annotation_file)
+        blobs: dict[str, tuple[str | bytes, dict]] = {}
+        targz = []
+        scratch = None
+        try:
+            sources = []
+            for blob in files or []:
+                path_content = oras.utils.split_path_and_content(str(blob))
+                blob = path_content.path
+                if not os.path.exists(blob):
+                    raise FileNotFoundError(f"{blob} does not exist.")
+                if not disable_path_validation and not self._validate_path(blob):
+                    raise ValueError(
+                        f"Blob {blob} is not in the present working directory context."
+                    )
+
+                blob_name = (
+                    Path(os.path.relpath(blob, root)).as_posix()
+                    if root is not None
+                    else os.path.basename(blob)
+                )
+                is_dir = os.path.isdir(blob)
+                if is_dir:
+                    blob = oras.utils.make_targz(blob)
+                    targz.append(blob)
+                sources.append((blob, blob_name, path_content.content, is_dir))
+
+            config_file, config_media_type = None, None
+            if manifest_config:
+                config_file, config_media_type = self._parse_manifest_ref(
+                    manifest_config
+                )
+                if not os.path.exists(config_file):
+                    config_file = None
+
+            # files to compress are hashed while being compressed, or not at all
+            # when unchanged since an earlier push of their compressed copy
+            compressed: dict[str, tuple[str | None, str, int, CompressedLayer]] = {}
+            if compression is not None:
+                scratch = tempfile.mkdtemp(prefix="omlmd-compressed-")
+                compressed = _compress_files(
+                    list(
+                        dict.fromkeys(
+                            blob
+                            for blob, _, _, is_dir in sources
+                            if not is_dir and blob != config_file
+                        )
+                    ),
+                    compression,
+                    jobs or self.upload_jobs,
+                    scratch,
+                    self.digest_cache,
+                    lambda digest: self.blob_exists({"digest": digest}, container),
+                )
+
+            # every file is hashed once, in parallel, and not at all if its digest
+            # is still valid in the digest cache
+            digests = compute_digests(
+                # the config is usually one of the files too
+                list(
+                    dict.fromkeys(
+                        [
+                            s[0]
+                            for s in sources
+                            if s[0] not in targz and s[0] not in compressed
+                        ]
+                        + ([config_file] if config_file else [])
+                    )
+                ),
+                jobs or self.upload_jobs,
+                self.digest_cache,
+            )
+            digests.update(compute_digests(targz, jobs or self.upload_jobs))
+
+            for blob, blob_name, media_type, is_dir in sources:
+                if not media_type:
+                    media_type = (
+                        default_blob_dir_media_type
+                        if is_dir
+                        else default_blob_media_type
+                    )
+                upload: str | None = blob
+                layer_annotations = {ANNOTATION_TITLE: blob_name.strip(os.sep)}
+                if (packed := compressed.get(blob)) is not None:
+                    upload, digest, size, restore = packed
+                    media_type = f"{media_type}+{restore.compression}"
+                    layer_annotations.update(restore.annotations())
+                else:
+                    digest, size = digests[blob], os.path.getsize(blob)
+                layer = {"mediaType": media_type, "size": size, "digest": digest}
+                layer["annotations"] = layer_annotations
+                if annotations := annotset.get_annotations(blob):
+                    layer["annotations"].update(annotations)
+                manifest["layers"].append(layer)
+                # a compressed copy pushed before and found is not uploaded again
+                if upload is not None:
+                    blobs.setdefault(layer["digest"], (upload, layer))
+
+            for content in contents or []:
+                layer = content.descriptor()
+                layer["annotations"] = {ANNOTATION_TITLE: content.title}
+                if annotations := annotset.get_annotations(content.title):
+                    layer["annotations"].update(annotations)
+                manifest["layers"].append(layer)
+                blobs.setdefault(layer["digest"], (content.data, layer))
+
+            manifest_annots = annotset.get_annotations("$manifest") or {}
+            if manifest_annotations:
+                manifest_annots.update(copy.deepcopy(manifest_annotations))
+            if manifest_annots:
+                manifest["annotations"] = manifest_annots
+            if subject:
+                manifest["subject"] = asdict(subject)
+
+            config: str | bytes
+            if manifest_config_content is not None:
+                conf: dict[str, Any] = manifest_config_content.descriptor()
+                config = manifest_config_content.data
+            elif config_file:
+                conf = {
+                    "mediaType": config_media_type or unknown_config_media_type,
+                    "size": os.path.getsize(config_file),
+                    "digest": digests[config_file],
+                }
+                config = config_file
+            else:
+                conf = InMemoryBlob(
+                    "", b"{}", config_media_type or unknown_config_media_type
+                ).descriptor()
+                config = b"{}"
+            if config_annots := annotset.get_annotations("$config"):
+                conf["annotations"] = config_annots
+
+            # the config is usually one of the layers too, and uploaded only once
+            blobs.setdefault(conf["digest"], (config, conf))
+            self.upload_blobs(
+                container,
+                blobs.values(),
+                do_chunked,
+                chunk_size,
+                jobs,
+                mount_from,
+                self._tracker(progress, "push", [layer for _, layer in blobs.values()]),
+            )
+        finally:
+            for blob in targz:
+                if os.path.exists(blob):
+                    os.remove(blob)
+            if scratch is not None:
+                shutil.rmtree(scratch, ignore_errors=True)
+
+        manifest["config"] = conf
+        with tracer.span("manifest.upload", reference=str(container)):
+            response = self.upload_manifest(manifest, container)
+            self._check_200_response(response)
+        self.manifest_cache.invalidate(str(container))
+        if not quiet:
+            logger.info(f"Successfully pushed {container}")
+        return response
+
+    def upload_blobs(
+        self,
+        container,
+        blobs: Iterable[tuple[str | bytes, dict]],
+        do_chunked: bool = False,
+        chunk_size: int | None = None,
+        jobs: int | None = None,
+        mount_from: Sequence[str] | None = None,
+        progress: TransferProgress | None = None,
+    ) -> list[str]:
+        """
+        Upload the (path or bytes, layer) blobs the registry does not have yet, up to
+        `jobs` at a time, returning the digests which were actually uploaded
+        rather than found or mounted from one of the `mount_from` repositories.
+        """
+        # by digest, as different layers may share a title such as a base name
+        tasks: dict[str, Callable[[], Any]] = {}
+        titles: dict[str, str] = {}
+        for blob, layer in blobs:
+            title = (layer.get("annotations") or {}).get(ANNOTATION_TITLE)
+            titles[layer["digest"]] = title or layer["digest"]
+            tasks[layer["digest"]] = partial(
+                self._upload_missing,
+                blob,
+                container,
+                layer,
+                do_chunked,
+                chunk_size or self.upload_chunk_size,
+                mount_from or [],
+                progress,
+            )
+        results, failures = _run_concurrently(tasks, jobs or self.upload_jobs)
+        if failures:
+            raise LayerUploadError(
+                container, {titles[digest]: e for digest, e in failures.items()}
+            ) from next(iter(failures.values()))
+        return [digest for digest in results.values() if digest is not None]
+
+    def _upload_missing(
+        self,
+        blob: str | bytes,
+        container,
+        layer: dict,
+        do_chunked: bool,
+        chunk_size: int,
+        mount_from: Sequence[str],
+        progress: TransferProgress | None = None,
+    ) -> str | None:
+        with tracer.span("blob.upload", digest=layer["digest"]) as span:
+            if self.blob_exists(layer, container):
+                logger.debug(f"Layer already exists: {layer['digest']}")
+                span.attributes["outcome"] = "exists"
+                if progress is not None:
+                    progress.finish(layer["digest"])
+                return None
+            for repository in mount_from:
+                if self.mount_blob(container, layer, repository):
+                    span.attributes["outcome"] = "mounted"
+                    if progress is not None:
+                        progress.finish(layer["digest"])
+                    return None
+            if do_chunked:
+                response = self.chunked_upload(
+                    blob, container, layer, chunk_size=chunk_size, progress=progress
+                )
+            else:
+                response = self.put_upload(blob, container, layer)
+                if progress is not None:
+                    progress.advance(layer["digest"], layer["size"])
+            # an empty layer the registry didn't accept is not worth failing for
+            if (
+                response.status_code not in [200, 201, 202]
+                and layer["digest"] == blank_hash
+            ):
+                return None
+            self._check_200_response(response)
+            span.attributes["outcome"] = "uploaded"
+            span.bytes = layer["size"]
+            if progress is not None:
+                progress.finish(layer["digest"])
+            return layer["digest"]
+
+    def chunked_upload(
+        self,
+        blob: str | bytes,
+        container,
+        layer: dict,
+        chunk_size: int = default_chunksize,
+        progress: TransferProgress | None = None,
+    ) -> requests.Response:
+        """
+        Upload a blob, from a path or from bytes, in `chunk_size` PATCH requests
+        as oras does, reporting each chunk to `progress`.
+        """
+        headers = {"Content-Type": "application/octet-stream", "Content-Length": "0"}
+        headers.update(self.headers)
+        upload_url = f"{self.prefix}://{container.upload_blob_url()}"
+        r = self.do_request(upload_url, "POST", headers=headers)
+        session_url = self._get_location(r, container)
+        if not session_url:
+            raise ValueError(f"Issue retrieving session url: {r.json()}")
+
+        start = 0
+        with io.BytesIO(blob) if isinstance(blob, bytes) else open(blob, "rb") as fd:
+            for chunk in oras.utils.read_in_chunks(fd, chunk_size=chunk_size):
+                headers = {
+                    "Content-Range": f"{start}-{start + len(chunk) - 1}",
+                    "Content-Length": str(len(chunk)),
+                    "Content-Type": "application/octet-stream",
+                }
+                headers.update(self.headers)
+                start += len(chunk)
+                r = self.do_request(session_url, "PATCH", data=chunk, headers=headers)
+                self._check_200_response(r)
+                session_url = self._get_location(r, container)
+                if not session_url:
+                    raise ValueError(f"Issue retrieving session url: {r.json()}")
+                if progress is not None:
+                    progress.advance(layer["digest"], len(chunk))
+
+        session_url = oras.utils.append_url_params(
+            session_url, {"digest": layer["digest"]}
+        )
+        return self.do_request(session_url, "PUT", headers=self.headers)
+
+    def put_upload(
+        self, blob: str | bytes, container, layer: dict
+    ) -> requests.Response:
+        """
+        Upload a blob, from a path or from bytes, in a single PUT as oras does.
+        """
+        if not isinstance(blob, bytes):
+            return super().put_upload(blob, container, layer)
+        upload_url = f"{self.prefix}://{container.upload_blob_url()}"
+        r = self.do_request(
+            upload_url, "POST", headers={"Content-Type": "application/octet-stream"}
+        )
+        session_url = self._get_location(r, container)
+        if not session_url:
+            raise ValueError(f"Issue retrieving session url: {r.json()}")
+        headers = {
+            "Content-Length": str(len(blob)),
+            "Content-Type": "application/octet-stream",
+            **self.headers,
+        }
+        return self.do_request(
+            oras.utils.append_url_params(session_url, {"digest": layer["digest"]}),
+            "PUT",
+            data=blob,
+            headers=headers,
+        )
+
+    def mount_blob(self, container, layer: dict, from_repository: str) -> bool:
+        """
+        Ask the registry to mount a blob from another of its repositories
+        instead of uploading it, returning whether the mount succeeded.
+
+        `from_repository` is a repository name such as `namespace/model`, or a
+        reference on the same registry as `container`.
+        """
+        # a bare repository name is taken to live on the target's registry
+        source = oras.container.Container(from_repository, registry=container.registry)
+        if source.registry != container.registry:
+            logger.debug(f"Not mounting from {from_repository}, another registry")
+            return False
+        if source.api_prefix == container.api_prefix:
+            return False
+        upload_url = oras.utils.append_url_params(
+            f"{self.prefix}://{container.upload_blob_url()}",
+            {"mount": layer["digest"], "from": source.api_prefix},
+        )
+        r = self.do_request(upload_url, "POST", headers={"Content-Length": "0"})
+        if r.status_code == 201:
+            logger.debug(f"Mounted {layer['digest']} from {source.api_prefix}")
+            return True
+        if r.status_code == 202 and (session_url := self._get_location(r, container)):
+            # the registry opened a regular upload session instead, don't leave it dangling
+            self.do_request(session_url, "DELETE")
+        return False
+
+    @ensure_container
+    def get_manifest(self, container, allowed_media_type=None, validation_schema=None):
+        """
+        Retrieve a manifest for a package, through the manifest cache.
+
+        A cached manifest past its TTL is revalidated with a conditional GET when
+        the registry supplied an ETag, or else with a HEAD comparing digests; only
+        a changed manifest is downloaded again.
+        """
+        with tracer.span("manifest", reference=str(container)):
+            return self._get_manifest(container, allowed_media_type, validation_schema)
+
+    def _get_manifest(self, container, allowed_media_type, validation_schema):
+        self.auth.load_configs(container)
+        reference = str(container)
+        accept = ", ".join(allowed_media_type or default_manifest_accepted_media_types)
+        url = f"{self.prefix}://{container.manifest_url()}"
+        cache = self.manifest_cache
+
+        entry = cache.get(reference)
+        if entry is not None and entry.accept != accept:
+            entry = None
+        if entry is not None and cache.is_fresh(reference, entry):
+            cache.count("hits")
+            return self._validated(entry.manifest, validation_schema)
+
+        headers = {"Accept": accept}
+        if entry is not None and entry.etag is not None:
+            headers["If-None-Match"] = entry.etag
+        elif entry is not None and entry.digest:
+            response = self.do_request(url, "HEAD", headers=headers)
+            digest = response.headers.get("Docker-Content-Digest")
+            # without the header, nothing tells whether the tag has moved
+            if response.status_code == 200 and digest and digest == entry.digest:
+                return self._revalidated(reference, entry, validation_schema)
+
+        response = self.do_request(url, "GET", headers=headers)
+        if entry is not None and response.status_code == 304:
+            return self._revalidated(reference, entry, validation_schema)
+        self._check_200_response(response)
+        cache.count("misses")
+        manifest = response.json()
+        cache.put(
+            reference,
+            CachedManifest(
+                manifest,
+                response.headers.get("Docker-Content-Digest") or container.digest,
+                response.headers.get("ETag"),
+                accept,
+            ),
+        )
+        return self._validated(manifest, validation_schema)
+
+    def _revalidated(self, reference, entry: CachedManifest, validation_schema):
+        self.manifest_cache.count("revalidations")
+        self.manifest_cache.put(
+            reference,
+            CachedManifest(entry.manifest, entry.digest, entry.etag, entry.accept),
+        )
+        return self._validated(entry.manifest, validation_schema)
+
+    @staticmethod
+    def _validated(manifest: dict, validation_schema) -> dict:
+        if validation_schema:
+            jsonschema.validate(manifest, schema=validation_schema)
+        # callers are free to modify what they get, the cached copy stays intact
+        return copy.deepcopy(manifest)
+
     @ensure_container
-    def download_layers(self, package, download_dir, media_types):
+    def resolve_digest(self, container) -> str:
+        """
+        Resolve a reference to its manifest digest, memoized through the manifest cache.
+        """
+        if container.digest:
+            return container.digest
+        if digest := self.manifest_cache.resolved_digest(str(container)):
+            return digest
+        self.auth.load_configs(container)
+        response = self.do_request(
+            f"{self.prefix}://{container.manifest_url()}",
+            "HEAD",
+            headers={"Accept": ", ".join(default_manifest_accepted_media_types)},
+        )
+        self._check_200_response(response)
+        digest = response.headers.get("Docker-Content-Digest")
+        if not digest:
+            # not all registries answer HEAD with a digest, fall back to a GET
+            self.get_manifest(container)
+            digest = self.manifest_cache.resolved_digest(str(container))
+        if not digest:
+            raise RuntimeError(f"Unable to resolve digest of {container}")
+        self.manifest_cache.put_digest(str(container), digest)
+        return digest
+
+    def get_repositories(
+        self, registry: str, page_size: int | None = None
+    ) -> list[str]:
+        """
+        Repositories of `registry` listed by its `_catalog` endpoint, following
+        pagination, `page_size` at a time when given.
+        """
+        # credentials are looked up by registry, any repository name does
+        self.auth.load_configs(oras.container.Container("_catalog", registry=registry))
+        url = f"{self.prefix}://{registry}/v2/_catalog"
+        if page_size:
+            url = oras.utils.append_url_params(url, {"n": page_size})
+        repositories: list[str] = []
+
+        def extract_repositories(response: requests.Response) -> bool:
+            page = response.json().get("repositories") or []
+            repositories.extend(page)
+            return bool(page)
+
+        self._do_paginated_request(url, callable=extract_repositories)
+        return repositories
+
+    @ensure_container
+    def download_layers(
+        self,
+        package,
+        download_dir,
+        media_types,
+        jobs: int = 1,
+        atomic: bool = False,
+        progress: ProgressCallback | None = None,
+        layer_filter: LayerFilter | None = None,
+    ):
         """
         Given a manifest of layers, retrieve a layer based on desired media type
+        and, if given, `layer_filter`
+
+        Up to `jobs` layers are downloaded concurrently. If any layer fails, the
+        layers not yet started are cancelled, the files of the failed layers are
+        removed and a LayerDownloadError is raised.
+
+        With `atomic`, layers are staged in a sibling of `download_dir` which then
+        replaces it in a single swap, see `_download_staged`.
+
+        `progress` is called with the bytes done of each layer and of the whole
+        pull, see `TransferProgress`.
         """
-        # If you intend to call this function again, you might cache this response
-        # for the package of interest.
-        manifest = self.get_manifest(package)
+        selected = self._select_layers(
+            self.get_manifest(package), media_types, layer_filter
+        )
+        tracker = self._tracker(progress, "pull", [layer for _, layer in selected])
 
-        paths = []
+        if atomic:
+            return self._download_staged(package, download_dir, selected, jobs, tracker)
+        outfiles = [
+            (
+                artifact,
+                layer,
+                sanitize_path(download_dir, os.path.join(download_dir, artifact)),
+            )
+            for artifact, layer in selected
+        ]
+        self._download_all(package, outfiles, jobs, tracker)
+        return [outfile for _, _, outfile in outfiles]
 
-        for layer in manifest.get("layers", []):
+    @staticmethod
+    def _tracker(
+        progress: ProgressCallback | None, operation: str, layers: Iterable[dict]
+    ) -> TransferProgress | None:
+        if progress is None:
+            return None
+        tracker = TransferProgress(progress, operation)
+        for layer in layers:
+            tracker.add(
+                layer["digest"],
+                layer.get("size"),
+                (layer.get("annotations") or {}).get(ANNOTATION_TITLE),
+            )
+        return tracker
+
+    @staticmethod
+    def _select_layers(
+        manifest: dict, media_types, layer_filter: LayerFilter | None = None
+    ) -> list[tuple[str, dict]]:
+        return [
+            (layer["annotations"][ANNOTATION_TITLE], layer)
+            for layer in manifest.get("layers", [])
             if (
                 media_types is None
                 or len(media_types) == 0
                 or layer["mediaType"] in media_types
-            ):
-                artifact = layer["annotations"][ANNOTATION_TITLE]
-                outfile = sanitize_path(
-                    download_dir, os.path.join(download_dir, artifact)
+                or base_media_type(layer["mediaType"]) in media_types
+            )
+            and (layer_filter is None or layer_filter.matches(layer))
+        ]
+
+    def download_many(
+        self,
+        packages: Sequence[tuple[str, str]],
+        media_types=None,
+        jobs: int = 1,
+        progress: ProgressCallback | None = None,
+        layer_filter: LayerFilter | None = None,
+    ) -> dict[str, list[str] | BaseException]:
+        """
+        Pull each (package, download_dir) pair, sharing `jobs` workers between
+        all the layers of all the packages.
+
+        A blob several packages have in common is downloaded once and linked
+        into the other download directories. A package which fails doesn't
+        stop the others: it maps to its exception instead of its files, a
+        `LayerDownloadError` keyed by the titles of its failed layers.
+
+        `progress` is called with the bytes done of each blob and of all the
+        packages together.
+        """
+        results: dict[str, list[str] | BaseException] = {}
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            manifests = {
+                package: executor.submit(self.get_manifest, package)
+                for package, _ in packages
+            }
+            # digest -> (package, layer) which downloads it, and its other outfiles
+            downloads: dict[str, tuple[str, dict, str]] = {}
+            copies: dict[str, list[str]] = {}
+            # (title, digest, outfile) of the layers of each package
+            outfiles: dict[str, list[tuple[str, str, str]]] = {}
+            for package, download_dir in packages:
+                try:
+                    selected = self._select_layers(
+                        manifests[package].result(), media_types, layer_filter
+                    )
+                except REGISTRY_ERRORS as e:
+                    results[package] = e
+                    continue
+                outfiles[package] = []
+                for artifact, layer in selected:
+                    outfile = sanitize_path(
+                        download_dir, os.path.join(download_dir, artifact)
+                    )
+                    outfiles[package].append((artifact, layer["digest"], outfile))
+                    if layer["digest"] in downloads:
+                        copies.setdefault(layer["digest"], []).append(outfile)
+                    else:
+                        downloads[layer["digest"]] = (package, layer, outfile)
+
+            tracker = self._tracker(
+                progress, "pull", [layer for _, layer, _ in downloads.values()]
+            )
+            blobs = {
+                digest: executor.submit(
+                    self._download_layer,
+                    package,
+                    digest,
+                    outfile,
+                    layer.get("size"),
+                    tracker,
+                    CompressedLayer.of(layer),
                 )
-                path = self.download_blob(package, layer["digest"], outfile)
-                paths.append(path)
+                for digest, (package, layer, outfile) in downloads.items()
+            }
+            # errors linking a downloaded blob into another package, by outfile
+            copy_errors: dict[str, BaseException] = {}
+            for digest, future in blobs.items():
+                if future.exception() is None:
+                    for outfile in copies.get(digest, []):
+                        try:
+                            os.makedirs(os.path.dirname(outfile), exist_ok=True)
+                            place(Path(future.result()), Path(outfile))
+                        except OSError as e:
+                            copy_errors[outfile] = e
 
-        return paths
+        for package, files in outfiles.items():
+            failures = {
+                artifact: error
+                for artifact, digest, outfile in files
+                if (error := blobs[digest].exception() or copy_errors.get(outfile))
+                is not None
+            }
+            if failures:
+                results[package] = LayerDownloadError(package, failures)
+            else:
+                results[package] = [outfile for _, _, outfile in files]
+        return results
+
+    def _download_all(
+        self, package, selected, jobs: int, progress: TransferProgress | None = None
+    ):
+        _, failures = _run_concurrently(
+            {
+                artifact: partial(
+                    self._download_layer,
+                    package,
+                    layer["digest"],
+                    outfile,
+                    layer.get("size"),
+                    progress,
+                    CompressedLayer.of(layer),
+                )
+                for artifact, layer, outfile in selected
+            },
+            jobs,
+        )
+        if failures:
+            raise LayerDownloadError(package, failures) from next(
+                iter(failures.values())
+            )
+
+    def _download_staged(
+        self,
+        package,
+        download_dir,
+        selected,
+        jobs: int,
+        progress: TransferProgress | None = None,
+    ) -> list[str]:
+        """
+        Download the selected layers into a staging directory next to
+        `download_dir`, then swap it in, so readers of `download_dir` never see
+        a partially pulled model. The new directory holds only the selected layers.
+
+        Files already in `download_dir` with the digest of a layer are linked
+        into the staging directory instead of being downloaded again.
+
+        The old content of `download_dir` is deleted, so it has to be empty or
+        made by an earlier atomic pull, which leaves a `PULL_MARKER` file in it.
+        """
+        download_dir = Path(download_dir).absolute()
+        if (
+            download_dir.exists()
+            and not (download_dir / PULL_MARKER).is_file()
+            and (not download_dir.is_dir() or any(download_dir.iterdir()))
+        ):
+            raise RuntimeError(
+                f"Refusing to replace {download_dir}, which holds files not pulled by omlmd; pull into a new or empty directory"
+            )
+        download_dir.parent.mkdir(parents=True, exist_ok=True)
+        staging = download_dir.with_name(
+            f".{download_dir.name}.staging-{os.getpid()}-{threading.get_ident()}"
+        )
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        try:
+            # files on disk hold the content of compressed layers
+            contents = {
+                layer["digest"]: (
+                    (compressed.content_digest, compressed.content_size)
+                    if (compressed := CompressedLayer.of(layer)) is not None
+                    else (layer["digest"], layer.get("size"))
+                )
+                for _, layer in selected
+            }
+            current = self._local_digests(
+                download_dir, {size for _, size in contents.values()}, jobs
+            )
+            pending = []
+            for artifact, layer in selected:
+                staged = sanitize_path(str(staging), os.path.join(staging, artifact))
+                content_digest = contents[layer["digest"]][0]
+                if (existing := current.get(content_digest)) is not None:
+                    logger.debug(f"Reusing unchanged {existing} for {artifact}")
+                    os.makedirs(os.path.dirname(staged), exist_ok=True)
+                    place(Path(existing), Path(staged))
+                    if progress is not None:
+                        progress.finish(layer["digest"])
+                else:
+                    pending.append((artifact, layer, staged))
+            self._download_all(package, pending, jobs, progress)
+            (staging / PULL_MARKER).write_text(f"{package}\n")
+            swap_directory(staging, download_dir)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return [
+            sanitize_path(str(download_dir), os.path.join(download_dir, artifact))
+            for artifact, _ in selected
+        ]
+
+    def _local_digests(self, directory: Path, sizes: set, jobs: int) -> dict[str, str]:
+        """
+        Map the digest of each file in `directory` to its path, only hashing
+        files which have the size of one of the wanted layers.
+        """
+        if not directory.is_dir():
+            return {}
+        candidates = [
+            str(p)
+            for p in directory.rglob("*")
+            if p.is_file()
+            and not p.is_symlink()
+            and not p.name.endswith(PARTIAL_SUFFIX)
+            and p.name != PULL_MARKER
+            and p.stat().st_size in sizes
+        ]
+        digests = compute_digests(candidates, jobs, self.digest_cache)
+        return {digest: path for path, digest in digests.items()}
+
+    def _download_layer(
+        self,
+        package,
+        digest: str,
+        outfile: str,
+        size: int | None,
+        progress: TransferProgress | None = None,
+        compressed: CompressedLayer | None = None,
+    ) -> str:
+        try:
+            return self.download_blob(
+                package, digest, outfile, size, progress, compressed=compressed
+            )
+        except BaseException:
+            if os.path.exists(outfile):
+                os.remove(outfile)
+            raise
+
+    @ensure_container
+    def download_blob(
+        self,
+        container,
+        digest: str,
+        outfile: str,
+        size: int | None = None,
+        progress: TransferProgress | None = None,
+        compressed: CompressedLayer | None = None,
+    ) -> str:
+        """
+        Stream download a blob into an output file, verifying its digest on the fly.
+
+        Bytes are appended to a `.partial` file named after `outfile` and `digest`,
+        which is renamed to `outfile` only once the digest matches; one left behind
+        by an interrupted download of the same blob is resumed with a Range request
+        instead of starting over, while another blob never resumes it. When
+        `size` is known and large enough, byte ranges are fetched in parallel.
+
+        With a `blob_cache`, cached blobs are linked into place instead of being
+        downloaded, and downloaded blobs are added to the cache.
+
+        Bytes written are reported to `progress`, if given.
+
+        A `compressed` blob is decompressed while it streams in, its content
+        verified and cached under the digest of the content as well.
+        """
+        # the blob cache holds the content of a compressed blob, not the blob
+        cache_digest, cache_size = (
+            (compressed.content_digest, compressed.content_size)
+            if compressed is not None
+            else (digest, size)
+        )
+        with tracer.span("blob.download", digest=digest) as span:
+            partial = _partial_path(outfile, digest)
+            try:
+                outdir = os.path.dirname(outfile)
+                if outdir:
+                    os.makedirs(outdir, exist_ok=True)
+                if self.blob_cache is not None and self.blob_cache.link_into(
+                    cache_digest, outfile, cache_size
+                ):
+                    span.attributes["outcome"] = "cached"
+                    if progress is not None:
+                        progress.finish(digest, size)
+                    return outfile
+                if compressed is not None:
+                    span.attributes["compression"] = compressed.compression
+                    writer: _VerifyingWriter = _DecompressingWriter(
+                        partial, digest, compressed, size, self.limiter, progress
+                    )
+                else:
+                    writer = _VerifyingWriter(
+                        partial, digest, size, self.limiter, progress
+                    )
+                with writer:
+                    for attempt in range(self.download_retries + 1):
+                        try:
+                            self._download_into(container, digest, writer, size)
+                            break
+                        except requests.exceptions.RequestException as e:
+                            if attempt == self.download_retries:
+                                raise
+                            logger.info(
+                                f"Resuming {digest} at byte {writer.offset} - error: {e}"
+                            )
+                if writer.actual_digest != digest:
+                    os.remove(partial)
+                    raise ValueError(
+                        f"Digest mismatch for {outfile}: expected {digest}, got {writer.actual_digest}"
+                    )
+                if (
+                    isinstance(writer, _DecompressingWriter)
+                    and writer.actual_content_digest != cache_digest
+                ):
+                    os.remove(partial)
+                    raise ValueError(
+                        f"Digest mismatch for {outfile} once decompressed: expected {cache_digest}, got {writer.actual_content_digest}"
+                    )
+                os.replace(partial, outfile)
+                if self.blob_cache is not None:
+                    self.blob_cache.add(cache_digest, outfile)
+                span.attributes["outcome"] = "downloaded"
+                span.bytes = writer.received
+                if progress is not None:
+                    progress.finish(digest, writer.offset)
+            # Allow an empty layer to fail and return /dev/null
+            except Exception:
+                if digest == blank_hash:
+                    span.attributes["outcome"] = "empty"
+                    if progress is not None:
+                        progress.finish(digest, 0)
+                    return os.devnull
+                raise
+            return outfile
+
+    @ensure_container
+    def fetch_blob(self, container, digest: str, size: int) -> bytes:
+        """
+        Read a small blob of known size straight into memory, verifying its digest.
+        """
+        hasher = hashlib.new(digest.partition(":")[0])
+        content = bytearray()
+        blob_url = f"{self.prefix}://{container.get_blob_url(digest)}"
+        with tracer.span("blob.download", digest=digest, outcome="in-memory") as span:
+            with self.do_request(
+                blob_url, "GET", headers=dict(self.headers), stream=True
+            ) as r:
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=64 * 1024):
+                    content += chunk
+                    if len(content) > size:
+                        raise ValueError(
+                            f"Blob {digest} is larger than its declared {size} bytes"
+                        )
+                    hasher.update(chunk)
+            span.bytes = len(content)
+        if f"{hasher.name}:{hasher.hexdigest()}" != digest:
+            raise ValueError(f"Digest mismatch for blob {digest}")
+        return bytes(content)
+
+    def _download_into(
+        self, container, digest: str, writer: _VerifyingWriter, size: int | None
+    ):
+        if size is not None and writer.offset == size:
+            return
+        if (
+            size is not None
+            and size - writer.offset >= self.range_download_threshold
+            and self.range_parts > 1
+        ):
+            try:
+                self._download_ranges(container, digest, writer, size)
+                return
+            except _RangeNotSupported:
+                logger.debug(f"Registry ignored Range for {digest}, streaming instead")
+        self._download_stream(container, digest, writer)
+
+    def _download_stream(self, container, digest: str, writer: _VerifyingWriter):
+        headers = dict(self.headers)
+        if writer.offset:
+            headers["Range"] = f"bytes={writer.offset}-"
+        blob_url = f"{self.prefix}://{container.get_blob_url(digest)}"
+        with self.do_request(blob_url, "GET", headers=headers, stream=True) as r:
+            if writer.offset and r.status_code in (200, 416):
+                # the registry can't serve the remainder, start over from scratch
+                writer.reset()
+                if r.status_code == 416:
+                    return self._download_stream(container, digest, writer)
+            r.raise_for_status()
+            for chunk in r.iter_content(chunk_size=1024 * 1024):
+                if chunk:
+                    writer.write(chunk)
+
+    def _download_ranges(
+        self, container, digest: str, writer: _VerifyingWriter, size: int
+    ):
+        """
+        Fetch the remainder of a blob as `range_chunk_size` ranges, up to
+        `range_parts` at a time, appending them in order so the `.partial` file
+        is always a contiguous, resumable prefix.
+        """
+        blob_url = f"{self.prefix}://{container.get_blob_url(digest)}"
+        ranges = iter(
+            (start, min(start + self.range_chunk_size, size) - 1)
+            for start in range(writer.offset, size, self.range_chunk_size)
+        )
+        with ThreadPoolExecutor(max_workers=self.range_parts) as executor:
+            pending = deque(
+                executor.submit(self._fetch_range, blob_url, start, end)
+                for start, end in islice(ranges, self.range_parts)
+            )
+            try:
+                while pending:
+                    writer.write(pending.popleft().result())
+                    for start, end in islice(ranges, 1):
+                        pending.append(
+                            executor.submit(self._fetch_range, blob_url, start, end)
+                        )
+            finally:
+                for f in pending:
+                    f.cancel()
+
+    def _fetch_range(self, blob_url: str, start: int, end: int) -> bytes:
+        headers = {**self.headers, "Range": f"bytes={start}-{end}"}
+        # streamed, so that a registry ignoring Range isn't read to the end
+        with self.do_request(blob_url, "GET", headers=headers, stream=True) as r:
+            if r.status_code == 200:
+                raise _RangeNotSupported()
+            r.raise_for_status()
+            content = r.content
+        if len(content) != end - start + 1:
+            raise requests.exceptions.ContentDecodingError(
+                f"Expected {end - start + 1} bytes for range {start}-{end}, got {len(content)}"
+            )
+        return content
+
+    @ensure_container
+    def read_range(self, container, digest: str, start: int, end: int) -> bytes:
+        """
+        Read bytes `start` to `end` inclusive of a blob with one Range request.
+
+        Unlike a download, the bytes can't be verified against the digest.
+        """
+        blob_url = f"{self.prefix}://{container.get_blob_url(digest)}"
+        with tracer.span("blob.range", digest=digest) as span:
+            try:
+                content = self._fetch_range(blob_url, start, end)
+            except _RangeNotSupported:
+                raise RuntimeError(
+                    f"Registry does not support range reads of {digest}"
+                ) from None
+            span.bytes = len(content)
+        return content
 
     @ensure_container
     def get_config(self, package) -> str:
         """
         Given a manifest of layers, retrieve a layer based on desired media type
         """
-        # If you intend to call this function again, you might cache this response
-        # for the package of interest.
         manifest = self.get_manifest(package)
 
         manifest_config = manifest.get("config", {})
+        if (
+            config := self.manifest_cache.get_config(manifest_config["digest"])
+        ) is not None:
+            return config
 
         for layer in manifest.get("layers", []):
             if layer["digest"] == manifest_config["digest"]:
-                temp_dir = tempfile.mkdtemp()
-                try:
-                    with tempfile.NamedTemporaryFile(
-                        dir=temp_dir, delete=False
-                    ) as temp_file:
-                        self.download_blob(package, layer["digest"], temp_file.name)
-                    with open(temp_file.name, "r") as temp_file_read:
-                        file_content = temp_file_read.read()
-                        return file_content
-                finally:
-                    if os.path.exists(temp_dir):
-                        for root, dirs, files in os.walk(temp_dir, topdown=False):
-                            for file in files:
-                                os.remove(os.path.join(root, file))
-                            for dir in dirs:
-                                os.rmdir(os.path.join(root, dir))
-                        os.rmdir(temp_dir)
-                        # print("Temporary directory and its contents have been removed.")
+                size = layer.get("size")
+                if size is not None and size <= self.in_memory_blob_threshold:
+                    file_content = self.fetch_blob(
+                        package, layer["digest"], size
+                    ).decode("utf-8")
+                else:
+                    with tempfile.TemporaryDirectory() as temp_dir:
+                        temp_file = os.path.join(temp_dir, "config")
+                        self.download_blob(package, layer["digest"], temp_file, size)
+                        with open(temp_file, "r") as temp_file_read:
+                            file_content = temp_file_read.read()
+                self.manifest_cache.put_config(layer["digest"], file_content)
+                return file_content
         raise RuntimeError("Unable to locate config layer")
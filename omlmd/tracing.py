@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """
+    One timed operation, such as a manifest fetch or a blob transfer.
+    """
+
+    name: str
+    attributes: dict[str, Any] = field(default_factory=dict)
+    # bytes transferred or hashed during the span, when relevant
+    bytes: int = 0
+    start_time_ns: int = field(default_factory=time.time_ns)
+    duration: float = 0.0
+    error: str | None = None
+
+    @property
+    def throughput(self) -> float | None:
+        """
+        Bytes per second, for spans which moved bytes.
+        """
+        if not self.bytes or not self.duration:
+            return None
+        return self.bytes / self.duration
+
+
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, span: Span) -> None:
+        """
+        Receive a span once it has ended.
+        """
+
+
+class Tracer:
+    """
+    Times operations as spans and hands them to its exporters; without
+    exporters, spans cost little more than two clock reads.
+    """
+
+    def __init__(self):
+        self.exporters: list[SpanExporter] = []
+
+    def add_exporter(self, exporter: SpanExporter) -> None:
+        self.exporters.append(exporter)
+
+    def remove_exporter(self, exporter: SpanExporter) -> None:
+        self.exporters.remove(exporter)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        span = Span(name, attributes)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = str(e) or type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            for exporter in self.exporters:
+                try:
+                    exporter.export(span)
+                except Exception:
+                    logger.exception(f"Span exporter {exporter!r} failed")
+
+
+# the tracer every omlmd operation reports to
+tracer = Tracer()
+
+
+class LoggingExporter(SpanExporter):
+    """
+    Logs every span, with its throughput when it moved bytes.
+    """
+
+    def __init__(self, level: int = logging.DEBUG):
+        self.level = level
+
+    def export(self, span: Span) -> None:
+        details = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+        if (throughput := span.throughput) is not None:
+            details += f" bytes={span.bytes} throughput={throughput / 1e6:.2f}MB/s"
+        if span.error:
+            details += f" error={span.error!r}"
+        logger.log(self.level, f"{span.name} took {span.duration:.3f}s {details}")
+
+
+@dataclass
+class PhaseTiming:
+    count: int = 0
+    duration: float = 0.0
+    bytes: int = 0
+
+
+class SummaryExporter(SpanExporter):
+    """
+    Totals time and bytes per span name, for a breakdown once a command is done.
+
+    Spans of concurrent operations overlap, so the time of a phase can exceed
+    the wall-clock time of the command.
+    """
+
+    def __init__(self):
+        self.phases: dict[str, PhaseTiming] = {}
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            phase = self.phases.setdefault(span.name, PhaseTiming())
+            phase.count += 1
+            phase.duration += span.duration
+            phase.bytes += span.bytes
+
+    def summary(self) -> str:
+        lines = [
+            f"{'phase':<20} {'count':>6} {'time (s)':>10} {'bytes':>14} {'MB/s':>9}"
+        ]
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda p: -p[1].duration)
+        for name, phase in phases:
+            throughput = (
+                f"{phase.bytes / phase.duration / 1e6:9.2f}"
+                if phase.bytes and phase.duration
+                else ""
+            )
+            lines.append(
+                f"{name:<20} {phase.count:>6} {phase.duration:>10.3f} {phase.bytes or '':>14} {throughput}".rstrip()
+            )
+        return "\n".join(lines)
+
+
+class OpenTelemetryExporter(SpanExporter):
+    """
+    Forwards spans to an OpenTelemetry tracer, by default the global one of
+    `opentelemetry-api`, which has to be installed separately.
+    """
+
+    def __init__(self, otel_tracer=None):
+        if otel_tracer is None:
+            try:
+                from opentelemetry import trace
+            except ImportError as e:
+                raise ImportError(
+                    "OpenTelemetryExporter requires the opentelemetry-api package"
+                ) from e
+            otel_tracer = trace.get_tracer("omlmd")
+        self.otel_tracer = otel_tracer
+
+    def export(self, span: Span) -> None:
+        attributes: dict[str, Any] = {
+            f"omlmd.{k}": str(v) for k, v in span.attributes.items()
+        }
+        if span.bytes:
+            attributes["omlmd.bytes"] = span.bytes
+        otel_span = self.otel_tracer.start_span(
+            span.name, start_time=span.start_time_ns, attributes=attributes
+        )
+        if span.error:
+            otel_span.set_attribute("error", span.error)
+        otel_span.end(end_time=span.start_time_ns + int(span.duration * 1e9))
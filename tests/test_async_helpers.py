@@ -0,0 +1,98 @@
+import asyncio
+import json
+import threading
+import typing as t
+
+import pytest
+
+from omlmd.async_helpers import AsyncHelper
+from omlmd.helpers import Helper
+from omlmd.listener import AsyncListener, Event
+from omlmd.provider import OMLMDRegistry
+
+
+def test_async_crawl_concurrently(mocker):
+    registry = OMLMDRegistry()
+    barrier = threading.Barrier(8, timeout=5)
+
+    def get_config(target):
+        barrier.wait()  # only returns once 8 lookups are in flight together
+        return json.dumps({"target": target})
+
+    mocker.patch.object(registry, "get_config", side_effect=get_config)
+
+    async def crawl():
+        async with AsyncHelper(Helper(registry), max_workers=8) as helper:
+            return await helper.crawl([f"r/m:v{i}" for i in range(16)])
+
+    result = json.loads(asyncio.run(crawl()))
+
+    assert [r["config"]["target"] for r in result] == [f"r/m:v{i}" for i in range(16)]
+
+
+def test_async_push_event(mocker):
+    registry = OMLMDRegistry()
+    m = mocker.MagicMock()
+    m.headers = {"Docker-Content-Digest": "sha256:123"}
+    mocker.patch.object(registry, "push", return_value=m)
+
+    events = []
+
+    class MyListener(AsyncListener):
+        async def update(self, source: t.Any, event: Event) -> None:
+            await asyncio.sleep(0)
+            events.append(event)
+
+    async def push():
+        async with AsyncHelper(Helper(registry)) as helper:
+            helper.add_listener(MyListener())
+            await helper.push(
+                "unexistent:8080/testorgns/ml-iris:v1", "README.md", name="mnist"
+            )
+            assert len(events) == 1  # delivered before push returns
+
+    asyncio.run(push())
+
+    assert events[0].digest == "sha256:123"
+    assert events[0].metadata.name == "mnist"
+
+
+def test_async_default_pool_matches_workers():
+    async def adapter():
+        async with AsyncHelper(max_workers=48) as helper:
+            return helper._helper._registry.session.get_adapter("https://r")
+
+    assert asyncio.run(adapter())._pool_maxsize == 48
+
+
+def test_async_get_metadata_many(mocker):
+    registry = OMLMDRegistry()
+
+    def get_manifest(target):
+        if target.endswith(":bad"):
+            raise RuntimeError("manifest unknown")
+        return {"annotations": {"name": target}}
+
+    mocker.patch.object(registry, "get_manifest", side_effect=get_manifest)
+
+    async def get_metadata_many():
+        async with AsyncHelper(Helper(registry)) as helper:
+            return await helper.get_metadata_many(["r/m:v1", "r/m:bad"])
+
+    result = asyncio.run(get_metadata_many())
+
+    assert result["r/m:v1"].name == "r/m:v1"
+    assert isinstance(result["r/m:bad"], RuntimeError)
+
+
+def test_async_get_metadata_many_propagates_unexpected_errors(mocker):
+    registry = OMLMDRegistry()
+    # a bug rather than a registry failure
+    mocker.patch.object(registry, "get_manifest", side_effect=AttributeError("bug"))
+
+    async def get_metadata_many():
+        async with AsyncHelper(Helper(registry)) as helper:
+            return await helper.get_metadata_many(["r/m:v1"])
+
+    with pytest.raises(AttributeError):
+        asyncio.run(get_metadata_many())
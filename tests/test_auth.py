@@ -0,0 +1,70 @@
+import base64
+import json
+import time
+
+import requests
+
+from omlmd.auth import ScopedTokenAuth, scope_of, token_expiry
+from omlmd.provider import OMLMDRegistry
+
+
+def _response(status_code: int, body=None, headers=None):
+    r = requests.Response()
+    r.status_code = status_code
+    r._content = json.dumps(body or {}).encode()
+    r.headers.update(headers or {})
+    return r
+
+
+def _jwt(exp: float) -> str:
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode()
+    return f"header.{claims.rstrip('=')}.signature"
+
+
+def test_scope_of():
+    assert scope_of("http://r:5000/v2/ns/m/manifests/v1") == "r:5000/ns/m"
+    assert scope_of("http://r:5000/v2/ns/m/blobs/uploads/abc") == "r:5000/ns/m"
+    assert scope_of("http://r:5000/v2/_catalog") == "r:5000"
+    assert token_expiry(_jwt(123)) == 123
+    assert token_expiry("opaque") is None
+
+
+def test_token_reused_per_repository(mocker):
+    registry = OMLMDRegistry(insecure=True)
+    assert isinstance(registry.auth, ScopedTokenAuth)
+    issued = []
+
+    def request(method, url, params=None, headers=None, **kwargs):
+        if url == "http://auth/token":
+            repository = params["scope"].split(":")[1]
+            issued.append(repository)
+            return _response(200, {"token": _jwt(time.time() + 300) + repository})
+        repository = url.split("/v2/")[1].rsplit("/manifests/", 1)[0]
+        if (headers or {}).get("Authorization", "").endswith(repository):
+            return _response(200)
+        challenge = (
+            f'Bearer realm="http://auth/token",scope="repository:{repository}:pull"'
+        )
+        return _response(401, headers={"Www-Authenticate": challenge})
+
+    mocker.patch.object(registry.session, "request", side_effect=request)
+
+    for repository in ["ns/a", "ns/b", "ns/a", "ns/b"]:
+        url = f"http://r:5000/v2/{repository}/manifests/v1"
+        assert registry.do_request(url, "HEAD").status_code == 200
+
+    assert issued == ["ns/a", "ns/b"]
+    assert registry.pool_stats().tokens_fetched == 2
+
+
+def test_token_refreshed_before_expiry(mocker):
+    auth = ScopedTokenAuth()
+    fresh = _jwt(time.time() + 300)
+    mocker.patch.object(auth, "request_anonymous_token", return_value=fresh)
+    challenge = {"Www-Authenticate": 'Bearer realm="http://auth/token"'}
+    with auth.scoped("http://r:5000/v2/ns/a/manifests/v1"):
+        auth.authenticate_request(_response(401, headers=challenge), {})
+        auth.token = _jwt(time.time() + 5)  # about to expire
+
+        assert auth.token == fresh
+    assert auth.request_anonymous_token.call_count == 2
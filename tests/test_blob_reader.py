@@ -0,0 +1,64 @@
+import io
+
+from omlmd.blob_reader import BlobReader
+from omlmd.provider import OMLMDRegistry
+
+DATA = bytes(range(256)) * 40
+
+
+def _reader(mocker, **kwargs) -> tuple[BlobReader, list]:
+    registry = OMLMDRegistry()
+    requests = []
+
+    def read_range(container, digest, start, end):
+        requests.append((start, end))
+        return DATA[start : end + 1]
+
+    mocker.patch.object(registry, "read_range", side_effect=read_range)
+    reader = BlobReader(
+        registry,
+        "unexistent:8080/testorgns/ml-iris:v1",
+        "sha256:123",
+        len(DATA),
+        block_size=1024,
+        **kwargs,
+    )
+    return reader, requests
+
+
+def test_blob_reader_fetches_blocks_on_demand(mocker):
+    reader, requests = _reader(mocker, cache_blocks=2)
+
+    assert reader.read(8) == DATA[:8]
+    assert reader.read(8) == DATA[8:16]
+    assert requests == [(0, 1023)]
+
+    reader.seek(-100, io.SEEK_END)
+    assert reader.read() == DATA[-100:]
+    reader.seek(1000)
+    assert reader.read(2000) == DATA[1000:3000]
+    # block 0 is still cached, blocks 1 and 2 fetched in one request
+    assert requests == [(0, 1023), (9216, 10239), (1024, 3071)]
+
+    reader.seek(0)
+    assert reader.read(1) == DATA[:1]
+    assert requests[-1] == (0, 1023)  # evicted by the blocks read since
+    assert reader.read(len(DATA)) == DATA[1:]
+    assert reader.read(1) == b""
+
+
+def test_blob_reader_backing_file(mocker, tmp_path):
+    backing = tmp_path / "model.bin"
+    reader, requests = _reader(mocker, cache_blocks=0, backing_file=backing)
+
+    with reader:
+        reader.seek(5000)
+        assert reader.read(10) == DATA[5000:5010]
+        reader.seek(5000)
+        assert reader.read(10) == DATA[5000:5010]
+        assert requests == [(4096, 5119)]
+
+        content = backing.read_bytes()
+        assert len(content) == len(DATA)
+        assert content[4096:5120] == DATA[4096:5120]
+    assert reader.closed
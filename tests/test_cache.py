@@ -0,0 +1,63 @@
+import os
+from hashlib import sha256
+
+from omlmd.cache import BlobCache
+
+
+def test_blob_cache_hit_miss(tmp_path):
+    cache = BlobCache(tmp_path / "cache")
+    src = tmp_path / "blob"
+    src.write_bytes(b"weights")
+
+    assert not cache.link_into("sha256:abc", tmp_path / "out-1")
+    cache.add("sha256:abc", src)
+    assert cache.link_into("sha256:abc", tmp_path / "out-2", size=7)
+
+    assert (tmp_path / "out-2").read_bytes() == b"weights"
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.bytes_saved == 7
+
+
+def test_blob_cache_lru_eviction(tmp_path):
+    cache = BlobCache(tmp_path / "cache", max_size=10)
+    for i, digest in enumerate(["sha256:a", "sha256:b"]):
+        src = tmp_path / digest
+        src.write_bytes(b"12345")
+        cache.add(digest, src)
+        os.utime(cache.path_for(digest), (i, i))
+    cache.link_into("sha256:a", tmp_path / "out")  # refreshes a, b is now LRU
+
+    src = tmp_path / "c"
+    src.write_bytes(b"12345")
+    cache.add("sha256:c", src)
+
+    assert cache.path_for("sha256:a").exists()
+    assert not cache.path_for("sha256:b").exists()
+    assert cache.path_for("sha256:c").exists()
+    assert cache.stats.evictions == 1
+
+
+def test_blob_cache_survives_in_place_edit(tmp_path):
+    cache = BlobCache(tmp_path / "cache")
+    content = b"model weights"
+    digest = "sha256:" + sha256(content).hexdigest()
+    pulled = tmp_path / "pulled.bin"
+    pulled.write_bytes(content)
+    cache.add(digest, pulled)
+
+    with open(pulled, "r+b") as f:
+        f.write(b"MODEL")
+    assert cache.path_for(digest).read_bytes() == content
+
+    # a hit hardlinked into the output, then edited there
+    out = tmp_path / "out"
+    out.mkdir()
+    assert cache.link_into(digest, out / "a.bin", len(content))
+    with open(out / "a.bin", "r+b") as f:
+        f.write(b"MODEL")
+
+    if cache.link_into(digest, out / "b.bin", len(content)):
+        assert (out / "b.bin").read_bytes() == content  # reflinked
+    else:
+        assert not cache.path_for(digest).exists()
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+import omlmd.provider
+from omlmd.compression import (
+    CompressedLayer,
+    base_media_type,
+    compress_file,
+    compression_of,
+    decompressor,
+    is_dense,
+)
+from omlmd.constants import ANNOTATION_UNCOMPRESSED_DIGEST
+from omlmd.digest import DigestCache
+from omlmd.provider import _compress_files
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_compress_file_round_trip(tmp_path, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    src = tmp_path / "model.bin"
+    src.write_bytes(b"weights " * 100_000)
+
+    digest, layer = compress_file(src, tmp_path / "a", compression)
+    # the same content always compresses to the same blob
+    assert compress_file(src, tmp_path / "b", compression)[0] == digest
+    assert (tmp_path / "a").read_bytes() == (tmp_path / "b").read_bytes()
+    assert layer.content_size == 800_000
+    assert (tmp_path / "a").stat().st_size < 80_000
+
+    d = decompressor(compression)
+    assert d.decompress((tmp_path / "a").read_bytes()) == src.read_bytes()
+
+
+def test_is_dense(tmp_path):
+    (tmp_path / "dense").write_bytes(os.urandom(1024 * 1024))
+    (tmp_path / "sparse").write_bytes(bytes(1024 * 1024))
+    assert is_dense(tmp_path / "dense")
+    assert not is_dense(tmp_path / "sparse")
+
+
+def test_compressed_layer_of():
+    assert compression_of("application/x-mlmodel+zstd") == "zstd"
+    assert base_media_type("application/x-mlmodel+zstd") == "application/x-mlmodel"
+    assert base_media_type("application/x-mlmodel") == "application/x-mlmodel"
+    layer = CompressedLayer("gzip", "sha256:123", 42)
+    assert (
+        CompressedLayer.of(
+            {
+                "mediaType": "application/x-mlmodel+gzip",
+                "annotations": layer.annotations(),
+            }
+        )
+        == layer
+    )
+    # compressed by another tool, such as the tarball of a directory
+    assert (
+        CompressedLayer.of(
+            {
+                "mediaType": "application/vnd.oci.image.layer.v1.tar+gzip",
+                "annotations": {},
+            }
+        )
+        is None
+    )
+    assert ANNOTATION_UNCOMPRESSED_DIGEST in layer.annotations()
+
+
+def test_compress_files_reuses_pushed_copy(mocker, tmp_path):
+    src = tmp_path / "model.bin"
+    src.write_bytes(b"weights " * 100_000)
+    compress = mocker.spy(omlmd.provider, "compress_file")
+
+    def compress_files(exists):
+        cache = DigestCache(tmp_path / "digests.json")
+        return _compress_files([str(src)], "gzip", 1, str(tmp_path), cache, exists)
+
+    (upload, digest, size, layer) = compress_files(lambda d: True)[str(src)]
+    assert upload is not None
+    assert compress_files(lambda d: d == digest)[str(src)] == (
+        None,
+        digest,
+        size,
+        layer,
+    )
+    assert compress.call_count == 1
+
+    # compressed again when the registry lost it, or the file changed
+    assert compress_files(lambda d: False)[str(src)][0] is not None
+    src.write_bytes(b"other weights " * 100_000)
+    assert compress_files(lambda d: True)[str(src)][1] != digest
+    assert compress.call_count == 3
@@ -0,0 +1,21 @@
+from hashlib import sha256
+
+from omlmd.digest import DigestCache, compute_digests
+
+
+def test_compute_digests_reuses_cache(mocker, tmp_path):
+    files = [tmp_path / "a.bin", tmp_path / "b.bin"]
+    for f in files:
+        f.write_bytes(f.name.encode() * 1000)
+    cache = DigestCache(tmp_path / "digests.json")
+
+    digests = compute_digests(files, jobs=2, cache=cache)
+    assert digests[str(files[0])] == "sha256:" + sha256(b"a.bin" * 1000).hexdigest()
+
+    file_digest = mocker.patch("omlmd.digest.file_digest", return_value="sha256:new")
+    files[1].write_bytes(b"changed")
+    digests = compute_digests(files, cache=DigestCache(tmp_path / "digests.json"))
+
+    file_digest.assert_called_once_with(files[1])
+    assert digests[str(files[0])] == "sha256:" + sha256(b"a.bin" * 1000).hexdigest()
+    assert digests[str(files[1])] == "sha256:new"
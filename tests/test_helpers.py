@@ -1,17 +1,38 @@
+import gzip
 import json
+import os
 import subprocess
 import tempfile
+import threading
 import typing as t
 from hashlib import sha256
 from pathlib import Path
 
 import pytest
+import requests
+from click.testing import CliRunner
 
-from omlmd.constants import MIME_APPLICATION_MLMODEL
-from omlmd.helpers import Helper
-from omlmd.listener import Event, Listener
+from omlmd.blob_reader import BlobReader
+from omlmd.cache import BlobCache
+from omlmd.cli import cli
+from omlmd.compression import CompressedLayer
+from omlmd.constants import (
+    FILENAME_METADATA_JSON,
+    FILENAME_METADATA_YAML,
+    MIME_APPLICATION_MLMODEL,
+)
+from omlmd.helpers import Helper, model_files
+from omlmd.listener import BatchListener, Event, EventBus, Listener
 from omlmd.model_metadata import ModelMetadata, deserialize_mdfile
-from omlmd.provider import OMLMDRegistry
+from omlmd.progress import TransferProgress
+from omlmd.provider import (
+    PULL_MARKER,
+    LayerDownloadError,
+    LayerFilter,
+    OMLMDRegistry,
+    _partial_path,
+)
+from omlmd.tracing import tracer
 
 
 def test_call_push_using_md_from_file(mocker):
@@ -40,6 +61,40 @@ def test_call_push_using_md_from_file(mocker):
     )
 
 
+def test_cli_push_metadata_named_like_push_options(mocker, tmp_path):
+    model = tmp_path / "model.bin"
+    model.write_text("weights")
+    md = {"name": "mnist", "compression": "int8", "progress": 0.5, "mount_from": "a"}
+    (tmp_path / "md.json").write_text(json.dumps(md))
+    response = mocker.MagicMock()
+    response.headers = {"Docker-Content-Digest": "sha256:123"}
+    push = mocker.patch.object(OMLMDRegistry, "push", return_value=response)
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "push",
+            "unexistent:8080/testorgns/ml-iris:v1",
+            str(model),
+            "--metadata",
+            str(tmp_path / "md.json"),
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    metadata = ModelMetadata.from_annotations_dict(
+        push.call_args.kwargs["manifest_annotations"]
+    )
+    assert metadata.name == "mnist"
+    assert metadata.customProperties == {
+        "compression": "int8",
+        "progress": 0.5,
+        "mount_from": "a",
+    }
+    assert push.call_args.kwargs["compression"] is None
+    assert push.call_args.kwargs["mount_from"] == ()
+
+
 def test_push_event(mocker):
     registry = OMLMDRegistry()
     m = mocker.MagicMock()
@@ -73,6 +128,867 @@ def test_push_event(mocker):
     assert e0.metadata == ModelMetadata.from_dict(md)
 
 
+def test_event_bus_isolates_and_batches(mocker):
+    registry = OMLMDRegistry()
+    mocker.patch.object(registry, "get_config", return_value="{}")
+    bus = EventBus()
+    omlmd = Helper(registry, event_bus=bus)
+    release, delivering = threading.Event(), threading.Event()
+    batches = []
+
+    class Failing(Listener):
+        def update(self, source: t.Any, event: Event) -> None:
+            raise RuntimeError("boom")
+
+    class Slow(Listener):
+        def update(self, source: t.Any, event: Event) -> None:
+            delivering.set()
+            release.wait(5)
+
+    class Batching(BatchListener):
+        max_batch_delay = 5.0
+        max_batch_size = 3
+
+        def update_batch(self, source: t.Any, events: list[Event]) -> None:
+            batches.append(events)
+
+    for listener in (Failing(), Slow(), Batching()):
+        omlmd.add_listener(listener)
+
+    omlmd.crawl(["r/a:v1", "r/b:v1"])  # 2 config events and a crawl event
+
+    release.set()
+    assert bus.flush(timeout=5)
+    assert [type(e).__name__ for e in batches[0]] == [
+        "ConfigEvent",
+        "ConfigEvent",
+        "CrawlEvent",
+    ]
+    assert bus.stats.failed == 3
+    bus.close()
+
+    # backpressure: one event in delivery, one queued, the third is dropped
+    release.clear()
+    delivering.clear()
+    bus = EventBus(max_queue=1)
+    slow = Slow()
+    assert bus.publish(slow, omlmd, Event())
+    assert delivering.wait(5)
+    assert bus.publish(slow, omlmd, Event())
+    assert bus.publish(slow, omlmd, Event()) is False
+    assert bus.stats.dropped == 1
+    release.set()
+    bus.close()
+
+
+def _manifest_of(*titles: str) -> dict:
+    return {
+        "layers": [
+            {
+                "mediaType": MIME_APPLICATION_MLMODEL,
+                "digest": f"sha256:{i}",
+                "size": 1,
+                "annotations": {"org.opencontainers.image.title": title},
+            }
+            for i, title in enumerate(titles)
+        ]
+    }
+
+
+def test_download_layers_concurrently(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    mocker.patch.object(
+        registry, "get_manifest", return_value=_manifest_of("a", "b", "c")
+    )
+
+    def download_blob(
+        container, digest, outfile, size=None, progress=None, compressed=None
+    ):
+        Path(outfile).write_text(digest)
+        return outfile
+
+    mocker.patch.object(registry, "download_blob", side_effect=download_blob)
+
+    paths = registry.download_layers(
+        "unexistent:8080/testorgns/ml-iris:v1", str(tmp_path), None, jobs=3
+    )
+
+    assert paths == [str(tmp_path / t) for t in ("a", "b", "c")]
+    assert (tmp_path / "b").read_text() == "sha256:1"
+
+
+def test_download_layers_filtered(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    manifest = _manifest_of("q4/model.gguf", "q8/model.gguf", "tok/vocab.json", "x")
+    manifest["layers"][1]["size"] = 8
+    manifest["layers"][2]["annotations"]["variant"] = "q4"
+    mocker.patch.object(registry, "get_manifest", return_value=manifest)
+    download_blob = mocker.patch.object(
+        registry, "download_blob", side_effect=lambda c, d, outfile, *a, **kw: outfile
+    )
+
+    def pulled(layer_filter):
+        return [
+            os.path.relpath(p, tmp_path)
+            for p in registry.download_layers(
+                "unexistent:8080/testorgns/ml-iris:v1",
+                str(tmp_path),
+                None,
+                layer_filter=layer_filter,
+            )
+        ]
+
+    assert pulled(LayerFilter(include=["*.gguf"], max_size=4)) == ["q4/model.gguf"]
+    assert pulled(LayerFilter(exclude=["q?/*"])) == ["tok/vocab.json", "x"]
+    assert pulled(LayerFilter(annotations={"variant": "q4"})) == ["tok/vocab.json"]
+    assert pulled(LayerFilter(min_size=2)) == ["q8/model.gguf"]
+    assert download_blob.call_count == 5
+
+
+def test_open_layer(mocker, tmp_path):
+    registry = OMLMDRegistry(blob_cache=BlobCache(tmp_path))
+    mocker.patch.object(registry, "get_manifest", return_value=_manifest_of("a", "b"))
+    cached = registry.blob_cache.path_for("sha256:0")
+    cached.parent.mkdir(parents=True)
+    cached.write_bytes(b"a")
+    helper = Helper(registry)
+
+    with helper.open("unexistent:8080/testorgns/ml-iris:v1", "a") as f:
+        assert f.read() == b"a"
+    with helper.open("unexistent:8080/testorgns/ml-iris:v1", "b") as f:
+        assert isinstance(f, BlobReader)
+        assert (f.digest, f.size, f.name) == ("sha256:1", 1, "b")
+    with pytest.raises(FileNotFoundError):
+        helper.open("unexistent:8080/testorgns/ml-iris:v1", "c")
+
+
+def test_download_layers_failure_cleanup(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    mocker.patch.object(registry, "get_manifest", return_value=_manifest_of("a", "b"))
+
+    def download_blob(
+        container, digest, outfile, size=None, progress=None, compressed=None
+    ):
+        Path(outfile).write_text("partial")
+        if digest == "sha256:1":
+            raise ConnectionError("connection reset")
+        return outfile
+
+    mocker.patch.object(registry, "download_blob", side_effect=download_blob)
+
+    with pytest.raises(LayerDownloadError) as e:
+        registry.download_layers(
+            "unexistent:8080/testorgns/ml-iris:v1", str(tmp_path), None, jobs=2
+        )
+
+    assert list(e.value.failures) == ["b"]
+    assert not (tmp_path / "b").exists()
+
+
+def test_download_layers_atomic_reuses_unchanged(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    outdir = tmp_path / "model"
+    outdir.mkdir()
+    (outdir / PULL_MARKER).write_text("an earlier pull")
+    (outdir / "a").write_bytes(b"unchanged")
+    (outdir / "stale").write_bytes(b"old")
+    manifest = {
+        "layers": [
+            {
+                "mediaType": MIME_APPLICATION_MLMODEL,
+                "digest": f"sha256:{sha256(content).hexdigest()}",
+                "size": len(content),
+                "annotations": {"org.opencontainers.image.title": title},
+            }
+            for title, content in (("a", b"unchanged"), ("b", b"new"))
+        ]
+    }
+    mocker.patch.object(registry, "get_manifest", return_value=manifest)
+
+    def download_blob(
+        container, digest, outfile, size=None, progress=None, compressed=None
+    ):
+        assert not (outdir / "b").exists()
+        Path(outfile).write_bytes(b"new")
+        return outfile
+
+    download = mocker.patch.object(registry, "download_blob", side_effect=download_blob)
+
+    paths = registry.download_layers(
+        "unexistent:8080/testorgns/ml-iris:v1", str(outdir), None, atomic=True
+    )
+
+    assert paths == [str(outdir / "a"), str(outdir / "b")]
+    assert download.call_count == 1
+    assert sorted(p.name for p in outdir.iterdir()) == [PULL_MARKER, "a", "b"]
+    assert (outdir / "a").read_bytes() == b"unchanged"
+    assert [p.name for p in tmp_path.iterdir()] == ["model"]
+
+    download.side_effect = ConnectionError("connection reset")
+    manifest["layers"][1]["digest"] = f"sha256:{sha256(b'newer').hexdigest()}"
+    with pytest.raises(LayerDownloadError):
+        registry.download_layers(
+            "unexistent:8080/testorgns/ml-iris:v1", str(outdir), None, atomic=True
+        )
+    assert (outdir / "b").read_bytes() == b"new"
+    assert [p.name for p in tmp_path.iterdir()] == ["model"]
+
+
+def test_download_layers_atomic_keeps_foreign_files(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    mocker.patch.object(registry, "get_manifest", return_value=_manifest_of("a"))
+    download = mocker.patch.object(registry, "download_blob")
+    (tmp_path / "script.py").write_text("print('mine')")
+
+    with pytest.raises(RuntimeError, match="Refusing to replace"):
+        registry.download_layers(
+            "unexistent:8080/testorgns/ml-iris:v1", str(tmp_path), None, atomic=True
+        )
+
+    assert [p.name for p in tmp_path.iterdir()] == ["script.py"]
+    assert download.call_count == 0
+
+
+def test_pull_atomic_requires_output(mocker):
+    pull = mocker.patch.object(Helper, "pull")
+    result = CliRunner().invoke(
+        cli, ["pull", "unexistent:8080/testorgns/ml-iris:v1", "--atomic"]
+    )
+    assert result.exit_code == 2
+    assert "--atomic requires an explicit --output" in result.output
+    assert pull.call_count == 0
+
+
+def test_do_request_retries_with_backoff(mocker):
+    registry = OMLMDRegistry(insecure=True, retries=2, backoff_factor=0)
+    flaky = requests.Response()
+    flaky.status_code = 503
+    flaky._content_consumed = True
+    ok = requests.Response()
+    ok.status_code = 200
+    mocker.patch.object(
+        registry.session,
+        "request",
+        side_effect=[requests.exceptions.ConnectionError("reset"), flaky, ok],
+    )
+
+    r = registry.do_request("http://r:5000/v2/ns/m/manifests/v1", "HEAD")
+
+    assert r.status_code == 200
+    assert registry.pool_stats().retries == 2
+
+
+def test_do_request_does_not_retry_uploads(mocker):
+    registry = OMLMDRegistry(insecure=True, retries=2, backoff_factor=0)
+    flaky = requests.Response()
+    flaky.status_code = 503
+    flaky._content_consumed = True
+    request = mocker.patch.object(registry.session, "request", return_value=flaky)
+
+    r = registry.do_request("http://r:5000/v2/ns/m/blobs/uploads/", "POST")
+
+    assert r.status_code == 503
+    assert request.call_count == 1
+    assert registry.pool_stats().retries == 0
+
+
+# any registry error fails the one target, not the whole pull
+@pytest.mark.parametrize("error", [ValueError, RuntimeError])
+def test_pull_many_dedupes_shared_layers(mocker, tmp_path, error):
+    registry = OMLMDRegistry()
+    manifests = {
+        "r:5000/ns/a:v1": _manifest_of("model.bin", "a.json"),
+        "r:5000/ns/b:v1": _manifest_of("model.bin"),
+    }
+
+    def get_manifest(target):
+        if target not in manifests:
+            raise error("manifest unknown")
+        return manifests[target]
+
+    def download_blob(
+        container, digest, outfile, size=None, progress=None, compressed=None
+    ):
+        Path(outfile).parent.mkdir(parents=True, exist_ok=True)
+        Path(outfile).write_text(digest)
+        return outfile
+
+    mocker.patch.object(registry, "get_manifest", side_effect=get_manifest)
+    download = mocker.patch.object(registry, "download_blob", side_effect=download_blob)
+
+    results = Helper(registry).pull_many(
+        [*manifests, "r:5000/ns/c:v1"], tmp_path, jobs=4
+    )
+
+    assert download.call_count == 2
+    assert [r.error for r in results[:2]] == [None, None]
+    assert results[2].error == "manifest unknown"
+    b = tmp_path / "r_5000" / "ns" / "b" / "v1" / "model.bin"
+    assert results[1].files == [str(b)]
+    assert b.read_text() == "sha256:0"
+
+
+def test_pull_many_failures_by_title(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    manifests = {
+        "r:5000/ns/a:v1": _manifest_of("x/model.bin", "y/model.bin"),
+        "r:5000/ns/b:v1": _manifest_of("x/model.bin"),
+    }
+
+    def download_blob(
+        container, digest, outfile, size=None, progress=None, compressed=None
+    ):
+        if digest == "sha256:1":
+            raise RuntimeError("blob unknown")
+        Path(outfile).parent.mkdir(parents=True, exist_ok=True)
+        Path(outfile).write_text(digest)
+        return outfile
+
+    mocker.patch.object(registry, "get_manifest", side_effect=manifests.get)
+    mocker.patch.object(registry, "download_blob", side_effect=download_blob)
+    mocker.patch("omlmd.provider.place", side_effect=OSError("disk full"))
+
+    a, b = registry.download_many(
+        [(target, str(tmp_path / str(i))) for i, target in enumerate(manifests)],
+        jobs=2,
+    ).values()
+
+    assert isinstance(a, LayerDownloadError)
+    assert list(a.failures) == ["y/model.bin"]
+    assert isinstance(b, LayerDownloadError)
+    assert str(b.failures["x/model.bin"]) == "disk full"
+
+
+def test_get_metadata_from_annotations(mocker):
+    registry = OMLMDRegistry()
+    md = ModelMetadata(name="mnist", author="John Doe", model_format_name="onnx")
+    manifests = {
+        "r:5000/ns/a:v1": {"annotations": md.to_annotations_dict()},
+        "r:5000/ns/b:v1": {},
+    }
+    mocker.patch.object(registry, "get_manifest", side_effect=manifests.get)
+    get_config = mocker.patch.object(
+        registry, "get_config", return_value=ModelMetadata(name="other").to_json()
+    )
+
+    results = Helper(registry).get_metadata_many(list(manifests), jobs=2)
+
+    assert results["r:5000/ns/a:v1"] == md
+    assert results["r:5000/ns/b:v1"] == ModelMetadata(name="other")
+    get_config.assert_called_once_with("r:5000/ns/b:v1")
+
+
+def test_get_metadata_many_isolates_failures(mocker):
+    registry = OMLMDRegistry()
+    manifests = {"r:5000/ns/a:v1": {}, "r:5000/ns/b:v1": {}}
+    mocker.patch.object(registry, "get_manifest", side_effect=manifests.get)
+    configs = {"r:5000/ns/a:v1": '{"layers": []}'}  # not model metadata
+
+    def get_config(target):
+        if target not in configs:
+            raise RuntimeError("Unable to locate config layer")
+        return configs[target]
+
+    mocker.patch.object(registry, "get_config", side_effect=get_config)
+
+    results = Helper(registry).get_metadata_many(list(manifests), jobs=2)
+
+    assert isinstance(results["r:5000/ns/a:v1"], TypeError)
+    assert isinstance(results["r:5000/ns/b:v1"], RuntimeError)
+
+
+def test_helpers_share_registry_only_when_asked():
+    assert Helper()._registry is not Helper()._registry
+    assert (
+        Helper.from_default_registry(True)._registry
+        is not Helper.from_default_registry(True)._registry
+    )
+    assert (
+        Helper.from_default_registry(True, shared=True)._registry
+        is Helper.from_default_registry(True, shared=True)._registry
+    )
+    with pytest.raises(ValueError):
+        Helper.from_default_registry(True, shared=True, upload_jobs=2)
+
+
+def _blob_server(content: bytes):
+    def do_request(url, method="GET", headers=None, stream=False, **kwargs):
+        r = requests.Response()
+        r.status_code = 200
+        r._content = content
+        r._content_consumed = True
+        if headers and "Range" in headers:
+            start, _, end = headers["Range"].removeprefix("bytes=").partition("-")
+            r.status_code = 206
+            r._content = content[int(start) : int(end) + 1 if end else None]
+        return r
+
+    return do_request
+
+
+def test_download_blob_resumes_partial(mocker, tmp_path):
+    content = b"0123456789" * 10
+    digest = "sha256:" + sha256(content).hexdigest()
+    registry = OMLMDRegistry()
+    do_request = mocker.patch.object(
+        registry, "do_request", side_effect=_blob_server(content)
+    )
+    outfile = tmp_path / "model.bin"
+    Path(_partial_path(str(tmp_path / "model.bin"), digest)).write_bytes(content[:42])
+
+    registry.download_blob("unexistent:8080/testorgns/ml-iris:v1", digest, str(outfile))
+
+    assert outfile.read_bytes() == content
+    assert not Path(_partial_path(str(tmp_path / "model.bin"), digest)).exists()
+    assert do_request.call_args.kwargs["headers"]["Range"] == "bytes=42-"
+
+
+def test_download_blob_ignores_partial_of_other_blob(mocker, tmp_path):
+    content = b"0123456789" * 10
+    digest = "sha256:" + sha256(content).hexdigest()
+    other = "sha256:" + sha256(b"other").hexdigest()
+    registry = OMLMDRegistry()
+    do_request = mocker.patch.object(
+        registry, "do_request", side_effect=_blob_server(content)
+    )
+    outfile = tmp_path / "model.bin"
+    # left by an interrupted pull of another tag into the same directory
+    Path(_partial_path(str(outfile), other)).write_bytes(b"other"[:3])
+
+    registry.download_blob("unexistent:8080/testorgns/ml-iris:v1", digest, str(outfile))
+
+    assert outfile.read_bytes() == content
+    assert "Range" not in do_request.call_args.kwargs["headers"]
+
+
+def test_download_blob_span_counts_received_bytes(mocker, tmp_path):
+    content = b"0123456789" * 10
+    digest = "sha256:" + sha256(content).hexdigest()
+    registry = OMLMDRegistry()
+    mocker.patch.object(registry, "do_request", side_effect=_blob_server(content))
+    spans = []
+    exporter = mocker.Mock(export=spans.append)
+    tracer.add_exporter(exporter)
+    Path(_partial_path(str(tmp_path / "model.bin"), digest)).write_bytes(content[:42])
+    try:
+        registry.download_blob(
+            "unexistent:8080/testorgns/ml-iris:v1", digest, str(tmp_path / "model.bin")
+        )
+    finally:
+        tracer.remove_exporter(exporter)
+
+    (span,) = spans
+    assert span.name == "blob.download"
+    assert span.attributes["outcome"] == "downloaded"
+    assert span.bytes == 58  # the resumed prefix wasn't transferred again
+
+
+def test_download_blob_reports_progress(mocker, tmp_path):
+    content = b"0123456789" * 10
+    digest = "sha256:" + sha256(content).hexdigest()
+    registry = OMLMDRegistry()
+    mocker.patch.object(registry, "do_request", side_effect=_blob_server(content))
+    Path(_partial_path(str(tmp_path / "model.bin"), digest)).write_bytes(content[:42])
+    reported = []
+    progress = TransferProgress(reported.append, "pull", interval=0)
+    progress.add(digest, len(content))
+
+    registry.download_blob(
+        "unexistent:8080/testorgns/ml-iris:v1",
+        digest,
+        str(tmp_path / "model.bin"),
+        len(content),
+        progress,
+    )
+
+    assert (reported[-1].done, reported[-1].layers_done) == (100, 1)
+    assert progress.layers[digest].transferred == 58
+
+
+def test_download_blob_aborted_by_progress(mocker, tmp_path):
+    content = b"0123456789" * 10
+    digest = "sha256:" + sha256(content).hexdigest()
+    registry = OMLMDRegistry()
+    mocker.patch.object(registry, "do_request", side_effect=_blob_server(content))
+
+    def abort(progress):
+        raise TimeoutError("stalled")
+
+    with pytest.raises(TimeoutError):
+        registry.download_blob(
+            "unexistent:8080/testorgns/ml-iris:v1",
+            digest,
+            str(tmp_path / "model.bin"),
+            progress=TransferProgress(abort, "pull", interval=0),
+        )
+    assert not (tmp_path / "model.bin").exists()
+
+
+def test_download_blob_parallel_ranges(mocker, tmp_path):
+    content = bytes(range(256)) * 4
+    digest = "sha256:" + sha256(content).hexdigest()
+    registry = OMLMDRegistry()
+    registry.range_download_threshold = 1
+    registry.range_chunk_size = 100
+    do_request = mocker.patch.object(
+        registry, "do_request", side_effect=_blob_server(content)
+    )
+    outfile = tmp_path / "model.bin"
+
+    registry.download_blob(
+        "unexistent:8080/testorgns/ml-iris:v1", digest, str(outfile), len(content)
+    )
+
+    assert outfile.read_bytes() == content
+    assert do_request.call_count == 11
+
+
+def test_download_blob_digest_mismatch(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    mocker.patch.object(registry, "do_request", side_effect=_blob_server(b"tampered"))
+    outfile = tmp_path / "model.bin"
+
+    with pytest.raises(ValueError, match="Digest mismatch"):
+        registry.download_blob(
+            "unexistent:8080/testorgns/ml-iris:v1",
+            "sha256:" + sha256(b"original").hexdigest(),
+            str(outfile),
+        )
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_blob_decompresses(mocker, tmp_path):
+    content = b"0123456789" * 1000
+    compressed = gzip.compress(content, mtime=0)
+    registry = OMLMDRegistry(blob_cache=BlobCache(tmp_path / "cache"))
+    mocker.patch.object(registry, "do_request", side_effect=_blob_server(compressed))
+    digest = "sha256:" + sha256(compressed).hexdigest()
+    # not resumable, the decompressor state being lost
+    Path(_partial_path(str(tmp_path / "model.bin"), digest)).write_bytes(content[:42])
+    layer = CompressedLayer("gzip", "sha256:" + sha256(content).hexdigest())
+
+    registry.download_blob(
+        "unexistent:8080/testorgns/ml-iris:v1",
+        digest,
+        str(tmp_path / "model.bin"),
+        compressed=layer,
+    )
+
+    assert (tmp_path / "model.bin").read_bytes() == content
+    assert registry.blob_cache.path_for(layer.content_digest).read_bytes() == content
+
+    layer.content_digest = "sha256:" + sha256(b"other").hexdigest()
+    with pytest.raises(ValueError, match="once decompressed"):
+        registry.download_blob(
+            "unexistent:8080/testorgns/ml-iris:v1",
+            "sha256:" + sha256(compressed).hexdigest(),
+            str(tmp_path / "other.bin"),
+            compressed=layer,
+        )
+    assert not (tmp_path / "other.bin").exists()
+
+
+def test_get_manifest_cached_and_revalidated(mocker):
+    registry = OMLMDRegistry()
+
+    def do_request(url, method="GET", headers=None, **kwargs):
+        r = requests.Response()
+        r.headers["ETag"] = '"sha256:abc"'
+        r.headers["Docker-Content-Digest"] = "sha256:abc"
+        if headers.get("If-None-Match") == '"sha256:abc"':
+            r.status_code = 304
+        else:
+            r.status_code = 200
+            r._content = json.dumps(_manifest_of("a")).encode()
+        return r
+
+    do_request = mocker.patch.object(registry, "do_request", side_effect=do_request)
+    target = "unexistent:8080/testorgns/ml-iris:v1"
+
+    assert registry.get_manifest(target) == _manifest_of("a")
+    assert registry.get_manifest(target) == _manifest_of("a")
+    assert do_request.call_count == 1
+    assert registry.resolve_digest(target) == "sha256:abc"
+
+    registry.manifest_cache.ttl = 0
+    assert registry.get_manifest(target) == _manifest_of("a")
+    assert do_request.call_count == 2
+    assert registry.manifest_cache.stats.revalidations == 1
+
+
+@pytest.mark.parametrize("with_digest", [True, False])
+def test_get_manifest_revalidated_by_head(mocker, with_digest):
+    registry = OMLMDRegistry()
+    registry.manifest_cache.ttl = 0
+    tag = {"digest": "sha256:abc", "manifest": _manifest_of("a")}
+
+    def do_request(url, method="GET", headers=None, **kwargs):
+        r = requests.Response()
+        r.status_code = 200
+        if with_digest:  # and no ETag
+            r.headers["Docker-Content-Digest"] = tag["digest"]
+        if method == "GET":
+            r._content = json.dumps(tag["manifest"]).encode()
+        return r
+
+    do_request = mocker.patch.object(registry, "do_request", side_effect=do_request)
+    target = "unexistent:8080/testorgns/ml-iris:v1"
+
+    assert registry.get_manifest(target) == _manifest_of("a")
+    assert registry.get_manifest(target) == _manifest_of("a")
+    tag.update(digest="sha256:def", manifest=_manifest_of("b"))  # the tag moved
+    assert registry.get_manifest(target) == _manifest_of("b")
+
+    methods = [c.args[1] for c in do_request.call_args_list]
+    if with_digest:
+        assert methods == ["GET", "HEAD", "HEAD", "GET"]
+        assert registry.manifest_cache.stats.revalidations == 1
+    else:
+        # nothing to compare a HEAD answer with, so always a full GET
+        assert methods == ["GET", "GET", "GET"]
+
+
+def test_resolve_digest_memoized(mocker):
+    registry = OMLMDRegistry()
+    head = requests.Response()
+    head.status_code = 200
+    head.headers["Docker-Content-Digest"] = "sha256:abc"
+    do_request = mocker.patch.object(registry, "do_request", return_value=head)
+    target = "unexistent:8080/testorgns/ml-iris:v1"
+
+    assert registry.resolve_digest(target) == "sha256:abc"
+    assert registry.resolve_digest(target) == "sha256:abc"
+    assert [c.args[1] for c in do_request.call_args_list] == ["HEAD"]
+
+    registry.manifest_cache.ttl = 0
+    assert registry.resolve_digest(target) == "sha256:abc"
+    assert do_request.call_count == 2
+
+
+def test_crawl_concurrently_with_inline_errors(mocker):
+    registry = OMLMDRegistry()
+
+    def get_config(target):
+        if target.endswith(":v2"):
+            raise ValueError("manifest unknown")
+        return json.dumps({"name": target[-2:]})
+
+    mocker.patch.object(registry, "get_config", side_effect=get_config)
+    omlmd = Helper(registry)
+    targets = [f"unexistent:8080/testorgns/ml-iris:v{i}" for i in range(1, 4)]
+
+    crawled = json.loads(omlmd.crawl(targets, jobs=3))
+    assert [c["reference"] for c in crawled] == targets
+    assert crawled[0]["config"] == {"name": "v1"}
+    assert crawled[1]["error"] == "manifest unknown"
+
+    streamed = {r["reference"]: r for r in omlmd.crawl_stream(targets, jobs=3)}
+    assert streamed[targets[2]]["config"] == {"name": "v3"}
+    assert streamed[targets[1]]["error"] == "manifest unknown"
+
+
+def test_get_config_in_memory(mocker):
+    config = ModelMetadata(name="mnist").to_json().encode()
+    digest = "sha256:" + sha256(config).hexdigest()
+    manifest = {
+        "config": {"digest": digest, "size": len(config)},
+        "layers": [{"digest": digest, "size": len(config)}],
+    }
+    registry = OMLMDRegistry()
+    mocker.patch.object(registry, "get_manifest", return_value=manifest)
+    mocker.patch.object(registry, "do_request", side_effect=_blob_server(config))
+    mkdtemp = mocker.patch("tempfile.TemporaryDirectory")
+
+    assert (
+        registry.get_config("unexistent:8080/testorgns/ml-iris:v1") == config.decode()
+    )
+    mkdtemp.assert_not_called()
+
+
+def test_push_skips_existing_blobs(mocker, tmp_path):
+    model = tmp_path / "model.bin"
+    model.write_bytes(b"weights")
+    config = tmp_path / "config.json"
+    config.write_text("{}")
+    model_digest = "sha256:" + sha256(b"weights").hexdigest()
+
+    registry = OMLMDRegistry()
+    mocker.patch.object(
+        registry,
+        "blob_exists",
+        side_effect=lambda layer, container: layer["digest"] == model_digest,
+    )
+    created = requests.Response()
+    created.status_code = 201
+    upload = mocker.patch.object(registry, "chunked_upload", return_value=created)
+    upload_manifest = mocker.patch.object(
+        registry, "upload_manifest", return_value=created
+    )
+
+    registry.push(
+        "unexistent:8080/testorgns/ml-iris:v1",
+        files=[f"{model}:{MIME_APPLICATION_MLMODEL}", f"{config}:application/x-config"],
+        manifest_config=f"{config}:application/x-config",
+        disable_path_validation=True,
+        do_chunked=True,
+        jobs=2,
+    )
+
+    # the config is also a layer, yet uploaded once; the model is already there
+    upload.assert_called_once()
+    assert upload.call_args.args[0] == str(config)
+    manifest = upload_manifest.call_args.args[0]
+    assert manifest["layers"][0]["digest"] == model_digest
+
+
+def test_push_same_basename_uploads_both(mocker, tmp_path):
+    for name in ["a", "b"]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "model.bin").write_text(f"weights of {name}")
+
+    registry = OMLMDRegistry()
+    mocker.patch.object(registry, "blob_exists", return_value=False)
+    created = requests.Response()
+    created.status_code = 201
+    upload = mocker.patch.object(registry, "put_upload", return_value=created)
+    mocker.patch.object(registry, "upload_manifest", return_value=created)
+
+    registry.push(
+        "unexistent:8080/testorgns/ml-iris:v1",
+        files=[str(tmp_path / "a" / "model.bin"), str(tmp_path / "b" / "model.bin")],
+        disable_path_validation=True,
+        jobs=2,
+    )
+
+    uploaded = {call.args[2]["digest"] for call in upload.call_args_list}
+    assert uploaded >= {
+        "sha256:" + sha256(f"weights of {name}".encode()).hexdigest()
+        for name in ["a", "b"]
+    }
+
+
+def test_push_metadata_from_memory(mocker, tmp_path):
+    model = tmp_path / "model.bin"
+    model.write_bytes(b"weights")
+    registry = OMLMDRegistry()
+    upload_blobs = mocker.patch.object(registry, "upload_blobs")
+    created = requests.Response()
+    created.status_code = 201
+    created.headers["Docker-Content-Digest"] = "sha256:123"
+    upload_manifest = mocker.patch.object(
+        registry, "upload_manifest", return_value=created
+    )
+    mocker.patch.object(registry, "_validate_path", return_value=True)
+
+    Helper(registry).push("unexistent:8080/testorgns/ml-iris:v1", model, name="mnist")
+
+    assert [p.name for p in tmp_path.iterdir()] == ["model.bin"]
+    manifest = upload_manifest.call_args.args[0]
+    titles = [
+        layer["annotations"]["org.opencontainers.image.title"]
+        for layer in manifest["layers"]
+    ]
+    assert titles == ["model.bin", FILENAME_METADATA_JSON, FILENAME_METADATA_YAML]
+    assert manifest["config"]["digest"] == manifest["layers"][1]["digest"]
+    blobs = {layer["digest"]: blob for blob, layer in upload_blobs.call_args.args[1]}
+    config = blobs[manifest["config"]["digest"]]
+    assert ModelMetadata.from_json(config.decode()).name == "mnist"
+    assert len(blobs) == 3  # the config is also a layer, uploaded once
+
+
+def test_model_files(tmp_path):
+    (tmp_path / "tok").mkdir()
+    for name in ["b.bin", "a.bin", "tok/vocab.json", FILENAME_METADATA_JSON]:
+        (tmp_path / name).write_text(name)
+
+    root, files = model_files(tmp_path)
+    assert root == tmp_path
+    assert [f.relative_to(root).as_posix() for f in files] == [
+        "a.bin",
+        "b.bin",
+        "tok/vocab.json",
+    ]
+    assert model_files(tmp_path / "*.bin") == (
+        tmp_path,
+        [tmp_path / "a.bin", tmp_path / "b.bin"],
+    )
+    assert model_files(tmp_path / "**" / "*.json")[1] == [tmp_path / "tok/vocab.json"]
+    assert model_files(tmp_path / "a.bin") == (tmp_path, [tmp_path / "a.bin"])
+    with pytest.raises(FileNotFoundError):
+        model_files(tmp_path / "*.onnx")
+
+
+def test_model_files_hidden_and_literal_wildcards(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "HEAD").write_text("ref")
+    (tmp_path / ".env").write_text("secret")
+    (tmp_path / "v[1]").mkdir()
+    for name in ["v[1]/model[1].bin", "v[1]/b.txt", "v[1]/.cache"]:
+        (tmp_path / name).write_text(name)
+
+    root, files = model_files(tmp_path)
+    assert [f.relative_to(root).as_posix() for f in files] == [
+        "v[1]/b.txt",
+        "v[1]/model[1].bin",
+    ]
+    assert model_files(tmp_path / "v[1]" / "*.bin") == (
+        tmp_path / "v[1]",
+        [tmp_path / "v[1]" / "model[1].bin"],
+    )
+
+
+def test_push_existing_path_with_wildcards(mocker, tmp_path):
+    model = tmp_path / "model[1].bin"
+    model.write_text("weights")
+    push = mocker.patch.object(Helper, "push")
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "push",
+            "unexistent:8080/testorgns/ml-iris:v1",
+            str(model),
+            "--empty-metadata",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert push.call_args.args[1] == str(model)
+
+
+def test_mount_blob_falls_back_to_upload(mocker):
+    registry = OMLMDRegistry(insecure=True)
+    mocker.patch.object(registry, "blob_exists", return_value=False)
+
+    def do_request(url, method="GET", **kwargs):
+        r = requests.Response()
+        r.status_code = 202 if method == "POST" else 204
+        r.headers["Location"] = "/v2/testorgns/prod/blobs/uploads/123"
+        return r
+
+    do_request = mocker.patch.object(registry, "do_request", side_effect=do_request)
+    created = requests.Response()
+    created.status_code = 201
+    upload = mocker.patch.object(registry, "put_upload", return_value=created)
+    container = registry.get_container("unexistent:8080/testorgns/prod:v1")
+    layer = {"digest": "sha256:abc", "size": 1}
+
+    uploaded = registry.upload_blobs(
+        container, [("model.bin", layer)], mount_from=["testorgns/dev"]
+    )
+
+    mount = do_request.call_args_list[0]
+    assert mount.args[1] == "POST"
+    assert "mount=sha256%3Aabc" in mount.args[0] or "mount=sha256:abc" in mount.args[0]
+    assert (
+        "from=testorgns%2Fdev" in mount.args[0] or "from=testorgns/dev" in mount.args[0]
+    )
+    assert do_request.call_args_list[1].args[1] == "DELETE"
+    upload.assert_called_once()
+    assert uploaded == ["sha256:abc"]
+
+
 @pytest.mark.e2e
 def test_push_pull_chunked(tmp_path, target):
     omlmd = Helper()
@@ -0,0 +1,128 @@
+import pytest
+
+from omlmd.helpers import Helper
+from omlmd.index import MetadataIndex
+from omlmd.model_metadata import ModelMetadata
+from omlmd.provider import OMLMDRegistry
+
+
+def test_index_refresh_and_search(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    digests = {"r:5000/ns/a:v1": "sha256:a", "r:5000/ns/b:v1": "sha256:b"}
+    mocker.patch.object(registry, "resolve_digest", side_effect=digests.get)
+    helper = Helper(registry)
+    get_metadata = mocker.patch.object(
+        helper,
+        "get_metadata",
+        side_effect=lambda ref: ModelMetadata(
+            name=ref,
+            author="John Doe",
+            model_format_name="onnx" if ref.endswith("@sha256:a") else "pytorch",
+            customProperties={"accuracy": 0.987},
+        ),
+    )
+
+    with MetadataIndex(tmp_path / "index.sqlite") as index:
+        assert index.refresh(helper, list(digests), jobs=2).added == 2
+        stats = index.refresh(helper, list(digests), jobs=2)
+        assert (stats.added, stats.unchanged) == (0, 2)
+        assert get_metadata.call_count == 2
+
+        entries = index.search(
+            {"accuracy": 0.987}, author="John Doe", model_format_name="onnx"
+        )
+        assert [e.reference for e in entries] == ["r:5000/ns/a:v1"]
+        assert entries[0].metadata.customProperties == {"accuracy": 0.987}
+
+        digests["r:5000/ns/a:v1"] = "sha256:b"  # the tag moved to b's manifest
+        stats = index.refresh(helper, ["r:5000/ns/a:v1"])
+        assert stats.added == 1
+        assert get_metadata.call_count == 2
+        assert index.search(model_format_name="onnx") == []
+
+
+def test_index_refresh_reports_errors(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    mocker.patch.object(
+        registry,
+        "resolve_digest",
+        side_effect=RuntimeError("Unable to resolve digest of r:5000/ns/a:v1"),
+    )
+
+    with MetadataIndex(tmp_path / "index.sqlite") as index:
+        stats = index.refresh(Helper(registry), ["r:5000/ns/a:v1"])
+
+    assert list(stats.errors) == ["r:5000/ns/a:v1"]
+
+
+def test_index_sync_drops_removed_tags(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    tags = {"r:5000/ns/a": ["v1", "v2"]}
+    mocker.patch.object(registry, "get_repositories", return_value=["ns/a"])
+    mocker.patch.object(registry, "get_tags", side_effect=lambda t: tags[t])
+    mocker.patch.object(
+        registry, "resolve_digest", side_effect=lambda t: f"sha256:{t[-2:]}"
+    )
+    helper = Helper(registry)
+    mocker.patch.object(
+        helper, "get_metadata", side_effect=lambda ref: ModelMetadata(name=ref)
+    )
+
+    with MetadataIndex(tmp_path / "index.sqlite") as index:
+        assert index.sync(helper, "r:5000").added == 2
+        tags["r:5000/ns/a"] = ["v1"]
+        stats = index.sync(helper, "r:5000")
+
+        assert (stats.added, stats.unchanged, stats.removed) == (0, 1, 1)
+        assert index.references() == ["r:5000/ns/a:v1"]
+        assert index.last_synced("r:5000") is not None
+
+
+def test_index_sync_skips_unlisted_repositories(mocker, tmp_path):
+    registry = OMLMDRegistry()
+    tags = {"r:5000/ns/a": ["v1"], "r:5000/ns/b": ["v1"]}
+
+    def get_tags(target):
+        if target not in tags:
+            raise ValueError("Issue with request: 403 Forbidden")
+        return tags[target]
+
+    mocker.patch.object(registry, "get_repositories", return_value=["ns/a", "ns/b"])
+    mocker.patch.object(registry, "get_tags", side_effect=get_tags)
+    mocker.patch.object(registry, "resolve_digest", side_effect=lambda t: f"sha256:{t}")
+    helper = Helper(registry)
+    mocker.patch.object(
+        helper, "get_metadata", side_effect=lambda ref: ModelMetadata(name=ref)
+    )
+
+    with MetadataIndex(tmp_path / "index.sqlite") as index:
+        assert index.sync(helper, "r:5000").added == 2
+        del tags["r:5000/ns/a"]
+        stats = index.sync(helper, "r:5000")
+
+        assert list(stats.errors) == ["r:5000/ns/a"]
+        assert (stats.unchanged, stats.removed) == (1, 0)
+        # the tags of the repository which couldn't be listed are kept
+        assert index.references() == ["r:5000/ns/a:v1", "r:5000/ns/b:v1"]
+
+
+def test_index_search_property_keys(tmp_path):
+    properties = {'say "hi"': "yes", "a.b": 1, "flag": True, "none": None}
+    with MetadataIndex(tmp_path / "index.sqlite") as index:
+        index.add(
+            "r:5000/ns/a:v1",
+            "sha256:a",
+            ModelMetadata(name="a", customProperties=properties),
+        )
+        index.add("r:5000/ns/b:v1", "sha256:b", ModelMetadata(name="b"))
+
+        for key, value in properties.items():
+            entries = index.search({key: value})
+            assert [e.reference for e in entries] == ["r:5000/ns/a:v1"]
+        assert index.search({"a.b": 2}) == []
+        assert index.search({"a": 1}) == []
+
+        with pytest.raises(ValueError, match="expected a scalar"):
+            index.search({"tags": ["x"]})
+        with pytest.raises(ValueError, match="expected a scalar"):
+            index.search({"nested": {"a": 1}})
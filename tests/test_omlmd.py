@@ -95,3 +95,18 @@ def test_is_empty():
         name="mnist",
     )
     assert not md.is_empty()
+
+
+def test_from_annotations_dict():
+    md = ModelMetadata(
+        name="mnist",
+        author="John Doe",
+        model_format_name="onnx",
+        customProperties={"accuracy": 0.987},
+    )
+    annotations = {
+        **md.to_annotations_dict(),
+        "org.opencontainers.image.created": "2024-01-01T00:00:00Z",
+    }
+    assert ModelMetadata.from_annotations_dict(annotations) == md
+    assert ModelMetadata.from_annotations_dict({"unrelated": "value"}) is None
@@ -0,0 +1,31 @@
+from omlmd.progress import TransferProgress
+
+
+def test_transfer_progress_aggregates_layers():
+    reported = []
+    progress = TransferProgress(reported.append, "pull", interval=0)
+    progress.add("sha256:a", 100, "model.bin")
+    progress.add("sha256:b", 50)
+
+    progress.advance("sha256:a", 40)
+    progress.finish("sha256:b")  # found in the cache, nothing transferred
+
+    last = reported[-1]
+    assert (last.done, last.total) == (90, 150)
+    assert (last.layers_done, last.layers) == (1, 2)
+    assert reported[0].layer.title == "model.bin"
+    assert progress.layers["sha256:a"].transferred == 40
+    assert progress.layers["sha256:b"].transferred == 0
+
+    progress.restart("sha256:a")
+    assert progress.snapshot().done == 50
+
+
+def test_transfer_progress_unknown_total():
+    progress = TransferProgress(lambda p: None, "pull")
+    progress.add("sha256:a", None)
+    progress.advance("sha256:a", 10)
+
+    snapshot = progress.snapshot()
+    assert snapshot.total is None
+    assert snapshot.eta is None
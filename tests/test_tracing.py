@@ -0,0 +1,37 @@
+import pytest
+
+from omlmd.tracing import OpenTelemetryExporter, SummaryExporter, Tracer
+
+
+def test_spans_summarized_per_phase():
+    tracer = Tracer()
+    summary = SummaryExporter()
+    tracer.add_exporter(summary)
+
+    for size in [100, 300]:
+        with tracer.span("blob.download", digest="sha256:a") as span:
+            span.bytes = size
+    with pytest.raises(ValueError), tracer.span("manifest"):
+        raise ValueError("boom")
+
+    assert summary.phases["blob.download"].count == 2
+    assert summary.phases["blob.download"].bytes == 400
+    assert summary.phases["manifest"].count == 1
+    assert "blob.download" in summary.summary()
+
+
+def test_opentelemetry_exporter(mocker):
+    otel_tracer = mocker.Mock()
+    tracer = Tracer()
+    tracer.add_exporter(OpenTelemetryExporter(otel_tracer))
+
+    with tracer.span("blob.upload", digest="sha256:a") as span:
+        span.bytes = 42
+
+    name = otel_tracer.start_span.call_args.args[0]
+    kwargs = otel_tracer.start_span.call_args.kwargs
+    assert name == "blob.upload"
+    assert kwargs["start_time"] == span.start_time_ns
+    assert kwargs["attributes"] == {"omlmd.digest": "sha256:a", "omlmd.bytes": 42}
+    end_time = otel_tracer.start_span.return_value.end.call_args.kwargs["end_time"]
+    assert end_time >= span.start_time_ns